@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+''' Benchmarks of compiling, rendering and validating synthetic forms.
+
+Run from the repository root:
+
+    python -m benchmarks.run                      # all scales
+    python -m benchmarks.run --scales small -r 3
+    python -m benchmarks.run --compare results/a.json results/b.json
+
+Results are written as json to `benchmarks/results/`, named after the
+current commit, so runs of different commits can be compared.
+'''
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import OrderedDict
+from timeit import default_timer
+
+from xsdance.element import Element
+from xsdance.generator import Generator
+from xsdance.utils import parse_inputs, serialize_json, serialize_xml
+
+from .synthetic import generate_schema, PRIMITIVE_TYPES_PATH
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(HERE, 'results')
+
+SCALES = [
+    ('small', dict(depth=3, fanout=6, group_fanout=3, named_types=5, includes=2)),
+    ('medium', dict(depth=4, fanout=8, group_fanout=3, named_types=10, includes=3)),
+    ('large', dict(depth=5, fanout=10, group_fanout=4, named_types=20, includes=5)),
+]
+
+INLINE_ROWS = 3
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = default_timer()
+        func()
+        timings.append(default_timer() - start)
+    timings.sort()
+    return {
+        'min': timings[0],
+        'median': timings[len(timings) // 2],
+        'repeat': repeat,
+    }
+
+
+def count_elements(el):
+    return 1 + sum(count_elements(sub) for sub in el.subelements)
+
+
+def sample_value(el):
+    if el.is_checkbox:
+        return 'X'
+    if el.is_select:
+        return 'A'
+    return '123'
+
+
+def make_payload(root, rows=INLINE_ROWS):
+    payload = {}
+    for name in root.get_flat_fields():
+        value = sample_value(root.get_element_by_path(name))
+        if '#{' in name:
+            for i in range(rows):
+                payload[name.replace(':0}', ':{0}}}'.format(i))] = value
+        else:
+            payload[name] = value
+    return payload
+
+
+def make_sparse_payload(payload):
+    ''' Same payload with inline indeces spread out, as it comes from a
+    form where rows were added and removed.
+    '''
+    return {k.replace(':1}', ':7}').replace(':2}', ':12}'): v for k, v in payload.items()}
+
+
+def compile_schema(path, compact=False):
+    schema = Generator(primitive_types_path=PRIMITIVE_TYPES_PATH, compact=compact).run(path)
+    root = schema[0]
+    root.parent = None
+    return root
+
+
+def run_scale(path, repeat):
+    results = OrderedDict()
+    sizes = OrderedDict()
+
+    results['compile'] = measure(lambda: compile_schema(path), max(repeat // 2, 1))
+    root = compile_schema(path)
+    sizes['elements'] = count_elements(root)
+
+    flat_fields = root.get_flat_fields()
+    hidden_fields = flat_fields[::10]
+    gridster_settings = [
+        {'prefixed_name': name, 'data-gs-x': 0, 'data-gs-y': i, 'data-gs-width': 6, 'data-gs-height': 2}
+        for i, name in enumerate(flat_fields[::5])]
+    payload = make_payload(root)
+    sizes['fields'] = len(flat_fields)
+    sizes['payload_keys'] = len(payload)
+
+    root.set_initial_data(payload)
+
+    def render(edit_mode):
+        return root.render_html(edit_mode=edit_mode,
+                                hidden_fields=hidden_fields,
+                                gridster_settings=gridster_settings)
+
+    results['render_view'] = measure(lambda: render(False), repeat)
+    results['render_edit'] = measure(lambda: render(True), repeat)
+    results['render_etree'] = measure(
+        lambda: root.render_etree(hidden_fields=hidden_fields, gridster_settings=gridster_settings), repeat)
+    sizes['html_view_bytes'] = len(render(False).encode('utf-8'))
+    sizes['html_edit_bytes'] = len(render(True).encode('utf-8'))
+
+    # the same form compiled with whitespace-minified templates
+    compact_root = compile_schema(path, compact=True)
+    compact_root.set_initial_data(payload)
+    for edit_mode, size in ((False, 'html_view_bytes_compact'), (True, 'html_edit_bytes_compact')):
+        html = compact_root.render_html(edit_mode=edit_mode, hidden_fields=hidden_fields,
+                                        gridster_settings=gridster_settings)
+        sizes[size] = len(html.encode('utf-8'))
+
+    results['validate_inputs'] = measure(
+        lambda: root.validate_inputs(dict(payload), hidden_fields=hidden_fields), repeat)
+
+    sparse_payload = make_sparse_payload(payload)
+    results['normalize_indeces'] = measure(lambda: Element.normalize_indeces(sparse_payload), repeat)
+
+    cleaned, _ = root.validate_inputs(dict(payload), hidden_fields=hidden_fields)
+    results['parse_inputs'] = measure(lambda: parse_inputs(cleaned), repeat)
+
+    parsed = parse_inputs(cleaned)
+    results['serialize_json'] = measure(lambda: serialize_json(parsed), repeat)
+    results['serialize_xml'] = measure(lambda: serialize_xml(parsed), repeat)
+    return results, sizes
+
+
+def current_commit():
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE)
+        return output.decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(scales, repeat):
+    report = {
+        'commit': current_commit(),
+        'timestamp': int(time.time()),
+        'python': platform.python_version(),
+        'scales': OrderedDict(),
+    }
+    directory = tempfile.mkdtemp(prefix='xsdance-bench-')
+    try:
+        for name, params in SCALES:
+            if name not in scales:
+                continue
+            path = generate_schema(os.path.join(directory, name), **params)
+            results, sizes = run_scale(path, repeat)
+            report['scales'][name] = {'params': params, 'sizes': sizes, 'results': results}
+            print_scale(name, sizes, results)
+    finally:
+        shutil.rmtree(directory)
+    return report
+
+
+def print_scale(name, sizes, results):
+    print('{0}: {1}'.format(name, ', '.join('{0}={1}'.format(k, v) for k, v in sizes.items())))
+    for bench, timing in results.items():
+        print('  {0:<20} {1:>10.2f} ms'.format(bench, timing['min'] * 1000))
+
+
+def compare(base_path, new_path):
+    with io.open(base_path, encoding='utf-8') as f:
+        base = json.load(f, object_pairs_hook=OrderedDict)
+    with io.open(new_path, encoding='utf-8') as f:
+        new = json.load(f, object_pairs_hook=OrderedDict)
+    print('{0} -> {1}'.format(base['commit'], new['commit']))
+    for scale, new_scale in new['scales'].items():
+        base_scale = base['scales'].get(scale)
+        if not base_scale:
+            continue
+        print(scale)
+        for bench, timing in new_scale['results'].items():
+            base_timing = base_scale['results'].get(bench)
+            if not base_timing:
+                continue
+            ratio = timing['min'] / base_timing['min'] if base_timing['min'] else float('inf')
+            print('  {0:<20} {1:>10.2f} ms {2:>10.2f} ms {3:>8.2f}x'.format(
+                bench, base_timing['min'] * 1000, timing['min'] * 1000, ratio))
+        for size, value in new_scale['sizes'].items():
+            base_value = base_scale['sizes'].get(size)
+            if base_value is not None and base_value != value:
+                print('  {0:<20} {1:>10} -> {2}'.format(size, base_value, value))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scales', default=','.join(name for name, _ in SCALES),
+                        help='comma separated scales to run')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-o', '--output', help='path of json results')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'),
+                        help='compare two json results and exit')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run(args.scales.split(','), args.repeat)
+    output = args.output or os.path.join(RESULTS_DIR, '{0}.json'.format(report['commit']))
+    if not os.path.isdir(os.path.dirname(os.path.abspath(output))):
+        os.makedirs(os.path.dirname(os.path.abspath(output)))
+    with io.open(output, 'wb') as f:
+        f.write(json.dumps(report, indent=2).encode('utf-8'))
+    print('results written to {0}'.format(output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+''' Generator of synthetic XSD forms, shaped like IRS e-file schemas.
+
+    >>> path = generate_schema('/tmp/synthetic', depth=3, fanout=4)
+    >>> Generator(primitive_types_path=PRIMITIVE_TYPES_PATH).run(path)
+'''
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import io
+import os
+import random
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PRIMITIVE_TYPES_PATH = os.path.join(HERE, '..', 'xsdance', 'IRS', 'primitive_types.xsd')
+
+NAMESPACE = 'http://www.example.com/synthetic'
+SCHEMA_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<xsd:schema xmlns="{ns}" xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+    'targetNamespace="{ns}" elementFormDefault="qualified" '
+    'attributeFormDefault="unqualified" version="1.0">\n'
+).format(ns=NAMESPACE)
+SCHEMA_FOOTER = '</xsd:schema>\n'
+
+WORDS = ['amount', 'total', 'income', 'tax', 'credit', 'deduction', 'dependent',
+         'care', 'expenses', 'business', 'property', 'foreign', 'address',
+         'name', 'line', 'schedule', 'interest', 'dividends', 'wages', 'payment']
+
+
+class _Writer(object):
+
+    def __init__(self):
+        self.lines = []
+        self.level = 1
+
+    def open(self, line):
+        self.add(line)
+        self.level += 1
+
+    def close(self, line):
+        self.level -= 1
+        self.add(line)
+
+    def add(self, line):
+        self.lines.append('    ' * self.level + line)
+
+    def annotation(self, text):
+        self.open('<xsd:annotation>')
+        self.open('<xsd:documentation>')
+        self.add('<Description>{0}</Description>'.format(text))
+        self.close('</xsd:documentation>')
+        self.close('</xsd:annotation>')
+
+    def getvalue(self):
+        return '\n'.join(self.lines) + '\n'
+
+
+class SyntheticSchema(object):
+    ''' Writes a form schema `<name>.xsd` and its included type files.
+
+    depth           levels of nested groups below the form element
+    fanout          children of every group
+    group_fanout    how many of them are groups, the rest are fields
+    named_types     named complex types, spread over the include files
+    ref_density     share of children declared with `ref` to an earlier element
+    choice_density  share of groups, whose children are in `xsd:choice`
+    inline_density  share of groups with maxOccurs="unbounded"
+    inline_depth    max count of nested unbounded groups
+    includes        count of included type files, all of them include one
+                    common file with simple types
+    '''
+
+    def __init__(self, name='SyntheticForm', depth=4, fanout=6, group_fanout=3, named_types=10,
+                 ref_density=0.05, choice_density=0.1, inline_density=0.2,
+                 inline_depth=2, includes=3, seed=0):
+        self.name = name
+        self.depth = depth
+        self.fanout = fanout
+        self.group_fanout = group_fanout
+        self.named_types = named_types
+        self.ref_density = ref_density
+        self.choice_density = choice_density
+        self.inline_density = inline_density
+        self.inline_depth = inline_depth
+        self.includes = max(includes, 1)
+        self.random = random.Random(seed)
+
+        self.counter = 0
+        self.simple_types = []
+        # (name, group id) of elements declared so far, targets for refs
+        self.declared = []
+
+    def _next_name(self, prefix):
+        self.counter += 1
+        return '{0}{1}'.format(prefix, self.counter)
+
+    def _label(self):
+        words = self.random.sample(WORDS, 3)
+        return 'Line {0} {1}'.format(self.counter, ' '.join(words))
+
+    def write(self, directory):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self._write_file(directory, 'common.xsd', self._common_types())
+        for i in range(self.includes):
+            self._write_file(directory, 'types_{0}.xsd'.format(i), self._named_types(i))
+        path = self._write_file(directory, '{0}.xsd'.format(self.name), self._form())
+        return path
+
+    @staticmethod
+    def _write_file(directory, file_name, content):
+        path = os.path.join(directory, file_name)
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(SCHEMA_HEADER + content + SCHEMA_FOOTER)
+        return path
+
+    def _common_types(self):
+        w = _Writer()
+        for i in range(4):
+            name = 'TextType{0}'.format(i)
+            w.open('<xsd:simpleType name="{0}">'.format(name))
+            w.open('<xsd:restriction base="xsd:string">')
+            w.add('<xsd:maxLength value="{0}"/>'.format(35 + 10 * i))
+            w.add('<xsd:pattern value="([A-Za-z0-9\\-] ?)*[A-Za-z0-9\\-]"/>')
+            w.close('</xsd:restriction>')
+            w.close('</xsd:simpleType>')
+            self.simple_types.append(name)
+
+            # derived type, a restriction chain of two levels
+            derived = 'ShortTextType{0}'.format(i)
+            w.open('<xsd:simpleType name="{0}">'.format(derived))
+            w.open('<xsd:restriction base="{0}">'.format(name))
+            w.add('<xsd:maxLength value="{0}"/>'.format(20 + i))
+            w.close('</xsd:restriction>')
+            w.close('</xsd:simpleType>')
+            self.simple_types.append(derived)
+
+        for i in range(2):
+            name = 'AmountType{0}'.format(i)
+            w.open('<xsd:simpleType name="{0}">'.format(name))
+            w.open('<xsd:restriction base="xsd:integer">')
+            w.add('<xsd:totalDigits value="15"/>')
+            w.add('<xsd:minInclusive value="0"/>')
+            w.close('</xsd:restriction>')
+            w.close('</xsd:simpleType>')
+            self.simple_types.append(name)
+
+        w.open('<xsd:simpleType name="CodeType">')
+        w.open('<xsd:restriction base="xsd:string">')
+        for code in ('A', 'B', 'C', 'D'):
+            w.add('<xsd:enumeration value="{0}"/>'.format(code))
+        w.close('</xsd:restriction>')
+        w.close('</xsd:simpleType>')
+        self.simple_types.append('CodeType')
+
+        w.open('<xsd:simpleType name="CheckboxType">')
+        w.open('<xsd:restriction base="xsd:string">')
+        w.add('<xsd:enumeration value="X"/>')
+        w.close('</xsd:restriction>')
+        w.close('</xsd:simpleType>')
+        self.simple_types.append('CheckboxType')
+
+        w.open('<xsd:simpleType name="DateType">')
+        w.add('<xsd:restriction base="xsd:date"/>')
+        w.close('</xsd:simpleType>')
+        self.simple_types.append('DateType')
+        return w.getvalue()
+
+    def _named_types(self, include_index):
+        w = _Writer()
+        w.add('<xsd:include schemaLocation="common.xsd"/>')
+        for i in range(include_index, self.named_types, self.includes):
+            w.open('<xsd:complexType name="GroupType{0}">'.format(i))
+            w.open('<xsd:sequence>')
+            for _ in range(self.fanout):
+                self._leaf(w, group_id=None)
+            w.close('</xsd:sequence>')
+            w.close('</xsd:complexType>')
+        return w.getvalue()
+
+    def _form(self):
+        w = _Writer()
+        for i in range(self.includes):
+            w.add('<xsd:include schemaLocation="types_{0}.xsd"/>'.format(i))
+        w.open('<xsd:element name="{0}">'.format(self.name))
+        w.annotation('Synthetic form {0}'.format(self.name))
+        self._group_content(w, level=0, inline_level=0)
+        w.close('</xsd:element>')
+        return w.getvalue()
+
+    def _occurs(self, min_occurs, max_occurs):
+        attrs = ''
+        if min_occurs != 1:
+            attrs += ' minOccurs="{0}"'.format(min_occurs)
+        if max_occurs != 1:
+            attrs += ' maxOccurs="{0}"'.format(max_occurs)
+        return attrs
+
+    def _leaf(self, w, group_id, optional=False):
+        name = self._next_name('Fld')
+        simple_type = self.random.choice(self.simple_types)
+        min_occurs = 0 if optional or self.random.random() < 0.5 else 1
+        w.open('<xsd:element name="{0}" type="{1}"{2}>'.format(
+            name, simple_type, self._occurs(min_occurs, 1)))
+        w.annotation(self._label())
+        w.close('</xsd:element>')
+        if group_id is not None:
+            self.declared.append((name, group_id))
+
+    def _group_content(self, w, level, inline_level):
+        group_id = self.counter
+        w.open('<xsd:complexType>')
+        is_choice = level and self.random.random() < self.choice_density
+        if is_choice:
+            w.open('<xsd:sequence>')
+            w.open('<xsd:choice minOccurs="0">')
+        else:
+            w.open('<xsd:sequence>')
+
+        for i in range(self.fanout):
+            refs = [name for name, declared_in in self.declared if declared_in != group_id]
+            if refs and not is_choice and self.random.random() < self.ref_density:
+                w.add('<xsd:element ref="{0}" minOccurs="0"/>'.format(self.random.choice(refs)))
+            elif is_choice or level + 1 >= self.depth or i >= self.group_fanout:
+                self._leaf(w, group_id, optional=is_choice)
+            elif self.named_types and self.random.random() < 0.3:
+                name = self._next_name('Grp')
+                type_index = self.random.randrange(self.named_types)
+                w.open('<xsd:element name="{0}" type="GroupType{1}" minOccurs="0">'.format(name, type_index))
+                w.annotation(self._label())
+                w.close('</xsd:element>')
+            else:
+                name = self._next_name('Grp')
+                inline = inline_level < self.inline_depth and self.random.random() < self.inline_density
+                occurs = self._occurs(0, 'unbounded' if inline else 1)
+                w.open('<xsd:element name="{0}"{1}>'.format(name, occurs))
+                w.annotation(self._label())
+                self._group_content(w, level + 1, inline_level + (1 if inline else 0))
+                w.close('</xsd:element>')
+                self.declared.append((name, group_id))
+
+        if is_choice:
+            w.close('</xsd:choice>')
+        w.close('</xsd:sequence>')
+        w.close('</xsd:complexType>')
+
+
+def generate_schema(directory, **kwargs):
+    ''' Writes a synthetic form to `directory` and returns path of its
+    main file. See `SyntheticSchema` for arguments.
+    '''
+    return SyntheticSchema(**kwargs).write(directory)
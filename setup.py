@@ -10,5 +10,14 @@ setup(name='xsdance',
       install_requires=[
           'lxml',
       ],
+      extras_require={
+          # columnar validation of bulk imports, see `xsdance.batch`
+          'numpy': ['numpy'],
+      },
       packages=['xsdance'],
+      entry_points={
+          'console_scripts': [
+              'xsdance-compile=xsdance.cli:main',
+          ],
+      },
       zip_safe=False)
@@ -1,2 +1,11 @@
 from generator import Generator
 from element import Element
+from cache import RenderCache
+from hidden_fields import HiddenFields
+from instrumentation import Instrument
+from compiled import CompiledSchema
+from xml_schema import InstanceValidator
+from instances import InstanceReader
+from batch import ColumnarValidator
+from pipeline import Pipeline
+from registry import SchemaRegistry
@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+''' Columnar validation of many rows of one inline element, for bulk imports.
+
+    >>> validator = ColumnarValidator(el.get_element_by_path('Form__Item_#{Item:0}'))
+    >>> errors = validator.validate_rows(csv.DictReader(f))
+
+Rows are turned into one column per leaf field of the element, and every
+validator of a field is applied to the whole column, with lengths, digits
+and integers of values computed once per column and shared by validators.
+With NumPy installed, these checks run on arrays, otherwise on lists.
+Patterns are compiled once per column. Checks only pick rows, which may
+fail, messages of them are made by the validators themselves, so errors
+are the same as `Element.validate_inputs` returns for rows one by one,
+keyed by prefixed names of fields in rows, e.g. `Form__Item_#{Item:2}__Amt`.
+Rows of inlines, which the element is in, are 0.
+'''
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import operator
+import re
+from collections import defaultdict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .catalog import Field
+from .hidden_fields import HiddenFields
+from .utils import NOOP_FACETS
+
+
+LENGTH_CHECKS = {
+    'minLength': operator.lt,
+    'length': operator.ne,
+    'maxLength': operator.gt,
+    # digits count should be less than the facet value, see `utils.funcs`
+    'totalDigits': operator.ge,
+}
+BOUND_CHECKS = {
+    'maxInclusive': operator.gt,
+    'maxExclusive': operator.ge,
+    'minInclusive': operator.lt,
+    'minExclusive': operator.le,
+}
+
+
+def _positions(mask):
+    if numpy is not None:
+        return numpy.flatnonzero(mask).tolist()
+    return [i for i, failed in enumerate(mask) if failed]
+
+
+def _compare(values, op, bound):
+    if numpy is not None:
+        return op(values, bound)
+    return [op(v, bound) for v in values]
+
+
+class Column(object):
+    ''' Non-empty values of a field, with positions of their rows. '''
+
+    def __init__(self, field, rows, values):
+        self.field = field
+        self.rows = rows
+        self.values = values
+        self._lengths = {}
+        self._integers = None
+
+    def lengths(self, rname):
+        ''' Lengths of values, as `rname` facet counts them. '''
+        key = 'digits' if rname == 'totalDigits' else 'chars'
+        if key not in self._lengths:
+            self._lengths[key] = self._count(key)
+        return self._lengths[key]
+
+    def _count(self, key):
+        if numpy is not None:
+            values = numpy.array(self.values, dtype=numpy.unicode_)
+            if key == 'digits':
+                for char in ',.L':
+                    values = numpy.char.replace(values, char, '')
+            return numpy.char.str_len(values)
+        if key == 'digits':
+            return [len(re.sub('[,.L]', '', v)) for v in self.values]
+        return [len(v) for v in self.values]
+
+    def integers(self):
+        ''' Values as integers, and positions of values, which are not. '''
+        if self._integers is None:
+            if numpy is not None:
+                self._integers = self._parse_integers()
+            else:
+                integers = []
+                invalid = []
+                for i, v in enumerate(self.values):
+                    try:
+                        integers.append(int(v))
+                    except (ValueError, TypeError):
+                        integers.append(0)
+                        invalid.append(i)
+                self._integers = integers, invalid
+        return self._integers
+
+    def _parse_integers(self):
+        # values of up to 18 digits with an optional sign fit int64, they are
+        # parsed from code points of all values at once, the rest by `int`
+        if not self.values:
+            return numpy.zeros(0, dtype=numpy.int64), []
+        values = numpy.array(self.values, dtype=numpy.unicode_)
+        codes = values.view(numpy.uint32).reshape(len(values), -1)
+        short = ~codes[:, 19:].any(axis=1)
+        codes = codes[:, :19]
+        signed = (codes[:, 0] == ord('-')) | (codes[:, 0] == ord('+'))
+        digits = (codes >= ord('0')) & (codes <= ord('9'))
+        allowed = digits | (codes == 0)
+        allowed[:, 0] |= signed
+        counts = digits.sum(axis=1)
+        fast = short & allowed.all(axis=1) & (counts > 0) & (counts <= 18)
+
+        integers = numpy.zeros(len(values), dtype=numpy.int64)
+        for j in range(codes.shape[1]):
+            integers = numpy.where(digits[:, j], integers * 10 + (codes[:, j].astype(numpy.int64) - ord('0')),
+                                   integers)
+        integers[codes[:, 0] == ord('-')] *= -1
+        integers[~fast] = 0
+
+        invalid = []
+        for i in numpy.flatnonzero(~fast).tolist():
+            try:
+                value = int(self.values[i])
+            except (ValueError, TypeError):
+                invalid.append(i)
+                continue
+            if not -2 ** 63 <= value < 2 ** 63:
+                integers = integers.astype(object)
+            integers[i] = value
+        return integers, invalid
+
+    def candidates(self, validator):
+        ''' Positions of values, which may fail `validator`. '''
+        rname = validator.rname
+        try:
+            if rname in LENGTH_CHECKS:
+                return _positions(_compare(self.lengths(rname), LENGTH_CHECKS[rname], int(validator.rvalue)))
+            if rname in BOUND_CHECKS:
+                integers, invalid = self.integers()
+                failed = _positions(_compare(integers, BOUND_CHECKS[rname], int(validator.rvalue)))
+                return sorted(set(failed).union(invalid))
+            if rname == 'enumeration':
+                if numpy is not None:
+                    return _positions(~numpy.isin(numpy.array(self.values, dtype=object),
+                                                  list(validator.rvalue)))
+                allowed = set(validator.rvalue)
+                return [i for i, v in enumerate(self.values) if v not in allowed]
+            if rname == 'pattern':
+                rx = re.compile(validator.rvalue)
+                return [i for i, v in enumerate(self.values) if not rx.match(v)]
+        except (ValueError, TypeError, re.error):
+            pass
+        # the validator tells, what is wrong with every value
+        return range(len(self.values))
+
+
+class ColumnarValidator(object):
+
+    def __init__(self, element, hidden_fields=None):
+        ''' `element` is an inline element of a tree, which rows are validated. '''
+        self.element = element
+        self.root = element
+        while self.root.parent is not None:
+            self.root = self.root.parent
+        hidden_fields = HiddenFields.compile(hidden_fields)
+        row_name = element.prefixed_name()
+        depth = len([el for el in self._get_path() if el.inlines_needed() is not None])
+        connector = '_' if 'choice' in element.name else element.nesting_connector
+
+        masks = [re.compile(mask) for mask in self.root.get_required_masks(hidden_fields)]
+        # fields of nested inlines have more than one row per row of the
+        # element, so they can't be columns
+        self.fields = {}
+        self.required = set()
+        for field in self.root.get_field_catalog().visible(hidden_fields):
+            if row_name in field.hidden_by and len(field.inlines) == depth:
+                name = field.name[len(row_name) + len(connector):]
+                self.fields[name] = field
+                if field.kind != Field.CHECKBOX and any(mask.match(field.name) for mask in masks):
+                    self.required.add(name)
+
+        self.choices = []
+        elements = list(element.subelements)
+        while elements:
+            el = elements.pop()
+            if el.prefixed_name() in hidden_fields:
+                continue
+            if 'choice' in el.name:
+                names = [name for name, field in self.fields.items()
+                         if el.prefixed_name() in field.hidden_by]
+                self.choices.append((el, names))
+            elements.extend(el.subelements)
+
+    def _get_path(self):
+        path = []
+        el = self.element
+        while el is not None:
+            path.append(el)
+            el = el.parent
+        return path
+
+    def get_field_name(self, name, row):
+        ''' Prefixed name of field of column `name` in `row`. '''
+        field = self.fields[name]
+        return field.format((0,) * (len(field.inlines) - 1) + (row,))
+
+    def validate_rows(self, rows):
+        ''' Validates `rows`, dicts of column name -> value, as csv readers
+        return them. Returns errors, as `validate_columns`.
+        '''
+        columns = defaultdict(list)
+        count = 0
+        for row in rows:
+            for name, value in row.items():
+                values = columns[name]
+                # columns, which are missing in some rows, are empty there
+                values.extend([None] * (count - len(values)))
+                values.append(value)
+            count += 1
+        for values in columns.values():
+            values.extend([None] * (count - len(values)))
+        return self.validate_columns(columns, count)
+
+    def validate_columns(self, columns, count=None):
+        ''' Validates `columns`, dict of column name -> sequence of values of
+        every row. Column names are prefixed names of fields, relative to
+        the element, e.g. `Amt` or `Address__City`. Returns dict of
+        prefixed name -> list of messages, like `Element.validate_inputs`.
+        '''
+        for name in columns:
+            if name not in self.fields:
+                raise self.element.PathNotFound(name)
+        if count is None:
+            count = max([len(values) for values in columns.values()] or [0])
+
+        errors = defaultdict(list)
+        filled = {}
+        for name, values in columns.items():
+            column = self._get_column(name, values)
+            filled[name] = column.rows
+            for validator in column.field.element.validators:
+                if validator.rname in NOOP_FACETS:
+                    continue
+                for i in column.candidates(validator):
+                    message = validator(column.values[i])
+                    if message:
+                        errors[self.get_field_name(name, column.rows[i])].append(message)
+            if name in self.required:
+                for row in sorted(set(range(count)).difference(column.rows)):
+                    errors[self.get_field_name(name, row)].insert(0, self.root.error_messages['required'])
+
+        self._validate_choices(columns, filled, count, errors)
+        if columns:
+            self._validate_rows_count(count, errors)
+        return dict(errors)
+
+    def _get_column(self, name, values):
+        el = self.fields[name].element
+        rows = []
+        processed = []
+        for row, value in enumerate(values):
+            if value is not None and el.processors:
+                value = el.process_value(value)
+            if value:
+                rows.append(row)
+                processed.append(value)
+        return Column(self.fields[name], rows, processed)
+
+    def _validate_choices(self, columns, filled, count, errors):
+        for choice, names in self.choices:
+            names = [name for name in names if name in columns]
+            # as in `Element.validate_inputs`, choices without inputs are not checked
+            if not names:
+                continue
+            if numpy is not None:
+                counts = numpy.zeros(count, dtype=int)
+                for name in names:
+                    counts[filled[name]] += 1
+            else:
+                counts = [0] * count
+                for name in names:
+                    for row in filled[name]:
+                        counts[row] += 1
+            for row, filled_count in enumerate(counts):
+                if not (choice.min_occurs <= filled_count <= choice.max_occurs):
+                    prefix = self.get_field_name(names[0], row).split(choice.name)[0]
+                    errors[prefix + choice.name].append(choice.get_choice_error_message())
+
+    def _validate_rows_count(self, count, errors):
+        el = self.element
+        if count > el.max_occurs:
+            errors[el.prefixed_name()].append(el.error_messages['max_occurs_violated'].format(el.max_occurs))
+        if count < el.min_occurs:
+            errors[el.prefixed_name()].append(el.error_messages['min_occurs_violated'].format(el.min_occurs))
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+from bisect import bisect_left
+from collections import OrderedDict
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+
+from .utils import GridsterSettings, InlineIndex
+
+
+def make_key(*parts):
+    dumped = json.dumps(parts, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(dumped.encode('utf-8')).hexdigest()
+
+
+def digest_data(data):
+    ''' Digest of initial data, the same for equal dicts. '''
+    return make_key(data or {})
+
+
+def digest_hidden_fields(hidden_fields):
+    return make_key(sorted(set(hidden_fields or [])))
+
+
+def digest_gridster_settings(gridster_settings):
+    # only the first settings of every name are used, see `GridsterSettings`
+    by_name = GridsterSettings.index(gridster_settings or []).by_name
+    return make_key(sorted(by_name.items(), key=lambda item: item[0] or ''))
+
+
+def digest_templates(element):
+    ''' Digest of templates of element class, which are the same for the
+    whole tree, so they are not in `Element.structure_digest`.
+    '''
+    return make_key(element.inlines_suffix_t, element.inlines_emtpy_suffix_t,
+                    element.gridster_default_settings, element.html_inline_block_wrapper,
+                    element.html_inline_window_placeholder)
+
+
+def render_fingerprint(element, edit_mode=False, hidden_fields=None, gridster_settings=None,
+                       initial_data=None, window=None):
+    ''' Digest of everything output of `element.render_html` depends on,
+    computed without rendering, e.g. for ETags of rendered forms. Data is
+    `element.initial_data`, unless `initial_data` is given.
+    '''
+    if initial_data is None:
+        initial_data = element.initial_data
+    return make_key(element.structure_digest(),
+                    element.prefixed_name(),
+                    sorted(element.get_gridster_default_settings().items()),
+                    digest_templates(element),
+                    bool(edit_mode),
+                    window,
+                    digest_hidden_fields(hidden_fields),
+                    digest_gridster_settings(gridster_settings),
+                    digest_data(initial_data))
+
+
+class LRUCache(object):
+    ''' Bounded in-memory mapping, least recently used entries are
+    evicted first. Safe to share between threads.
+    '''
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DiskCache(object):
+    ''' Directory backed mapping of hex keys to json values.
+
+    Files are written to a temporary name and renamed into place, so
+    several processes can share one directory without locking.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key, default=None):
+        try:
+            with io.open(self._path(key), encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return default
+
+    def set(self, key, value):
+        path = self._path(key)
+        dir_path = os.path.dirname(path)
+        if not os.path.isdir(dir_path):
+            try:
+                os.makedirs(dir_path)
+            except OSError:
+                # created by concurrent writer
+                pass
+        fd, tmp_path = tempfile.mkstemp(dir=dir_path, prefix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(json.dumps(value).encode('utf-8'))
+        os.rename(tmp_path, path)
+
+    def clear(self):
+        for dir_path, _, file_names in os.walk(self.directory):
+            for file_name in file_names:
+                os.remove(os.path.join(dir_path, file_name))
+
+
+class RenderCache(object):
+    ''' Cache of rendered element subtrees.
+
+    Fragments are stored in a bounded LRU and, if `directory` is given,
+    in a `DiskCache` which is consulted on memory misses. Pass an instance
+    as `render_cache` to `Element.render_html`.
+    '''
+
+    def __init__(self, maxsize=1024, directory=None):
+        self.memory = LRUCache(maxsize)
+        self.disk = DiskCache(directory) if directory else None
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def bind(self, initial_data, hidden_fields=None, gridster_settings=None, inline_index=None):
+        return RenderCacheSession(self, initial_data, hidden_fields, gridster_settings, inline_index)
+
+
+class RenderCacheSession(object):
+    ''' Per render call view of a `RenderCache`.
+
+    Hidden fields and gridster settings are sorted once, so the entries
+    relevant to a subtree are found by bisecting on its prefixed name.
+    '''
+
+    def __init__(self, cache, initial_data, hidden_fields=None, gridster_settings=None,
+                 inline_index=None):
+        self.cache = cache
+        self.initial_data = initial_data
+        self.hidden_fields = sorted(set(hidden_fields or []))
+        gridster_settings = sorted(gridster_settings or [],
+                                   key=lambda s: s.get('prefixed_name', None) or '')
+        self.gridster_names = [s.get('prefixed_name', None) or '' for s in gridster_settings]
+        self.gridster_settings = gridster_settings
+        self.inline_index = inline_index or InlineIndex(initial_data)
+
+    def bind(self, initial_data, hidden_fields=None, gridster_settings=None, inline_index=None):
+        return self
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value)
+
+    @staticmethod
+    def _prefix_slice(names, prefix):
+        start = bisect_left(names, prefix)
+        end = bisect_left(names, prefix + '\uffff', start)
+        return slice(start, end)
+
+    def get_inlines_counts(self, element, initial_data=None):
+        ''' Row counts of inlines in the subtree, which the render depends on. '''
+        if initial_data is None:
+            initial_data = element.initial_data
+        inline_index = self.inline_index
+        if initial_data is not self.initial_data:
+            inline_index = InlineIndex(initial_data)
+        return inline_index.subtree_counts(element.get_inline_path())
+
+    def key(self, element, edit_mode, render_empty_items=False, window=None, initial_data=None):
+        ''' `initial_data` is data of the render, if it is not data of `element`. '''
+        if initial_data is None:
+            initial_data = element.initial_data
+        prefix = element.prefixed_name(process_inlines=False)
+        hidden = self.hidden_fields[self._prefix_slice(self.hidden_fields, prefix)]
+        gridster = self.gridster_settings[self._prefix_slice(self.gridster_names, prefix)]
+        inlines_counts = self.get_inlines_counts(element, initial_data)
+        # default position depends on siblings, which are not in the subtree
+        return make_key(element.structure_digest(),
+                        element.prefixed_name(),
+                        sorted(element.get_gridster_default_settings().items()),
+                        bool(edit_mode),
+                        bool(render_empty_items),
+                        window,
+                        bool(initial_data),
+                        hidden,
+                        gridster,
+                        inlines_counts)
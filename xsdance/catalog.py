@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+''' Catalog of leaf fields of an element tree, built once per tree.
+
+Every field keeps its name split on indeces of inline rows it is in, so
+names of the field in rows, which are present in a payload, are made by
+joining the parts with the indeces from `InlineIndex`, without walking
+the tree again.
+'''
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+from .hidden_fields import HiddenFields
+from .utils import InlineIndex
+
+
+class Field(object):
+    ''' Leaf element, as it is named in inputs.
+
+    `name` has index 0 of every inline, as in `Element.get_flat_fields`.
+    `inlines` are names of inline elements, the field is repeated in, from
+    the top, the field itself included, and `parts` are pieces of the name
+    between their indeces. `hidden_by` are prefixed names of the field and
+    its parents, any of which hides the field.
+    '''
+
+    CHECKBOX = 'checkbox'
+    SELECT = 'select'
+
+    def __init__(self, element, parts, inlines, hidden_by):
+        self.element = element
+        self.parts = parts
+        self.inlines = inlines
+        self.hidden_by = hidden_by
+        self.name = '0'.join(parts)
+        self.required = element.required
+        self.kind = None
+        if element.is_checkbox:
+            self.kind = self.CHECKBOX
+        elif element.is_select:
+            self.kind = self.SELECT
+        # length of `_#{name:` before each index, cut to get the prefixed
+        # name of inline, which rows are looked up in the index
+        self._cuts = [len('_#{{{0}:'.format(name)) for name in inlines]
+
+    def __repr__(self):
+        return '<Field {0}>'.format(self.name)
+
+    def is_hidden(self, hidden_fields):
+        return any(name in hidden_fields for name in self.hidden_by)
+
+    def format(self, indeces):
+        ''' Name of the field in rows with `indeces` of its `inlines`. '''
+        parts = [self.parts[0]]
+        for index, part in zip(indeces, self.parts[1:]):
+            parts.append('{0}{1}'.format(index, part))
+        return ''.join(parts)
+
+    def expand(self, inline_index):
+        ''' Names of the field in every row of its inlines, which is present
+        in `inline_index`.
+        '''
+        names = [self.parts[0]]
+        for cut, part in zip(self._cuts, self.parts[1:]):
+            names = ['{0}{1}{2}'.format(prefix, i, part)
+                     for prefix in names
+                     for i in inline_index.indeces(prefix[:-cut])]
+        return names
+
+
+class FieldCatalog(object):
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    @classmethod
+    def build(cls, root):
+        ''' Collects leaves of `root`, in order of `Element.get_flat_fields`,
+        names start with the name of `root`.
+        '''
+        fields = []
+        elements = [(sub, ['{0}__'.format(root.name)], (), ())
+                    for sub in reversed(root.subelements)]
+        while elements:
+            el, parts, inlines, hidden_by = elements.pop()
+            hidden_by = hidden_by + (el.prefixed_name(),)
+            parts = list(parts)
+            if el.inlines_needed() is not None:
+                parts[-1] += '{0}_#{{{0}:'.format(el.name)
+                parts.append('}')
+                inlines = inlines + (el.name,)
+            else:
+                parts[-1] += el.name
+            if not el.subelements:
+                fields.append(Field(el, parts, inlines, hidden_by))
+                continue
+            parts[-1] += '_' if 'choice' in el.name else '__'
+            elements.extend((sub, parts, inlines, hidden_by) for sub in reversed(el.subelements))
+        return cls(fields)
+
+    def visible(self, hidden_fields=None):
+        hidden_fields = HiddenFields.compile(hidden_fields)
+        if not hidden_fields:
+            return list(self.fields)
+        return [field for field in self.fields if not field.is_hidden(hidden_fields)]
+
+    def names(self, hidden_fields=None):
+        return [field.name for field in self.visible(hidden_fields)]
+
+    def checkboxes(self, data, hidden_fields=None, inline_index=None):
+        ''' Names of checkboxes in rows present in `data`. '''
+        if inline_index is None:
+            inline_index = InlineIndex(data)
+        names = []
+        for field in self.visible(hidden_fields):
+            if field.kind == Field.CHECKBOX:
+                names += field.expand(inline_index)
+        return names
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+''' Compiles XSD forms to pickled `CompiledSchema` files.
+
+    xsdance-compile IRS/Federal/2015v3.0 -o compiled/ -j 4
+    xsdance-compile IRS/Federal/2015v3.0 -o compiled/ --incremental
+    xsdance-compile schemas/ -o compiled/ --watch
+
+Directories are searched recursively for `*.xsd` files. Output files
+mirror paths of sources relative to the given directory, with `.pickle`
+extension. Files without top level elements, like common type files, are
+reported and skipped.
+
+The output directory keeps `dependencies.json` graph, so `--incremental`
+runs compile again only forms, which are affected by changed files, see
+`xsdance.dependencies`. `--watch` runs incremental builds on every change.
+`--manifest` writes JSON manifest for client validation next to each
+compiled file, with `.manifest.json` extension, see `xsdance.manifest`.
+'''
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import argparse
+import fnmatch
+import io
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+from timeit import default_timer
+
+from .compiled import CompiledSchema
+from .dependencies import DependencyGraph, file_digest, is_up_to_date
+from .generator import Generator
+
+
+COMPILED_EXTENSION = '.pickle'
+MANIFEST_EXTENSION = '.manifest.json'
+GRAPH_FILE_NAME = 'dependencies.json'
+
+# parsed includes, shared by all forms compiled in the process
+_include_cache = {}
+
+
+def find_schemas(paths, pattern='*.xsd'):
+    ''' Returns list of (source path, path relative to the output dir). '''
+    result = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dir_path, dir_names, file_names in os.walk(path):
+                dir_names.sort()
+                for file_name in sorted(fnmatch.filter(file_names, pattern)):
+                    source = os.path.join(dir_path, file_name)
+                    result.append((source, os.path.relpath(source, path)))
+        else:
+            result.append((path, os.path.basename(path)))
+    return result
+
+
+def get_manifest_path(output_path):
+    return os.path.splitext(output_path)[0] + MANIFEST_EXTENSION
+
+
+def is_compiled(entry, output_path, manifest):
+    ''' Whether the form with recorded `entry` has compiled files. Forms,
+    which have no manifest yet, are compiled again to write it.
+    '''
+    return (entry is not None and os.path.exists(output_path) and
+            (not manifest or os.path.exists(get_manifest_path(output_path))))
+
+
+def compile_schema(task):
+    ''' Compiles one form, runs in pool workers, so takes and returns
+    plain values only. If recorded dependencies of the form are given, and
+    the form is up to date, its compiled file is reused.
+    '''
+    source, output_path, primitive_types_path, entry, manifest, digests = task
+    manifest_path = get_manifest_path(output_path) if manifest else None
+    result = {'source': source, 'output': None, 'elements': 0, 'time': 0.0, 'error': None,
+              'reused': False, 'files': None, 'types': None}
+    try:
+        if is_compiled(entry, output_path, manifest):
+            generator = Generator(primitive_types_path=primitive_types_path,
+                                  include_cache=_include_cache)
+            up_to_date, files = is_up_to_date(entry, source, generator, digests)
+            if up_to_date:
+                result.update(output=output_path, reused=True, files=files, types=entry['types'])
+                return result
+
+        generator = Generator(primitive_types_path=primitive_types_path,
+                              include_cache=_include_cache)
+        compiled = CompiledSchema.compile(source, generator=generator)
+    except (Exception, Generator.ElementNotFound, Generator.TypeNotFound) as e:
+        result['error'] = '{0}: {1}'.format(type(e).__name__, e)
+        return result
+
+    result['time'] = compiled.compile_time
+    result['elements'] = compiled.elements_count
+    if compiled.elements:
+        compiled.save(output_path)
+        result['output'] = output_path
+        if manifest_path is not None:
+            with io.open(manifest_path, 'w', encoding='utf-8') as f:
+                f.write(compiled.manifest())
+        result['files'] = {path: file_digest(path) for path in compiled.files}
+        result['types'] = compiled.types
+    return result
+
+
+def compile_schemas(paths, output_dir, jobs=None, primitive_types_path=None, pattern='*.xsd',
+                    incremental=False, manifest=False):
+    ''' Compiles forms found in `paths` to `output_dir`, with `jobs`
+    processes, and yields result of each form, as it is ready. With
+    `manifest`, manifests of forms are written next to compiled files.
+    '''
+    primitive_types_path = os.path.abspath(primitive_types_path or Generator.PRIMITIVE_TYPES_PATH)
+    # files may have changed since the last build in this process
+    _include_cache.clear()
+    graph_path = os.path.join(output_dir, GRAPH_FILE_NAME)
+    graph = DependencyGraph.load(graph_path)
+    # files are hashed once, workers get digests of forms they check
+    digests = graph.file_digests() if incremental else {}
+    affected = graph.affected_forms(graph.changed_files(digests))
+
+    tasks = []
+    reused = []
+    for source, relative in find_schemas(paths, pattern):
+        source = os.path.abspath(source)
+        output_path = os.path.join(output_dir, os.path.splitext(relative)[0] + COMPILED_EXTENSION)
+        entry = graph.get(source) if incremental else None
+        if source not in affected and is_compiled(entry, output_path, manifest):
+            reused.append({'source': source, 'output': output_path, 'elements': 0, 'time': 0.0,
+                           'error': None, 'reused': True, 'files': entry['files'],
+                           'types': entry['types']})
+            continue
+        form_digests = {path: digests[path] for path in entry['files']} if entry else None
+        tasks.append((source, output_path, primitive_types_path, entry, manifest, form_digests))
+    # biggest forms first, so workers are not left waiting for one of them
+    tasks.sort(key=lambda task: os.path.getsize(task[0]), reverse=True)
+
+    for result in itertools.chain(reused, _run_tasks(tasks, jobs)):
+        if result['files']:
+            graph.record(result['source'], result['output'], result['files'], result['types'])
+        else:
+            graph.forget(result['source'])
+        yield result
+
+    for source in list(graph.forms):
+        if not os.path.exists(source):
+            graph.forget(source)
+    graph.save(graph_path)
+
+
+def _run_tasks(tasks, jobs=None):
+    jobs = jobs or multiprocessing.cpu_count()
+    if jobs == 1 or len(tasks) < 2:
+        for task in tasks:
+            yield compile_schema(task)
+        return
+
+    pool = multiprocessing.Pool(min(jobs, len(tasks)))
+    try:
+        for result in pool.imap_unordered(compile_schema, tasks):
+            yield result
+    finally:
+        pool.terminate()
+
+
+def _snapshot(paths, output_dir, pattern):
+    ''' Modification times of sources and of all files they depend on. '''
+    files = set(source for source, _ in find_schemas(paths, pattern))
+    for entry in DependencyGraph.load(os.path.join(output_dir, GRAPH_FILE_NAME)).forms.values():
+        files.update(entry['files'])
+    snapshot = {}
+    for path in files:
+        try:
+            snapshot[path] = os.path.getmtime(path)
+        except OSError:
+            snapshot[path] = None
+    return snapshot
+
+
+def watch(paths, output_dir, interval=1.0, **kwargs):
+    ''' Runs incremental builds, each time sources or files they depend on
+    are changed, until interrupted.
+    '''
+    pattern = kwargs.get('pattern', '*.xsd')
+    snapshot = None
+    while True:
+        current = _snapshot(paths, output_dir, pattern)
+        if current != snapshot:
+            report(compile_schemas(paths, output_dir, incremental=True, **kwargs))
+            # taken after the build, so files written meanwhile trigger the next one
+            snapshot = _snapshot(paths, output_dir, pattern)
+        time.sleep(interval)
+
+
+def report(results):
+    start = default_timer()
+    compiled = reused = skipped = failed = 0
+    for result in results:
+        if result['error']:
+            failed += 1
+            print('FAIL {source}: {error}'.format(**result))
+        elif result['reused']:
+            reused += 1
+        elif result['output']:
+            compiled += 1
+            print('OK   {source}: {elements} elements, {time:.2f}s'.format(**result))
+        else:
+            skipped += 1
+            print('SKIP {source}: no top level elements'.format(**result))
+
+    print('{0} compiled, {1} up to date, {2} skipped, {3} failed in {4:.2f}s'.format(
+        compiled, reused, skipped, failed, default_timer() - start))
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('paths', nargs='+', help='XSD files or directories')
+    parser.add_argument('-o', '--output', default='.', help='output directory')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='count of processes, default is count of CPUs')
+    parser.add_argument('--primitive-types', default=None,
+                        help='path of primitive types XSD')
+    parser.add_argument('--pattern', default='*.xsd', help='file name pattern in directories')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='compile only forms affected by changed files')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='compile incrementally on every change, until interrupted')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='seconds between checks for changes in watch mode')
+    parser.add_argument('--manifest', action='store_true',
+                        help='write JSON manifest for client validation of each form')
+    args = parser.parse_args(argv)
+
+    kwargs = {
+        'jobs': args.jobs,
+        'primitive_types_path': args.primitive_types,
+        'pattern': args.pattern,
+        'manifest': args.manifest,
+    }
+    if args.watch:
+        try:
+            watch(args.paths, args.output, interval=args.interval, **kwargs)
+        except KeyboardInterrupt:
+            return 0
+
+    failed = report(compile_schemas(args.paths, args.output, incremental=args.incremental, **kwargs))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import io
+import os
+import tempfile
+from timeit import default_timer
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from .generator import Generator
+from .manifest import dump_manifest
+from .search import SearchIndex
+from .xml_schema import InstanceValidator
+
+
+class CompiledSchemaError(Exception):
+    pass
+
+
+class CompiledSchema(object):
+    ''' Top level elements of a compiled XSD form, with metadata needed to
+    reuse them without compiling the form again.
+
+        >>> compiled = CompiledSchema.compile('IRS1040.xsd')
+        >>> compiled.save('IRS1040.pickle')
+        >>> el = CompiledSchema.load('IRS1040.pickle').element
+    '''
+
+    # bumped, when pickled elements are not compatible with the code
+    FORMAT_VERSION = 5
+
+    def __init__(self, elements, source=None, included_files=None, compile_time=None,
+                 primitive_types_path=None, types=None, search_index=None):
+        self.elements = elements
+        self.source = source
+        self.included_files = included_files or []
+        self.primitive_types_path = primitive_types_path
+        # type name -> (path, digest), see `Generator.resolved_types`
+        self.types = types or {}
+        self.compile_time = compile_time
+        self.format_version = self.FORMAT_VERSION
+        self.search_index = search_index
+        self._instance_validator = None
+
+    def __getstate__(self):
+        # compiled XMLSchema can't be pickled, it is built again on demand
+        state = self.__dict__.copy()
+        state['_instance_validator'] = None
+        return state
+
+    @classmethod
+    def compile(cls, path, generator=None, **generator_kwargs):
+        ''' Compiles form at `path`. Field catalogs and the search index
+        are built here, unless the generator is lazy: they need the whole
+        tree, so a lazy form builds them on first use, or in `save`.
+        '''
+        generator = generator or Generator(**generator_kwargs)
+        start = default_timer()
+        schema = generator.run(path)
+        compile_time = default_timer() - start
+
+        elements = list(schema.subelements)
+        for el in elements:
+            el.parent = None
+        compiled = cls(elements,
+                       source=os.path.abspath(path),
+                       included_files=list(generator.included_files),
+                       compile_time=compile_time,
+                       primitive_types_path=os.path.abspath(generator.primitive_types_path),
+                       types=dict(generator.resolved_types))
+        if not generator.lazy:
+            compiled.expand()
+        return compiled
+
+    def expand(self):
+        ''' Parses deferred content of all elements and builds field
+        catalogs and the search index, which are pickled with the elements,
+        so loaded forms do not build them.
+        '''
+        for el in self.elements:
+            el.get_field_catalog()
+        if self.search_index is None:
+            self.search_index = SearchIndex.build(self.elements)
+
+    @property
+    def files(self):
+        ''' All files, the compiled form depends on. '''
+        files = [self.source] + self.included_files
+        if self.primitive_types_path:
+            files.append(self.primitive_types_path)
+        return files
+
+    @property
+    def element(self):
+        if not self.elements:
+            raise CompiledSchemaError('{0} has no top level elements'.format(self.source))
+        return self.elements[0]
+
+    @property
+    def elements_count(self):
+        count = 0
+        stack = list(self.elements)
+        while stack:
+            el = stack.pop()
+            count += 1
+            stack.extend(el.subelements)
+        return count
+
+    def instance_validator(self):
+        ''' `InstanceValidator` of the form, the XSD is compiled by libxml2
+        on the first call and kept with the compiled form.
+        '''
+        if self._instance_validator is None:
+            self._instance_validator = InstanceValidator(self.source, self.element)
+        return self._instance_validator
+
+    def search(self, query, limit=None):
+        ''' Prefixed names of elements, which labels, help texts, names or
+        documentation match words of `query`, see `xsdance.search`.
+        '''
+        if self.search_index is None:
+            self.search_index = SearchIndex.build(self.elements)
+        return self.search_index.search(query, limit)
+
+    def manifest(self):
+        ''' Compact JSON manifest of the form for client validation, see
+        `xsdance.manifest`.
+        '''
+        return dump_manifest(self.element)
+
+    def digest(self):
+        return ''.join(el.structure_digest() for el in self.elements)
+
+    def save(self, path):
+        ''' Pickles compiled schema to `path`, the file is replaced
+        atomically, so readers never see a partial one. Lazily compiled
+        form is expanded first.
+        '''
+        self.expand()
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with io.open(path, 'rb') as f:
+            compiled = pickle.load(f)
+        if not isinstance(compiled, cls) or compiled.format_version != cls.FORMAT_VERSION:
+            raise CompiledSchemaError('{0} is not compatible, compile it again'.format(path))
+        return compiled
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+''' Dependency graph of compiled forms: files -> named types -> forms.
+
+For every compiled form the graph keeps digests of the files it depends
+on (the form, its includes and primitive types), and digests of named
+types it resolved, with files they were found in. When a file changes,
+only forms depending on it are checked, and of them only the ones, which
+resolve some type to a different definition, need to be compiled again.
+'''
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+from collections import defaultdict
+
+
+def file_digest(path):
+    try:
+        with io.open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except (IOError, OSError):
+        return None
+
+
+class DependencyGraph(object):
+
+    VERSION = 1
+
+    def __init__(self, forms=None):
+        # source -> {'output': path, 'files': {path: digest}, 'types': {name: [path, digest]}}
+        self.forms = forms or {}
+
+    @classmethod
+    def load(cls, path):
+        ''' Returns graph saved to `path`, or an empty one, if there is no
+        graph or it was saved by other version.
+        '''
+        try:
+            with io.open(path, 'rb') as f:
+                data = json.loads(f.read().decode('utf-8'))
+        except (IOError, OSError, ValueError):
+            return cls()
+        if data.get('version') != cls.VERSION:
+            return cls()
+        return cls(data['forms'])
+
+    def save(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(json.dumps({'version': self.VERSION, 'forms': self.forms},
+                               indent=1, sort_keys=True).encode('utf-8'))
+        os.rename(tmp_path, path)
+
+    def record(self, source, output, files, types):
+        self.forms[source] = {
+            'output': output,
+            'files': files,
+            'types': {name: list(value) for name, value in types.items()},
+        }
+
+    def forget(self, source):
+        self.forms.pop(source, None)
+
+    def get(self, source):
+        return self.forms.get(source)
+
+    def files_to_forms(self):
+        result = defaultdict(set)
+        for source, entry in self.forms.items():
+            for path in entry['files']:
+                result[path].add(source)
+        return result
+
+    def file_digests(self):
+        ''' Current digests of all recorded files, each file is read once. '''
+        return {path: file_digest(path) for path in self.files_to_forms()}
+
+    def changed_files(self, digests=None):
+        ''' Files, which `digests` differ from recorded ones. '''
+        if digests is None:
+            digests = self.file_digests()
+        changed = set()
+        for entry in self.forms.values():
+            for path, digest in entry['files'].items():
+                if digests.get(path) != digest:
+                    changed.add(path)
+        return changed
+
+    def affected_forms(self, changed_files):
+        ''' Forms, which depend on any of `changed_files`. '''
+        files_to_forms = self.files_to_forms()
+        result = set()
+        for path in changed_files:
+            result.update(files_to_forms.get(os.path.abspath(path), ()))
+        return result
+
+
+def is_up_to_date(entry, source, generator, digests=None):
+    ''' Checks recorded `entry` of `source` form against current files,
+    `digests` of them are computed, if not given.
+
+    Returns (up to date, current file digests). A form is up to date, if
+    the form file itself is not changed, it includes the same files, and
+    every named type it used resolves to the same definition, so compiling
+    it again would give the same elements.
+    '''
+    digests = digests or {}
+    files = {path: digests[path] if path in digests else file_digest(path) for path in entry['files']}
+    if files == entry['files']:
+        return True, files
+    if files.get(source) != entry['files'].get(source):
+        return False, files
+
+    types = generator.resolve_types(source, list(entry['types']))
+    current_files = set([os.path.abspath(source)] + generator.include_paths)
+    if current_files != set(entry['files']):
+        return False, files
+    for name, value in entry['types'].items():
+        if types.get(name) != tuple(value):
+            return False, files
+    return True, files
@@ -2,22 +2,32 @@
 from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
 from pprint import pprint  # NOQA
 import json
-import copy
-from cgi import escape
+import hashlib
 import re
 from collections import defaultdict, OrderedDict
 from itertools import groupby
 
-from .utils import serialize_xml, serialize_json
+from .utils import serialize_xml, serialize_json, substitute_placeholders, GridsterSettings, InlineTemplate, \
+    InlineIndex, re_inline_parent_name, re_inline_suffix, format_template
+from .hidden_fields import HiddenFields
+from .instrumentation import NULL_INSTRUMENT
+from .html_tree import TreeRenderer
+from .catalog import FieldCatalog
+from .cache import render_fingerprint
 
 
 class ValueRequiredError(BaseException):
     pass
 
 
+class PathNotFound(BaseException):
+    pass
+
+
 class Element(object):
 
     ValueRequiredError = ValueRequiredError
+    PathNotFound = PathNotFound
 
     nesting_connector = '__'
     error_messages = {
@@ -34,7 +44,23 @@ class Element(object):
         'data-gs-height': 3,
     }
     inlines_suffix_t = '_#{{{name}:{index}}}'
+    html_error = '<div class="error" id="{prefixed_name}"></div>'
+    html_inline_block_wrapper = '''
+            <div class="grid-stack fieldset-content">
+                {content}
+                {add_button}
+            </div>
+        '''
     inlines_emtpy_suffix_t = '_#{{{name}}}'
+    # stands for rows, which are not rendered in windowed mode, see
+    # `render_html` and `render_inline_rows`
+    html_inline_window_placeholder = '''
+            <div class="inline-window-placeholder"
+                data-element-prefixed-name="{prefixed_name}"
+                data-offset="{offset}"
+                data-count="{count}"
+                data-total-count="{total_count}"></div>
+        '''
 
     def __init__(self, name, initial_data=None,
                  label_text='',
@@ -51,6 +77,7 @@ class Element(object):
                  html_inline_button_add=None, html_inline_button_remove=None,
                  html_inline_buttons_wrapper=None,
                  html_inline_item_wrapper=None,
+                 html_empty_item_template=None,
 
                  **kwargs):
 
@@ -79,6 +106,7 @@ class Element(object):
         self.html_inline_button_remove = html_inline_button_remove
         self.html_inline_buttons_wrapper = html_inline_buttons_wrapper
         self.html_inline_item_wrapper = html_inline_item_wrapper
+        self.html_empty_item_template = html_empty_item_template
         # end
 
         self.kwargs = kwargs
@@ -87,7 +115,12 @@ class Element(object):
         self._cleaned_data = {}
         self.errors = {}
 
+        # deferred content of lazily compiled trees, see `Generator.lazy`
+        self._pending = None
         self.subelements = []
+        self.position = 0
+        self._structure_digest = None
+        self._field_catalog = None
 
         if parent:
             parent.add_subelement(self)
@@ -95,6 +128,16 @@ class Element(object):
                 initial_data = parent.initial_value.get(self.name, None)
                 self.initial_data[self.name] = initial_data
 
+    @property
+    def subelements(self):
+        if self._pending is not None:
+            self._pending()
+        return self._subelements
+
+    @subelements.setter
+    def subelements(self, value):
+        self._subelements = value
+
     def __getitem__(self, index):
         return self.subelements[index]
 
@@ -129,107 +172,324 @@ class Element(object):
 
         return result
 
-    def get_flat_fields(self, hidden_fields=None, acc_list=None):
-        hidden_fields = hidden_fields or []
-        acc_list = acc_list or ['{0}__'.format(self.name)]
-        names = []
-        for sub in self.subelements:
-            if sub.prefixed_name() not in hidden_fields:
-
-                name = sub._get_name_with_inline_suffix() if sub.inlines_needed() is not None else sub.name
-                if not sub.subelements:
-                    names += ['{0}{1}'.format(p, name) for p in acc_list]
-                else:
-                    new_acc = ['{0}{1}{2}'.format(p, name, '_' if 'choice' in sub.name else '__') for p in acc_list]
-                    if new_acc:
-                        names += sub.get_flat_fields(
-                            hidden_fields=hidden_fields,
-                            acc_list=new_acc)
-        return names
-
-    def get_all_checkboxes(self, data, acc_list=None, hidden_fields=None):
-        hidden_fields = hidden_fields or []
-        acc_list = acc_list or ['{0}__'.format(self.name)]
-
-        names = []
-        for sub in self.subelements:
-            # following cases are all mutually exclusive, the second and the third
-            # are here to eliminate nested if's
-            if sub.prefixed_name() not in hidden_fields:
-
-                if sub.is_checkbox:
-                    names += ['{0}{1}'.format(p, sub.name) for p in acc_list]
-
-                new_acc = []
-                if sub.subelements and sub.inlines_needed() is not None:
-                    new_acc = ['{0}{1}__'.format(p, sub._get_name_with_inline_suffix(index=i))
-                               for p in acc_list
-                               for i in self.get_distinct_inlines_count(sub.name, data.keys(), count=False)]
-
-                if sub.subelements and sub.inlines_needed() is None:
-                    new_acc = ['{0}{1}{2}'.format(p, sub.name, '_' if 'choice' in sub.name else '__')
-                               for p in acc_list]
-
-                if new_acc:
-                    names += sub.get_all_checkboxes(
-                        data,
-                        new_acc,
-                        hidden_fields=hidden_fields)
-        return names
-
-    def render_html(self, edit_mode=False, hidden_fields=None, gridster_settings=None):
+    def get_field_catalog(self):
+        ''' `FieldCatalog` of leaves of the element, built once and reset
+        when subelements are added.
+        '''
+        if self._field_catalog is None:
+            self._field_catalog = FieldCatalog.build(self)
+        return self._field_catalog
+
+    def get_flat_fields(self, hidden_fields=None):
+        return self.get_field_catalog().names(hidden_fields)
+
+    def get_all_checkboxes(self, data, hidden_fields=None, inline_index=None):
+        ''' Names of checkboxes in inline rows, which are present in `data`. '''
+        return self.get_field_catalog().checkboxes(data, hidden_fields, inline_index)
+
+    def render_html(self, edit_mode=False, hidden_fields=None, gridster_settings=None,
+                    render_cache=None, empty_items=None, instrument=None, window=None,
+                    inline_index=None, initial_data=None):
+        ''' If `window` is given, only first `window` rows of every inline
+        element are rendered, followed by a placeholder with offset and
+        count of the rest, which are rendered with `render_inline_rows`.
+        `initial_data` is rendered instead of `initial_data` of elements
+        of the subtree, which are not changed.
+        '''
+        instrument = instrument or NULL_INSTRUMENT
+        if empty_items is not None:
+            return self._render_html(edit_mode, hidden_fields, gridster_settings,
+                                     render_cache, empty_items, instrument, window, inline_index,
+                                     initial_data)
+        with instrument.phase('render'):
+            return self._render_html(edit_mode, hidden_fields, gridster_settings,
+                                     render_cache, empty_items, instrument, window, inline_index,
+                                     initial_data)
+
+    def _render_html(self, edit_mode, hidden_fields, gridster_settings,
+                     render_cache, empty_items, instrument, window=None, inline_index=None,
+                     initial_data=None):
+        hidden_fields = HiddenFields.compile(hidden_fields)
+        gridster_settings = GridsterSettings.index(gridster_settings)
+        data = self.initial_data if initial_data is None else initial_data
+        # rows of all inlines of the subtree are found in one pass over data
+        if inline_index is None:
+            inline_index = InlineIndex(data)
+        if render_cache is not None:
+            render_cache = render_cache.bind(data, hidden_fields, gridster_settings, inline_index)
+        # empty inline items of the whole subtree are collected here and
+        # rendered once, by the element render started from
+        render_empty_items = empty_items is None
+        if render_empty_items:
+            empty_items = OrderedDict()
         kwargs = {
             'edit_mode': edit_mode,
             'hidden_fields': hidden_fields,
-            'gridster_settings': gridster_settings
+            'gridster_settings': gridster_settings,
+            'render_cache': render_cache,
+            'empty_items': empty_items,
+            'instrument': instrument,
+            'window': window,
+            'inline_index': inline_index,
+            'initial_data': initial_data,
         }
 
         if not edit_mode and self.prefixed_name() in hidden_fields:
             return None
 
+        with instrument.phase('render_element', element=self):
+            if render_cache is not None:
+                cache_key = render_cache.key(self, edit_mode, render_empty_items, window, initial_data)
+                cached = render_cache.get(cache_key)
+                if cached is None:
+                    instrument.count('render_cache.misses')
+                    registered = len(empty_items)
+                    content = self._render_element_html(render_empty_items=render_empty_items, **kwargs)
+                    render_cache.set(cache_key, [content, list(empty_items.items())[registered:]])
+                else:
+                    instrument.count('render_cache.hits')
+                    content, subtree_empty_items = cached
+                    empty_items.update(subtree_empty_items)
+            else:
+                content = self._render_element_html(render_empty_items=render_empty_items, **kwargs)
+
+        if not self.parent:
+            with instrument.phase('placeholder_substitution'):
+                content = substitute_placeholders(content, data)
+                instrument.count('regex_evaluations')
+        return content
+
+    def render_fingerprint(self, edit_mode=False, hidden_fields=None, gridster_settings=None,
+                           window=None, initial_data=None):
+        ''' Fingerprint of output of `render_html` with the same arguments,
+        which changes, when the output may change. It is computed without
+        rendering, see `cache.render_fingerprint`.
+        '''
+        return render_fingerprint(self, edit_mode, hidden_fields, gridster_settings,
+                                  initial_data, window)
+
+    def render_etree(self, edit_mode=False, hidden_fields=None, gridster_settings=None,
+                     create_parent=None, window=None):
+        ''' Renders element to `lxml.html` elements, like `render_html`, but
+        without building and parsing the html string. Returns list of
+        nodes, as `lxml.html.fragments_fromstring` does, or an element with
+        `create_parent` tag, containing them.
+        '''
+        renderer = TreeRenderer(edit_mode=edit_mode,
+                                hidden_fields=hidden_fields,
+                                gridster_settings=gridster_settings,
+                                window=window)
+        content = renderer.render(self)
+        if content is None:
+            return None
+        if create_parent:
+            content.container.tag = create_parent
+            return content.container
+        return content.nodes()
+
+    def render_fragment(self, path, index=None, edit_mode=False, hidden_fields=None,
+                        gridster_settings=None, instrument=None, window=None):
+        ''' Renders subtree at prefixed `path`, e.g. `r__a_#{a:2}__b`, with
+        its data, hidden fields and gridster settings, as it is rendered in
+        the whole form. Indeces of parent inlines are taken from `path`.
+
+        If `index` is given, or `path` ends with an index, the element
+        should be inline, and only its row with the index is rendered,
+        wrapped as other rows are. Empty items are not rendered, templates
+        of the form are still valid for the fragment.
+
+        Only the subtree is rendered, so the cost is proportional to its
+        size. Returns None, if the subtree is hidden.
+        '''
+        instrument = instrument or NULL_INSTRUMENT
+        with instrument.phase('render_fragment'):
+            return self._render_fragment(path, index, edit_mode, hidden_fields,
+                                         gridster_settings, instrument, window)
+
+    def render_inline_rows(self, path, offset=0, limit=None, edit_mode=False, hidden_fields=None,
+                           gridster_settings=None, instrument=None, window=None):
+        ''' Renders `limit` rows of inline element at prefixed `path`,
+        starting from `offset`, as they are rendered in the whole form. It is
+        the page of rows, which a placeholder of windowed `render_html`
+        stands for. If there are rows after the page, they are followed by
+        another placeholder. `window` limits rows of nested inlines.
+        '''
+        instrument = instrument or NULL_INSTRUMENT
+        with instrument.phase('render_inline_rows'):
+            return self._render_fragment(path, None, edit_mode, hidden_fields,
+                                         gridster_settings, instrument, window,
+                                         rows=(offset, limit))
+
+    def _render_fragment(self, path, index, edit_mode, hidden_fields, gridster_settings, instrument,
+                         window=None, rows=None):
+        try:
+            el = self.get_element_by_path(path)
+        except AttributeError:
+            el = None
+        if el is None:
+            raise Element.PathNotFound(path)
+
+        indeces = {name: int(i) for name, i in re_inline_parent_name.findall(path)}
+        if index is None and el.inlines_needed() is not None:
+            index = indeces.get(el.name)
+        if (index is not None or rows is not None) and el.inlines_needed() is None:
+            raise Element.PathNotFound('{0} is not inline'.format(path))
+        if rows is not None and index is not None:
+            raise Element.PathNotFound('{0} is a row, not inline'.format(path))
+
+        # the subtree is rendered with index 0 in suffixes of parent inlines,
+        # as in the whole form, and indeces from `path` are put in the end
+        zero_name = el.prefixed_name(process_inlines=False)
+        name = zero_name
+        if el.parent:
+            name = el.prefixed_name(prefix=el._get_full_prefix(indeces), process_inlines=False)
+        own_suffix = '_#{{{0}:{1}}}'.format(el.name, index)
+        zero_suffix = '_#{{{0}:0}}'.format(el.name)
+
+        def translate(k):
+            if not k.startswith(name) or k[len(name):len(name) + 1] not in ('', '_'):
+                return None
+            rest = k[len(name):]
+            if index is not None:
+                if not rest.startswith(own_suffix):
+                    return None
+                rest = zero_suffix + rest[len(own_suffix):]
+            return zero_name + rest
+
+        hidden_fields = HiddenFields.compile(hidden_fields)
+        own_path = name
+        if el.inlines_needed() is not None:
+            own_path += own_suffix if index is not None else zero_suffix
+        if not edit_mode and hidden_fields.covers(own_path):
+            return None
+        # names of other rows are dropped, as the subtree is rendered with
+        # index 0 of them, the rest is kept for wildcards
+        zero_path = zero_name + (zero_suffix if index is not None else '')
+        fragment_hidden_fields = HiddenFields()
+        for hidden in hidden_fields:
+            translated = translate(hidden)
+            if translated is not None:
+                fragment_hidden_fields.add(translated)
+            elif not hidden.startswith(zero_path):
+                fragment_hidden_fields.add(hidden)
+
+        data = {}
+        for k, v in self.initial_data.items():
+            translated = translate(k)
+            if translated is not None:
+                data[translated] = v
+
+        gridster_settings = GridsterSettings.index(gridster_settings)
+        kwargs = {
+            'edit_mode': edit_mode,
+            'hidden_fields': fragment_hidden_fields,
+            'gridster_settings': gridster_settings,
+            'render_cache': None,
+            'empty_items': OrderedDict(),
+            'instrument': instrument,
+            'window': window,
+            'inline_index': InlineIndex(data),
+            'initial_data': data,
+        }
+        if rows is not None:
+            if el.subelements:
+                content = el._render_subelements_html(**kwargs)
+            else:
+                content = el._render_html_input_with_value(**kwargs)
+            template = InlineTemplate(content, el._get_name_with_inline_suffix())
+            offset, limit = rows
+            content = el._render_inline_content(
+                template,
+                inlines_count=kwargs['inline_index'].count(el.get_inline_path()),
+                gridster_settings=gridster_settings,
+                window=limit,
+                offset=offset)
+            content = substitute_placeholders(content, data)
+        elif index is None:
+            content = el._render_html(**kwargs)
+            if content is None:
+                return None
+            content = substitute_placeholders(content, data)
+        else:
+            if el.subelements:
+                content = el._render_subelements_html(**kwargs)
+            else:
+                content = el._render_html_input_with_value(**kwargs)
+            content = substitute_placeholders(content, data)
+            template = InlineTemplate(content, el._get_name_with_inline_suffix())
+            content = el._get_inline_item_wrapper_template(gridster_settings).fill(
+                template.fill(el._get_name_with_inline_suffix(index=index)))
+
+        parent = el.parent
+        while parent:
+            if parent.inlines_needed() is not None and indeces.get(parent.name):
+                content = content.replace(parent._get_name_with_inline_suffix(),
+                                          parent._get_name_with_inline_suffix(index=indeces[parent.name]))
+            parent = parent.parent
+        return content
+
+    def _render_element_html(self, edit_mode=False, hidden_fields=None, gridster_settings=None,
+                             render_cache=None, empty_items=None, render_empty_items=False,
+                             instrument=NULL_INSTRUMENT, window=None, inline_index=None,
+                             initial_data=None):
+        kwargs = {
+            'edit_mode': edit_mode,
+            'hidden_fields': hidden_fields,
+            'gridster_settings': gridster_settings,
+            'render_cache': render_cache,
+            'empty_items': empty_items,
+            'instrument': instrument,
+            'window': window,
+            'inline_index': inline_index,
+            'initial_data': initial_data,
+        }
+
         if self.subelements:
             content = self._render_subelements_html(**kwargs)
         else:
             content = self._render_html_input_with_value(**kwargs)
 
         if self.inlines_needed() is not None:
-            inlines_count = self.get_distinct_inlines_count(
-                self.name,
-                self.initial_data,
-                count=True)
+            inlines_count = inline_index.count(self.get_inline_path())
+            template = InlineTemplate(content, self._get_name_with_inline_suffix())
             inline_content = self._render_inline_content(
-                content,
+                template,
                 inlines_count=inlines_count,
-                gridster_settings=gridster_settings)
+                gridster_settings=gridster_settings,
+                window=window)
             empty_item = self._render_empty_item(
-                content,
+                template,
                 gridster_settings=gridster_settings)
+            template_id = self.get_empty_item_template_id()
+            empty_items[template_id] = empty_item
             content = self._wrap_with_inline_block_wrapper(
                 inline_content,
-                empty_item,
+                template_id,
                 inlines_count)
 
+        if render_empty_items:
+            content += self._render_empty_items_templates(empty_items)
+
         content = self._wrap_with_item_wrapper(content,
                                                edit_mode=edit_mode,
                                                hidden_fields=hidden_fields,
                                                gridster_settings=gridster_settings)
-        if not self.parent:
-            for k, v in self.initial_data.items():
-                not_list_v = json.dumps(v) if isinstance(v, list) else v
-                content = re.sub('\[\[{0}\|checkbox\]\]'.format(k), ('checked' if not_list_v else ''), content)
-                content = re.sub('\[\[{0}\|select\]\]'.format(k),
-                                 escape(json.dumps(v if isinstance(v, list) else [v]), quote=True),
-                                 content)
-                content = re.sub('\[\[{0}\]\]'.format(k), not_list_v, content)
-            content = re.sub(r'\[\[.*?\]\]', r'', content)
         return content
 
-    def _render_subelements_html(self, edit_mode=False, hidden_fields=None, gridster_settings=None):
+    def _render_subelements_html(self, edit_mode=False, hidden_fields=None, gridster_settings=None,
+                                 render_cache=None, empty_items=None, instrument=NULL_INSTRUMENT,
+                                 window=None, inline_index=None, initial_data=None):
         name = self.name
 
         elements = [el.render_html(edit_mode=edit_mode,
                                    hidden_fields=hidden_fields,
-                                   gridster_settings=gridster_settings)
+                                   gridster_settings=gridster_settings,
+                                   render_cache=render_cache,
+                                   empty_items=empty_items,
+                                   instrument=instrument,
+                                   window=window,
+                                   inline_index=inline_index,
+                                   initial_data=initial_data)
                     for el in self.subelements]
         content = ''.join([el for el in elements if el])
 
@@ -240,7 +500,9 @@ class Element(object):
                 content=content)
         return content
 
-    def _render_html_input_with_value(self, edit_mode=False, hidden_fields=None, gridster_settings=None):
+    def _render_html_input_with_value(self, edit_mode=False, hidden_fields=None, gridster_settings=None,
+                                      render_cache=None, empty_items=None, instrument=NULL_INSTRUMENT,
+                                      window=None, inline_index=None, initial_data=None):
 
         name = self.prefixed_name()
 
@@ -254,7 +516,8 @@ class Element(object):
             checkbox_ind = '|checkbox' if self.is_checkbox else ''
             select_ind = '|select' if self.is_select else ''
             ind = select_ind or checkbox_ind
-            value = '[[{name}{ind}]]'.format(name=name, ind=ind) if self.initial_data else ''
+            data = self.initial_data if initial_data is None else initial_data
+            value = '[[{name}{ind}]]'.format(name=name, ind=ind) if data else ''
             html_input = self.html_input.format(
                 edit_checkbox=self.get_edit_checkbox_input(edit_mode, hidden_fields),
                 disabled=edit_mode and 'disabled' or '',
@@ -278,57 +541,85 @@ class Element(object):
             prefixed_name=self.prefixed_name())
         return result
 
-    def _render_inline_content(self, content, inlines_count=None, gridster_settings=None):
+    def _get_inline_item_wrapper_template(self, gridster_settings=None):
+        # wrapper is the same for every row, so it is rendered once
+        # around a slot, which is then filled with each row's content
+        slot = InlineTemplate.slot
+        return InlineTemplate(
+            self._wrap_with_html_inline_item_wrapper(slot, gridster_settings=gridster_settings),
+            slot)
+
+    def _render_inline_content(self, template, inlines_count=None, gridster_settings=None,
+                               window=None, offset=0):
+        ''' Renders rows of inline element from `template`, which is content
+        split on the inline suffix with index 0, each row costs one join.
+        Only `window` rows from `offset` are rendered, if it is given, and
+        the rest are replaced by a placeholder.
+        '''
         min_inlines = 0 if inlines_count else 1
         inlines_count = inlines_count or self.inlines_needed()
-        inlines = ''
-        for i in range(min_inlines, inlines_count):
-            item = content.replace(self._get_name_with_inline_suffix(),
-                                   self._get_name_with_inline_suffix(index=i))
-            item = self._wrap_with_html_inline_item_wrapper(item, gridster_settings=gridster_settings)
-            inlines += item
-        if min_inlines:
-            content = self._wrap_with_html_inline_item_wrapper(
-                content,
-                noremove=False,
-                gridster_settings=gridster_settings)
-            content = content + inlines
-        else:
-            content = inlines
-        return content
-
-    def _render_empty_item(self, content, gridster_settings=None):
-        empty = content.replace(self._get_name_with_inline_suffix(),
-                                self._get_name_with_inline_suffix(empty=True))
-        empty = self._wrap_with_html_inline_item_wrapper(empty, gridster_settings=gridster_settings)
+        stop = inlines_count if window is None else min(inlines_count, offset + window)
+        wrapper = self._get_inline_item_wrapper_template(gridster_settings)
+        items = []
+        if min_inlines and offset == 0:
+            items.append(wrapper.fill(template.content))
+        for i in range(max(min_inlines, offset), stop):
+            item = template.fill(self._get_name_with_inline_suffix(index=i))
+            items.append(wrapper.fill(item))
+        if stop < inlines_count:
+            items.append(self.html_inline_window_placeholder.format(
+                prefixed_name=self.prefixed_name(process_inlines=False),
+                offset=stop,
+                count=inlines_count - stop,
+                total_count=inlines_count))
+        return ''.join(items)
+
+    def _render_empty_item(self, template, gridster_settings=None):
+        empty = template.fill(self._get_name_with_inline_suffix(empty=True))
+        empty = self._get_inline_item_wrapper_template(gridster_settings).fill(empty)
+        # the item is shared by all rows of parent inlines, so their
+        # indeces are left for the client to fill, same as own one
+        el = self.parent
+        while el:
+            if el.inlines_needed() is not None:
+                empty = empty.replace(el._get_name_with_inline_suffix(),
+                                      el._get_name_with_inline_suffix(empty=True))
+            el = el.parent
         return empty
 
-    def _wrap_with_inline_block_wrapper(self, content, empty, inlines_count=None):
-        wrapped = '''
-            <div class="grid-stack fieldset-content">
-                {content}
-                {add_button}
-            </div>
-        '''.format(content=content, add_button=self.get_add_button(empty, inlines_count))
+    def get_empty_item_template_id(self):
+        return 'empty-item-{0}'.format(self.get_inline_path())
+
+    def get_inline_path(self):
+        ''' Prefixed name without inline indeces, e.g. `r__a__b`. '''
+        return re_inline_suffix.sub('', self.prefixed_name(process_inlines=False))
+
+    def _render_empty_items_templates(self, empty_items):
+        return ''.join(self.html_empty_item_template.format(template_id=template_id, content=empty)
+                       for template_id, empty in empty_items.items())
+
+    def _wrap_with_inline_block_wrapper(self, content, template_id, inlines_count=None,
+                                        fill=format_template):
+        wrapped = fill(
+            self.html_inline_block_wrapper,
+            content=content,
+            add_button=self.get_add_button(template_id, inlines_count, fill=fill))
         return wrapped
 
     def _wrap_with_item_wrapper(self, content, edit_mode=False,
-                                hidden_fields=None, gridster_settings=None):
+                                hidden_fields=None, gridster_settings=None,
+                                fill=format_template):
         prefixed_name = self.prefixed_name(process_inlines=False)
         gridster_settings_attrs =\
             self.get_gridster_settings_attrs(gridster_settings)
-        edit_checkbox = self.get_edit_checkbox_input(edit_mode, hidden_fields)
-
-        error = ''
-        if self.subelements:
-            error = '<div class="error" id="{prefixed_name}"></div>'
-            error = error.format(prefixed_name=prefixed_name)
+        edit_checkbox = self.get_edit_checkbox_input(edit_mode, hidden_fields, fill=fill)
 
-        result = self.html_wrapper.format(
+        result = fill(
+            self.html_wrapper,
             gridster_settings=gridster_settings_attrs,
             edit_checkbox=edit_checkbox,
             prefixed_name=prefixed_name,
-            error=error,
+            error=self.get_error_div(fill=fill),
             name=self.name,
             content=content,
             inline_buttons='')
@@ -351,14 +642,18 @@ class Element(object):
 
         return name
 
-    def _get_full_prefix(self):
+    def _get_full_prefix(self, indeces=None):
+        ''' `indeces` maps names of parent inlines to indeces in the prefix,
+        which are 0 by default.
+        '''
+        indeces = indeces or {}
         parents = []
         el = self
         # el.parent should evaluate to True, if exists
         while getattr(el, 'parent', None):
             name = el.parent.name
             if el.parent.inlines_needed() is not None:
-                name = el.parent._get_name_with_inline_suffix()
+                name = el.parent._get_name_with_inline_suffix(index=indeces.get(name, 0))
             parents.append(name)
             el = el.parent
         return self.nesting_connector.join(reversed(parents))
@@ -370,55 +665,89 @@ class Element(object):
     def inlines_needed(self):
         return (self.min_occurs or 1) if self.max_occurs > 1 else None
 
-    def get_remove_button(self):
+    def structure_digest(self):
+        ''' Digest of everything that affects rendered html of the subtree,
+        except its position in the tree and the data. Computed once and
+        reset when subelements are added.
+        '''
+        if self._structure_digest is None:
+            parts = [
+                type(self).__name__, self.name, self.label_text, self.help_text,
+                self.min_occurs, self.max_occurs,
+                self.html_input, self.html_label, self.html_help, self.html_wrapper,
+                self.html_input_wrapper, self.html_parent_element_wrapper,
+                self.html_edit_checkbox, self.html_inline_button_add,
+                self.html_inline_button_remove, self.html_inline_buttons_wrapper,
+                self.html_inline_item_wrapper, self.html_empty_item_template,
+                [sub.structure_digest() for sub in self.subelements],
+            ]
+            dumped = json.dumps(parts, separators=(',', ':'))
+            self._structure_digest = hashlib.sha1(dumped.encode('utf-8')).hexdigest()
+        return self._structure_digest
+
+    def _reset_structure_digest(self):
+        el = self
+        while el is not None and el._structure_digest is not None:
+            el._structure_digest = None
+            el = el.parent
+        el = self
+        while el is not None:
+            el._field_catalog = None
+            el = el.parent
+
+    def get_error_div(self, fill=format_template):
+        if not self.subelements:
+            return ''
+        return fill(self.html_error, prefixed_name=self.prefixed_name(process_inlines=False))
+
+    def get_remove_button(self, fill=format_template):
         btn = ''
         if self.inlines_needed() is not None:
-            btn = self.html_inline_button_remove.format(
+            btn = fill(
+                self.html_inline_button_remove,
                 name=self.name,
                 min_count=self.min_occurs)
-        return self.html_inline_buttons_wrapper.format(content=btn)
+        return fill(self.html_inline_buttons_wrapper, content=btn)
 
-    def get_add_button(self, empty, max_count=None):
+    def get_add_button(self, template_id, max_count=None, fill=format_template):
         btn = ''
         if self.inlines_needed() is not None:
-            btn = self.html_inline_button_add.format(
+            btn = fill(
+                self.html_inline_button_add,
                 name=self.name,
+                prefixed_name=self.prefixed_name(),
                 current_elements_count=max_count or self.inlines_needed(),
                 max_count=self.max_occurs,
-                empty=escape(empty, quote=True))
-        return self.html_inline_buttons_wrapper.format(content=btn)
-
-    def get_edit_checkbox_input(self, edit_mode, hidden_fields):
-        edit_checkbox = ''
-        if edit_mode:
-            edit_checkbox = self.html_edit_checkbox.format(
-                name=self.prefixed_name(),
-                checked='',
-            )
-            if self.prefixed_name() in hidden_fields:
-                edit_checkbox = self.html_edit_checkbox.format(
-                    name=self.prefixed_name(),
-                    checked='checked',
-                )
-        return edit_checkbox
+                template_id=template_id)
+        return fill(self.html_inline_buttons_wrapper, content=btn)
+
+    def get_edit_checkbox_input(self, edit_mode, hidden_fields, fill=format_template):
+        if not edit_mode:
+            return ''
+        hidden_fields = HiddenFields.compile(hidden_fields)
+        prefixed_name = self.prefixed_name()
+        return fill(
+            self.html_edit_checkbox,
+            name=prefixed_name,
+            checked='checked' if prefixed_name in hidden_fields else '')
 
     def get_gridster_default_settings(self):
         y = 0
         if self.parent:
-            y = self.parent.subelements.index(self)
-        settings = copy.deepcopy(self.gridster_default_settings)
+            y = self.position
+            siblings = self.parent.subelements
+            if y >= len(siblings) or siblings[y] is not self:
+                y = siblings.index(self)
+        settings = dict(self.gridster_default_settings)
         default_h = self.gridster_default_settings['data-gs-height']
         settings['data-gs-y'] = y * default_h
         return settings
 
     def get_gridster_settings_attrs(self, gridster_settings, inline_wrapper=False):
-        assert isinstance(gridster_settings, list), 'gridster_settings should be instance of list'
-        gridster_settings = gridster_settings or []
+        gridster_settings = GridsterSettings.index(gridster_settings)
         process_inlines = inline_wrapper
         prefixed_name = self.prefixed_name(process_inlines=process_inlines)
-        settings = [s for s in gridster_settings
-                    if s.get('prefixed_name', None) == prefixed_name]
-        settings = settings[0] if settings else self.get_gridster_default_settings()
+        settings = gridster_settings.get(prefixed_name) or self.get_gridster_default_settings()
         settings_attrs = ' '.join('='.join([k, '"{}"'.format(v)])
                                   for k, v in settings.items()
                                   if k.startswith('data-gs-'))
@@ -448,23 +777,33 @@ class Element(object):
             raise Element.ValueRequiredError
         return serialize_json(self.cleaned_data())
 
-    def validate_inputs(self, source, hidden_fields=None):
-        hidden_fields = hidden_fields or []
-        hidden_fields_masks = [re.sub(r':\d+', r':\d+', f) for f in hidden_fields]
+    def validate_inputs(self, source, hidden_fields=None, instrument=None):
+        instrument = instrument or NULL_INSTRUMENT
+        with instrument.phase('validate'):
+            return self._validate_inputs(source, hidden_fields, instrument)
+
+    def _validate_inputs(self, source, hidden_fields, instrument):
+        hidden_fields = HiddenFields.compile(hidden_fields)
         cleaned = {}
         errors = defaultdict(list)
 
-        checkbox_names = self.get_all_checkboxes(source, hidden_fields=hidden_fields)
-        for chb in checkbox_names:
-            source[chb] = source.get(chb, '')
+        with instrument.phase('checkboxes'):
+            checkbox_names = set(self.get_all_checkboxes(source, hidden_fields=hidden_fields))
+            for chb in checkbox_names:
+                source[chb] = source.get(chb, '')
 
-        source = self.normalize_indeces(source)
+        with instrument.phase('normalize_indeces'):
+            source = self.normalize_indeces(source)
 
-        cleaned, errors = self._validate_with_validators(source, cleaned, errors)
+        with instrument.phase('validators'):
+            cleaned, errors = self._validate_with_validators(source, cleaned, errors, instrument)
 
-        errors = self._validate_required_fields(cleaned, errors, hidden_fields_masks, checkbox_names)
-        errors = self._validate_choices(cleaned, errors, hidden_fields)
-        errors = self._validate_inlines(cleaned, errors, hidden_fields)
+        with instrument.phase('required_fields'):
+            errors = self._validate_required_fields(cleaned, errors, hidden_fields, checkbox_names, instrument)
+        with instrument.phase('choices'):
+            errors = self._validate_choices(cleaned, errors, hidden_fields)
+        with instrument.phase('inlines'):
+            errors = self._validate_inlines(cleaned, errors, hidden_fields)
 
         errors = {k: v for k, v in errors.items() if v}
         return cleaned, errors
@@ -559,13 +898,15 @@ class Element(object):
 
         return new_data
 
-    def _validate_with_validators(self, source, cleaned, errors):
+    def _validate_with_validators(self, source, cleaned, errors, instrument=NULL_INSTRUMENT):
         for k, v in source.items():
             el = self.get_element_by_path(k)
-            processed = el.process_value(v)
-            cleaned[k] = processed
-            if processed:
-                errors[k] = el.validate_atom(processed)
+            with instrument.phase('validate_element', element=el):
+                processed = el.process_value(v)
+                cleaned[k] = processed
+                if processed:
+                    errors[k] = el.validate_atom(processed, instrument)
+        instrument.count('regex_evaluations', 2 * len(source))
         return cleaned, errors
 
     def process_value(self, value):
@@ -574,7 +915,11 @@ class Element(object):
             processed = processor(processed)
         return processed
 
-    def validate_atom(self, processed):
+    def validate_atom(self, processed, instrument=NULL_INSTRUMENT):
+        if instrument.enabled:
+            values_count = len(processed) if isinstance(processed, list) else 1
+            for validator in self.validators:
+                instrument.count('validator_calls.{0}'.format(validator.rname), values_count)
         if isinstance(processed, list):
             errors = []
             for p in processed:
@@ -584,16 +929,20 @@ class Element(object):
         errors = filter(bool, errors)
         return errors
 
-    def _validate_required_fields(self, cleaned, errors, hidden_fields_masks, checkbox_names):
-        required_masks = self.get_required_masks(hidden_fields_masks)
+    def _validate_required_fields(self, cleaned, errors, hidden_fields, checkbox_names,
+                                  instrument=NULL_INSTRUMENT):
+        required_masks = self.get_required_masks(hidden_fields)
+        evaluations = 0
         for k, v in cleaned.items():
             required = False
             for mask in required_masks:
+                evaluations += 1
                 if re.match(mask, k):
                     required = True
                     break
             if required and (k not in checkbox_names) and (not cleaned.get(k, None)):
                 errors[k] = [self.error_messages['required']] + errors[k]
+        instrument.count('regex_evaluations', evaluations)
         return errors
 
     def _validate_choices(self, cleaned, errors, hidden_fields):
@@ -607,22 +956,27 @@ class Element(object):
                 count_of_elements_matches_bounds = (ch.min_occurs <= count and count <= ch.max_occurs)
                 if not count_of_elements_matches_bounds:
                     k = prefix + ch.name
-                    elements_s = ', '.join(['\'{0}\''.format(e.label_text) for e in ch.subelements])
-                    if ch.min_occurs == ch.max_occurs:
-                        message = 'Exactly {min}'
-                    elif ch.max_occurs == ch.UNBOUNDED:
-                        message = '{min} or more'
-                    elif ch.min_occurs == 0:
-                        message = 'Up to {max}'
-                    else:
-                        message = ('{min} to {max}')
-                    message = (message + ' of the these boxes should be filled: {boxes}').format(
-                        min=ch.min_occurs,
-                        max=ch.max_occurs,
-                        boxes=elements_s)
-                    errors[k] = errors[k] + [message]
+                    errors[k] = errors[k] + [ch.get_choice_error_message()]
         return errors
 
+    def get_choice_error_message(self):
+        ''' Message of choice element, when count of filled subelements is
+        out of its bounds.
+        '''
+        elements_s = ', '.join(['\'{0}\''.format(e.label_text) for e in self.subelements])
+        if self.min_occurs == self.max_occurs:
+            message = 'Exactly {min}'
+        elif self.max_occurs == self.UNBOUNDED:
+            message = '{min} or more'
+        elif self.min_occurs == 0:
+            message = 'Up to {max}'
+        else:
+            message = ('{min} to {max}')
+        return (message + ' of the these boxes should be filled: {boxes}').format(
+            min=self.min_occurs,
+            max=self.max_occurs,
+            boxes=elements_s)
+
     def _validate_inlines(self, cleaned, errors, hidden_fields):
         inline_elements = self._get_inline_elements(hidden_fields)
         for inline in inline_elements:
@@ -640,21 +994,28 @@ class Element(object):
         return errors
 
     def _get_choice_elements(self, hidden_fields):
+        hidden_fields = HiddenFields.compile(hidden_fields)
         choice_elements = []
         elements = [self]
         while elements:
             el = elements.pop()
-            if 'choice' in el.name and el.prefixed_name() not in hidden_fields:
+            # hidden subtrees are pruned as a whole
+            if el.prefixed_name() in hidden_fields:
+                continue
+            if 'choice' in el.name:
                 choice_elements.append(el)
             elements.extend(el.subelements or [])
         return choice_elements
 
     def _get_inline_elements(self, hidden_fields):
+        hidden_fields = HiddenFields.compile(hidden_fields)
         inline_elements = []
         elements = [self]
         while elements:
             el = elements.pop()
-            if el.inlines_needed() and el.prefixed_name() not in hidden_fields:
+            if el.prefixed_name() in hidden_fields:
+                continue
+            if el.inlines_needed():
                 inline_elements.append(el)
             elements.extend(el.subelements or [])
         return inline_elements
@@ -683,13 +1044,16 @@ class Element(object):
             result = self.name
         return result
 
-    def get_required_masks(self, hidden_fields_masks):
+    def get_required_masks(self, hidden_fields):
+        hidden_fields = HiddenFields.compile(hidden_fields)
         required = []
         elements = [('', self)]
         while elements:
             prefix, el = elements.pop()
             new_prefix = ('__' if prefix else '').join([prefix, el.get_mask()])
-            if el.required and new_prefix not in hidden_fields_masks:
+            if hidden_fields.contains(new_prefix, any_index=True):
+                continue
+            if el.required:
                 required.append('^{}$'.format(new_prefix))
             for sub in el.subelements:
                 elements.append((new_prefix, sub))
@@ -700,8 +1064,10 @@ class Element(object):
         return self.min_occurs > 0
 
     def add_subelement(self, el):
+        el.position = len(self.subelements)
         self.subelements.append(el)
         el.set_parent(self)
+        self._reset_structure_digest()
 
     def add_validator(self, validator):
         self.validators.append(validator)
@@ -711,6 +1077,7 @@ class Element(object):
 
     def set_parent(self, el):
         self.parent = el
+        self._field_catalog = None
 
     def add_kwargs(self, **kwargs):
         self.kwargs.update(**kwargs)
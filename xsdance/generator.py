@@ -2,12 +2,15 @@
 from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
 
 import copy
+import hashlib
 import os
+import threading
 
 from lxml import etree
 
 from .element import Element
-from .utils import Validator
+from .instrumentation import NULL_INSTRUMENT
+from .utils import Validator, compact_html, fold_validators
 
 _ = lambda x: x
 
@@ -46,6 +49,28 @@ class CheckboxProcessor(object):
         return self.value if v else ''
 
 
+class Deferred(object):
+    ''' Content of complex type of an element, compiled at first access of
+    subelements of the element, see `Generator.lazy`.
+    '''
+
+    def __init__(self, generator, el, nodes, choice_counter):
+        self.generator = generator
+        self.el = el
+        self.nodes = nodes
+        # first number of choices of the content, as they are numbered,
+        # when the tree is compiled eagerly
+        self.choice_counter = choice_counter
+
+    def __call__(self):
+        self.generator.expand(self)
+
+    def __deepcopy__(self, memo):
+        # copies of referenced elements compile the content on their own,
+        # the generator and nodes are shared
+        return type(self)(self.generator, copy.deepcopy(self.el, memo), self.nodes, self.choice_counter)
+
+
 class ElementNotFound(BaseException):
     pass
 
@@ -61,6 +86,8 @@ class Generator(object):
     PRIMITIVE_TYPES_PATH = 'IRS/primitive_types.xsd'
     UNBOUNDED = 999
     TOP_LEVEL_ELEMENT_NAME = 'schema'
+    # content models of complex types, which are deferred in lazy mode
+    DEFERRED_TAGS = ('sequence', 'choice')
 
     DT_FORMAT = {
         'DateType': 'YYYY-MM-DD HH:MM',
@@ -144,14 +171,18 @@ class Generator(object):
     default_html_inline_button_add = '''
         <a class="btn btn-default btn-add add-inline"
             data-element-name="{name}"
+            data-element-prefixed-name="{prefixed_name}"
             data-elements-count="{current_elements_count}"
             data-max-elements-count="{max_count}"
-            data-empty-item-wrapper="{empty}">
+            data-empty-item-template="{template_id}">
 
           <i class="icon-add"></i><span>Add</span>
 
         </a>
     '''
+    default_html_empty_item_template = '''
+        <template id="{template_id}">{content}</template>
+    '''
     default_html_inline_button_remove = '''
         <a class="btn btn-default btn-remove remove-inline"
             data-element-name="{name}"
@@ -192,12 +223,35 @@ class Generator(object):
                  html_parent_element_wrapper=default_html_parent_element_wrapper,
                  html_input_wrapper=default_html_input_wrapper,
                  html_inline_item_wrapper=default_html_inline_item_wrapper,
+                 html_empty_item_template=default_html_empty_item_template,
 
                  html_edit_checkbox=default_html_edit_checkbox,
+
+                 instrument=None,
+                 include_cache=None,
+                 compact=False,
+                 lazy=False,
                  ):
 
         self.element_class = element_class
         self.primitive_types_path = primitive_types_path
+        self.instrument = instrument or NULL_INSTRUMENT
+        # dict of path -> parsed root of included files, it can be shared
+        # by generators, which compile forms with common includes
+        self.include_cache = include_cache
+        # templates without indentation, which is copied to every element
+        # and to every row of rendered inlines
+        self.compact = compact
+        # content of complex types of elements is compiled, when the element
+        # is first rendered, validated or traversed, elements keep the
+        # generator till then, so it should not be reused for other forms
+        self.lazy = lazy
+        # elements with deferred content, in order of parsing
+        self.deferred = []
+        # type name -> count of choices in its content
+        self.choice_counts = {}
+        self._expanding = set()
+        self._lock = threading.RLock()
 
         self.html_datetime_picker = html_datetime_picker
         self.html_checkbox = html_checkbox
@@ -210,6 +264,10 @@ class Generator(object):
 
         self.includes = []
         self.included_files = []
+        # paths of `includes`, in the same order
+        self.include_paths = []
+        # type name -> (path of file, where type is defined, digest of type definition)
+        self.resolved_types = {}
         self.root = None
         self.choice_counter = 0
 
@@ -225,7 +283,27 @@ class Generator(object):
             'html_inline_button_remove': html_inline_button_remove,
             'html_inline_buttons_wrapper': html_inline_buttons_wrapper,
             'html_inline_item_wrapper': html_inline_item_wrapper,
+            'html_empty_item_template': html_empty_item_template,
         }
+        self.top_level_html_wrapper = '''
+                {edit_checkbox}
+                {content}
+            '''
+        self.top_level_html_parent_element_wrapper = '''
+                {content}
+            '''
+        if compact:
+            for name in ('html_datetime_picker', 'html_checkbox', 'html_select', 'html_option',
+                         'top_level_html_wrapper', 'top_level_html_parent_element_wrapper'):
+                setattr(self, name, compact_html(getattr(self, name)))
+            for name, value in self.element_kwargs.items():
+                self.element_kwargs[name] = compact_html(value)
+            # templates of element class, which are not passed to elements
+            self.element_templates = {
+                name: compact_html(getattr(element_class, name))
+                for name in ('html_inline_block_wrapper', 'html_inline_window_placeholder')}
+        else:
+            self.element_templates = {}
 
     def create_element(self, *args, **kwargs):
         all_kwargs_dict = dict(self.element_kwargs, **kwargs)
@@ -233,22 +311,47 @@ class Generator(object):
         name = args[0]
         parent_name = kwargs.get('parent_name', None)
         if self.TOP_LEVEL_ELEMENT_NAME in (name, parent_name):
-            all_kwargs_dict['html_wrapper'] = '''
-                {edit_checkbox}
-                {content}
-            '''
-            all_kwargs_dict['html_parent_element_wrapper'] = '''
-                {content}
-            '''
+            all_kwargs_dict['html_wrapper'] = self.top_level_html_wrapper
+            all_kwargs_dict['html_parent_element_wrapper'] = self.top_level_html_parent_element_wrapper
         el = self.element_class(*args, **all_kwargs_dict)
         el.UNBOUNDED = self.UNBOUNDED
+        for template_name, template in self.element_templates.items():
+            setattr(el, template_name, template)
         return el
 
     def run(self, xsd_filepath):
+        with self.instrument.phase('compile'):
+            return self._run(xsd_filepath)
+
+    def _run(self, xsd_filepath):
+        self._load(xsd_filepath)
+        result = self.parse(self.root)
+        return result
+
+    def resolve_types(self, xsd_filepath, type_names):
+        ''' Returns dict of type name -> (path, digest) for `type_names`, as
+        they are resolved by the form in `xsd_filepath` and its current
+        includes, without creating elements. Not found types are None.
+        '''
+        self._load(xsd_filepath)
+        for node in self.root:
+            if x.get_tag(node) in ('include', 'import'):
+                self.parse(node)
+        result = {}
+        for type_name in type_names:
+            try:
+                self._find_type(type_name)
+            except Generator.TypeNotFound:
+                pass
+            result[type_name] = self.resolved_types.get(type_name)
+        return result
+
+    def _load(self, xsd_filepath):
         self.filepath = xsd_filepath
-        tree = etree.parse(xsd_filepath, parser=etree.XMLParser(
-            remove_comments=True
-        ))
+        with self.instrument.phase('parse_xsd'):
+            tree = etree.parse(xsd_filepath, parser=etree.XMLParser(
+                remove_comments=True
+            ))
         self.root = tree.getroot()
         self.nsmap = self.root.nsmap
 
@@ -262,14 +365,11 @@ class Generator(object):
         self.nsmap.pop(None)
         # STOP weird magic
 
-        primitive_types = etree.parse(self.primitive_types_path)
-        primitive_types_root = primitive_types.getroot()
+        primitive_types_root = self._parse_included_file(self.primitive_types_path)
         self.includes.append(primitive_types_root)
+        self.include_paths.append(os.path.abspath(self.primitive_types_path))
         assert self.nsmap['xsd'] == primitive_types_root.nsmap['xsd']
 
-        result = self.parse(self.root)
-        return result
-
     def parse(self, node, el=None):
         func_name = 'parse_{}'.format(x.get_tag(node))
         func = getattr(self, func_name, None)
@@ -288,8 +388,10 @@ class Generator(object):
             or x.full_path_of_included_schema(self.filepath, node.attrib['schemaLocation'])
 
         if include_path not in self.included_files:
-            include_root = etree.parse(include_path).getroot()
+            self.instrument.count('includes')
+            include_root = self._parse_included_file(include_path)
             self.includes.append(include_root)
+            self.include_paths.append(include_path)
             self.included_files.append(include_path)
 
             nsmap = {k: v for k, v in include_root.nsmap.items() if k}
@@ -304,17 +406,30 @@ class Generator(object):
     def parse_element(self, node, parent_el):
         new_el = self._get_element_from_cache_or_create(node, parent_el)
         parent_el.add_subelement(new_el)
+        with self.instrument.phase('parse_element', element=new_el):
+            self._parse_element(node, new_el)
 
+    def _parse_element(self, node, new_el):
         type_name = node.attrib.get('type', None)
+        # content models of complex types, which are parsed on demand
+        content = [] if self.lazy else None
         if type_name:
-            self._process_type_by_name(type_name, new_el)
+            self._process_type_by_name(type_name, new_el, content)
 
         new_el.min_occurs = int(node.attrib.get('minOccurs', 1))
         max_occurs = node.attrib.get('maxOccurs', 1)
         new_el.max_occurs = int(Generator.UNBOUNDED
                                 if max_occurs == 'unbounded'
                                 else max_occurs)
-        self._process_subnodes(node, new_el)
+        if content is None:
+            self._process_subnodes(node, new_el)
+            return
+        for subnode in node:
+            if x.get_tag(subnode) == 'complexType':
+                self._split_content(subnode, new_el, content)
+            else:
+                self.parse(subnode, new_el)
+        self._defer(new_el, content)
 
     def parse_choice(self, node, parent_el):
         choice_name = ':choice_{}:'.format(self.choice_counter)
@@ -340,13 +455,14 @@ class Generator(object):
         self._process_subnodes(node, choice_element)
 
     def parse_annotation(self, node, el):
-        description_1 = \
-            node.find('.//none:Description', namespaces=self.nsmap)
-        description_2 = \
-            node.find('.//xsd:Description', namespaces=self.nsmap)
-        el.label_text = el.label_text or getattr(description_1, 'text', '') or \
-            getattr(description_2, 'text', '')
-        el.add_kwargs(**x.element_content_to_dict(node))
+        with self.instrument.phase('annotation'):
+            description_1 = \
+                node.find('.//none:Description', namespaces=self.nsmap)
+            description_2 = \
+                node.find('.//xsd:Description', namespaces=self.nsmap)
+            el.label_text = el.label_text or getattr(description_1, 'text', '') or \
+                getattr(description_2, 'text', '')
+            el.add_kwargs(**x.element_content_to_dict(node))
 
     def parse_sequence(self, node, el):
         self._process_subnodes(node, el)
@@ -414,8 +530,24 @@ class Generator(object):
                 el.html_input = html_input
             el.add_validator(Validator('enumeration', enum_items))
 
+        # facets of base types are already folded, so the chain is folded
+        # level by level, as restrictions are parsed
+        el.validators = fold_validators(el.validators)
+
     # helpers
 
+    def _parse_included_file(self, path):
+        if self.include_cache is not None:
+            root = self.include_cache.get(path)
+            if root is not None:
+                self.instrument.count('include_cache.hits')
+                return root
+        with self.instrument.phase('parse_include'):
+            root = etree.parse(path).getroot()
+        if self.include_cache is not None:
+            self.include_cache[path] = root
+        return root
+
     def _get_element_from_cache_or_create(self, node, parent_el):
         name = node.attrib.get('name', None)
         ref = node.attrib.get('ref', None)
@@ -425,10 +557,19 @@ class Generator(object):
             self.elements_cache[name] = new_el
         elif ref:
             cached_el = self.elements_cache.get(ref, None)
+            # the referenced element may be in deferred content
+            while not cached_el and self.deferred:
+                self.deferred.pop(0)()
+                cached_el = self.elements_cache.get(ref, None)
             if cached_el:
-                new_el = copy.deepcopy(cached_el)
+                self.instrument.count('elements_cache.hits')
+                self.instrument.count('deepcopies')
+                with self.instrument.phase('ref_deepcopy'):
+                    new_el = copy.deepcopy(cached_el)
+            else:
+                self.instrument.count('elements_cache.misses')
         if not new_el:
-            raise Generator.ElementNotFound
+            raise Generator.ElementNotFound(ref or name)
         return new_el
 
     def _process_subnodes(self, top_node, el, skip=None):
@@ -437,33 +578,134 @@ class Generator(object):
             if x.get_tag(node) not in skip:
                 self.parse(node, el)
 
-    def _process_type_by_name(self, type_name, el):
-        if 'irs:' in type_name:
-            type_name = type_name.split('irs:')[-1]
-        if 'xsd:' in type_name:
-            type_name = type_name.split('xsd:')[-1]
+    def _process_type_by_name(self, type_name, el, content=None):
+        type_name = self._strip_prefix(type_name)
 
         # if type is one of datetime picker types,
         # assign corresponding html input and format
         dt_format = self.DT_FORMAT.get(type_name, '')
         if dt_format:
-            el.html_input = self.default_html_datetime_picker.format(
+            el.html_input = self.html_datetime_picker.format(
                 date_format=dt_format)
         # end datepicker block
 
         if type_name == 'anySimpleType':
             return
+        node = self._find_type(type_name)
+        if content is not None and x.get_tag(node) == 'complexType':
+            self._split_content(node, el, content)
+        else:
+            self.parse(node, el)
+
+    @staticmethod
+    def _strip_prefix(type_name):
+        if 'irs:' in type_name:
+            type_name = type_name.split('irs:')[-1]
+        if 'xsd:' in type_name:
+            type_name = type_name.split('xsd:')[-1]
+        return type_name
+
+    # lazy compilation
+
+    def _split_content(self, node, el, content):
+        ''' Parses complex type `node` of `el`, with its base types, but
+        content models, which are appended to `content`, so annotations and
+        attributes are applied to `el` at once.
+        '''
+        for subnode in node:
+            tag = x.get_tag(subnode)
+            if tag in self.DEFERRED_TAGS:
+                content.append(subnode)
+            elif tag == 'complexContent':
+                self._split_content(subnode, el, content)
+            elif tag == 'extension' and x.get_tag(node) == 'complexContent':
+                base_type_name = subnode.attrib.get('base', None)
+                if base_type_name:
+                    self._process_type_by_name(base_type_name, el, content)
+                self._split_content(subnode, el, content)
+            else:
+                self.parse(subnode, el)
+
+    def _defer(self, el, nodes):
+        ''' Defers parsing of content models `nodes` of `el` till the first
+        access of its subelements.
+        '''
+        if not nodes:
+            return
+        # choices are named by their order in the whole tree, so numbers of
+        # choices of the content are reserved
+        deferred = Deferred(self, el, nodes, self.choice_counter)
+        self.choice_counter += self._count_choices(nodes)
+        self.instrument.count('deferred')
+        el._pending = deferred
+        self.deferred.append(deferred)
+
+    def expand(self, deferred):
+        ''' Parses deferred content of an element, once. '''
+        el = deferred.el
+        with self._lock:
+            # subelements are accessed, while the content is parsed
+            if el._pending is not deferred or id(el) in self._expanding:
+                return
+            self._expanding.add(id(el))
+            choice_counter = self.choice_counter
+            self.choice_counter = deferred.choice_counter
+            try:
+                with self.instrument.phase('expand', element=el):
+                    for node in deferred.nodes:
+                        self.parse(node, el)
+            finally:
+                self.choice_counter = choice_counter
+                self._expanding.discard(id(el))
+                el._pending = None
+
+    def _count_choices(self, nodes):
+        ''' Count of choices, which parsing of `nodes` creates. '''
+        count = 0
+        nodes = list(nodes)
+        while nodes:
+            node = nodes.pop()
+            tag = x.get_tag(node)
+            if not hasattr(self, 'parse_{}'.format(tag)) or tag == 'annotation':
+                continue
+            if tag == 'choice':
+                count += 1
+            type_name = node.attrib.get('type' if tag == 'element' else 'base', None)
+            if type_name and tag in ('element', 'extension', 'restriction'):
+                count += self._count_type_choices(self._strip_prefix(type_name))
+            # subnodes of restrictions are facets
+            if tag != 'restriction':
+                nodes.extend(node)
+        return count
+
+    def _count_type_choices(self, type_name):
+        if type_name == 'anySimpleType':
+            return 0
+        if type_name not in self.choice_counts:
+            self.choice_counts[type_name] = self._count_choices([self._find_type(type_name)])
+        return self.choice_counts[type_name]
+
+    def _find_type(self, type_name):
         simpleType_expr = './/xsd:simpleType[@name="{}"]'.format(type_name)
         complexType_expr = './/xsd:complexType[@name="{}"]'.format(type_name)
 
+        self.instrument.count('type_lookups')
         queue = [self.root] + self.includes
-        for root in queue:
-            node = root.find(simpleType_expr, namespaces=self.nsmap)
-            if not x.exists(node):
-                node = root.find(complexType_expr, namespaces=self.nsmap)
+        paths = [self.filepath] + self.include_paths
+        with self.instrument.phase('type_resolution'):
+            for root, path in zip(queue, paths):
+                self.instrument.count('type_lookup_roots')
+                node = root.find(simpleType_expr, namespaces=self.nsmap)
+                if not x.exists(node):
+                    node = root.find(complexType_expr, namespaces=self.nsmap)
+
+                if x.exists(node):
+                    break
+            else:
+                raise Generator.TypeNotFound('{} not found'.format(type_name))
 
-            if x.exists(node):
-                self.parse(node, el)
-                break
-        else:
-            raise Generator.TypeNotFound('{} not found'.format(type_name))
+        # types are recorded for incremental recompilation, see `dependencies`
+        if type_name not in self.resolved_types:
+            digest = hashlib.sha1(etree.tostring(node)).hexdigest()
+            self.resolved_types[type_name] = (os.path.abspath(path), digest)
+        return node
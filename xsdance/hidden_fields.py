@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import re
+
+
+re_path_separator = re.compile(r'__|(?<=:)_')
+re_inline_segment = re.compile(r'^(.+)_#\{\1:(.+)\}$')
+
+
+class _Node(object):
+
+    __slots__ = ('children', 'by_name', 'hidden')
+
+    def __init__(self):
+        # (name, index) -> _Node, index is None for not inline segments
+        self.children = {}
+        # name -> list of _Node, for any index lookups
+        self.by_name = {}
+        self.hidden = False
+
+
+class HiddenFields(object):
+    ''' Prefix trie of hidden prefixed names.
+
+    Names are split into segments on nesting connectors, so a lookup walks
+    one node per segment. Inline indeces `*` and `\\d+` are wildcards,
+    both in hidden names and in looked up names, e.g. `a__b_#{b:*}__c`
+    hides `c` in every `b` row.
+    '''
+
+    WILDCARDS = ('*', r'\d+')
+
+    def __init__(self, hidden_fields=None):
+        self.fields = []
+        self.root = _Node()
+        for name in hidden_fields or []:
+            self.add(name)
+
+    @classmethod
+    def compile(cls, hidden_fields):
+        if isinstance(hidden_fields, cls):
+            return hidden_fields
+        return cls(hidden_fields)
+
+    @staticmethod
+    def split(name):
+        segments = []
+        for segment in re_path_separator.split(name):
+            m = re_inline_segment.match(segment)
+            segments.append((m.group(1), m.group(2)) if m else (segment, None))
+        return segments
+
+    def add(self, name):
+        self.fields.append(name)
+        node = self.root
+        for key in self.split(name):
+            child = node.children.get(key)
+            if child is None:
+                child = node.children[key] = _Node()
+                node.by_name.setdefault(key[0], []).append(child)
+            node = child
+        node.hidden = True
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __bool__(self):
+        return bool(self.fields)
+    __nonzero__ = __bool__
+
+    def __contains__(self, name):
+        return self.contains(name)
+
+    def _next_nodes(self, nodes, key, any_index):
+        name, index = key
+        result = []
+        for node in nodes:
+            if index is None:
+                child = node.children.get(key)
+                if child is not None:
+                    result.append(child)
+            elif any_index or index in self.WILDCARDS:
+                result.extend(node.by_name.get(name, ()))
+            else:
+                for child_index in (index,) + self.WILDCARDS:
+                    child = node.children.get((name, child_index))
+                    if child is not None:
+                        result.append(child)
+        return result
+
+    def contains(self, name, any_index=False):
+        ''' True if `name` itself is hidden. '''
+        if not self.fields:
+            return False
+        nodes = [self.root]
+        for key in self.split(name):
+            nodes = self._next_nodes(nodes, key, any_index)
+            if not nodes:
+                return False
+        return any(node.hidden for node in nodes)
+
+    def covers(self, name, any_index=False):
+        ''' True if `name` or any of its parents is hidden. '''
+        if not self.fields:
+            return False
+        nodes = [self.root]
+        for key in self.split(name):
+            nodes = self._next_nodes(nodes, key, any_index)
+            if not nodes:
+                return False
+            if any(node.hidden for node in nodes):
+                return True
+        return False
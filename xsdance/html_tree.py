@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+''' Rendering of elements directly to `lxml.html` trees.
+
+Html templates of elements are parsed once into prototype trees, with
+markers in place of format fields. Rendering copies a prototype and puts
+values in place of markers: subtrees, already rendered as trees, are moved
+in, so nothing is serialized and parsed again. The result has the same
+structure and attributes, as `render_html` output, parsed with
+`lxml.html.fragments_fromstring`.
+'''
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import copy
+import re
+from collections import OrderedDict
+from string import Formatter
+
+from lxml import html
+
+from .cache import LRUCache
+from .hidden_fields import HiddenFields
+from .utils import GridsterSettings, InlineIndex, placeholder_replacements, re_placeholder
+
+try:
+    from html import unescape
+except ImportError:
+    from HTMLParser import HTMLParser
+    unescape = HTMLParser().unescape
+
+
+SLOT_T = 'xsdanceslot{0}x'
+re_slot = re.compile(r'xsdanceslot(\d+)x')
+re_attr = re.compile(r'([^\s=]+)(?:\s*=\s*"([^"]*)")?')
+
+# attribute, which keeps a list of attributes with value placeholders,
+# till the placeholders are substituted
+DEFERRED_ATTRS = 'data-xsdance-attrs'
+
+
+def parse_attrs(value):
+    ''' Parses list of attributes, like `a="1" disabled`, as html parser
+    does: values are unescaped, and bare names get themselves as values.
+    '''
+    return [(m.group(1), unescape(m.group(2)) if m.group(2) is not None else m.group(1))
+            for m in re_attr.finditer(value)]
+
+
+def _add_text(parent, prev, text):
+    if not text:
+        return
+    if prev is None:
+        parent.text = (parent.text or '') + text
+    else:
+        prev.tail = (prev.tail or '') + text
+
+
+def _splice(parent, index, prev, pieces):
+    ''' Inserts strings and fragments into `parent` from `index`, after
+    `prev` child, or at the beginning, if `prev` is None.
+    '''
+    for piece in pieces:
+        if isinstance(piece, Fragment):
+            container = piece.container
+            _add_text(parent, prev, container.text)
+            for child in list(container):
+                # moved child brings its tail along
+                parent.insert(index, child)
+                index += 1
+                prev = child
+        else:
+            _add_text(parent, prev, piece)
+
+
+def _set_attrs(node, replace):
+    ''' Rebuilds attributes of `node` in order, `replace` maps name of an
+    attribute to list of attributes, which take its place.
+    '''
+    items = []
+    for name, value in node.attrib.items():
+        if name in replace:
+            items.extend(replace[name])
+        else:
+            items.append((name, value))
+    node.attrib.clear()
+    for name, value in items:
+        node.set(name, value)
+
+
+class Fragment(object):
+    ''' Mixed html content, text and elements, held by a container element,
+    which itself is not a part of the content.
+    '''
+
+    def __init__(self, container=None):
+        self.container = container if container is not None else html.Element('div')
+
+    @classmethod
+    def from_string(cls, content):
+        if '<' not in content and '&' not in content:
+            fragment = cls()
+            fragment.container.text = content
+            return fragment
+        doc = html.document_fromstring('<div>{0}</div>'.format(content))
+        return cls(doc.find('body').find('div'))
+
+    def __bool__(self):
+        return bool(self.container.text) or len(self.container) > 0
+    __nonzero__ = __bool__
+
+    def copy(self):
+        return Fragment(copy.deepcopy(self.container))
+
+    def extend(self, other):
+        ''' Moves content of `other` fragment to the end. '''
+        if other is None:
+            return self
+        children = list(self.container)
+        _splice(self.container, len(children), children[-1] if children else None, [other])
+        return self
+
+    def replace(self, old, new):
+        ''' Replaces `old` with `new` in texts and attribute values, in place. '''
+        for node in self.container.iter():
+            if node.text and old in node.text:
+                node.text = node.text.replace(old, new)
+            if node is not self.container and node.tail and old in node.tail:
+                node.tail = node.tail.replace(old, new)
+            for name, value in node.attrib.items():
+                if old in value:
+                    node.set(name, value.replace(old, new))
+        return self
+
+    def nodes(self):
+        ''' List of nodes, as returned by `lxml.html.fragments_fromstring`,
+        with leading text as the first item, if it is not blank.
+        '''
+        container = self.container
+        nodes = list(container)
+        for node in nodes:
+            container.remove(node)
+        text = container.text
+        if text and text.strip():
+            nodes.insert(0, text)
+        return nodes
+
+
+class TemplateTree(object):
+    ''' Html template with `str.format` fields, parsed to a prototype tree.
+
+    A field can be inside text, inside an attribute value, or in place of
+    a list of attributes, like `{gridster_settings}` in
+    `<div {gridster_settings}>`.
+    '''
+
+    def __init__(self, template):
+        self.fields = []
+        marked = []
+        for literal, field, _, _ in Formatter().parse(template):
+            marked.append(literal)
+            if field is not None:
+                marked.append(SLOT_T.format(len(self.fields)))
+                self.fields.append(field)
+        self.prototype = Fragment.from_string(''.join(marked))
+
+    def fill(self, **values):
+        ''' Returns fragment with `values` in place of fields. Values are
+        strings, html strings in texts, or fragments, which are moved in.
+        '''
+        container = copy.deepcopy(self.prototype.container)
+
+        def text_value(index):
+            field = self.fields[index]
+            value = values[field]
+            if isinstance(value, Fragment):
+                # a fragment can be moved in only once
+                return value.copy() if self.fields.count(field) > 1 else value
+            value = '{0}'.format(value)
+            return Fragment.from_string(value) if ('<' in value or '&' in value) else value
+
+        def string_value(index):
+            return '{0}'.format(values[self.fields[index]])
+
+        def pieces(text):
+            parts = re_slot.split(text)
+            result = [parts[0]]
+            for i in range(1, len(parts), 2):
+                result.append(text_value(int(parts[i])))
+                result.append(parts[i + 1])
+            return result
+
+        for node in list(container.iter()):
+            replace = {}
+            for name, value in node.attrib.items():
+                m = re_slot.match(name)
+                if m and m.end() == len(name):
+                    value = string_value(int(m.group(1)))
+                    if '[[' in value:
+                        replace[name] = [(DEFERRED_ATTRS, value)]
+                    else:
+                        replace[name] = parse_attrs(value)
+                elif re_slot.search(value):
+                    value = re_slot.sub(lambda m: string_value(int(m.group(1))), value)
+                    replace[name] = [(name, unescape(value) if '&' in value else value)]
+            if replace:
+                _set_attrs(node, replace)
+
+            if node.text and re_slot.search(node.text):
+                text_pieces = pieces(node.text)
+                node.text = None
+                _splice(node, 0, None, text_pieces)
+
+            if node is not container and node.tail and re_slot.search(node.tail):
+                tail_pieces = pieces(node.tail)
+                node.tail = None
+                parent = node.getparent()
+                _splice(parent, parent.index(node) + 1, node, tail_pieces)
+        return Fragment(container)
+
+
+_templates = LRUCache(maxsize=1024)
+
+
+def get_template(template):
+    template_tree = _templates.get(template)
+    if template_tree is None:
+        template_tree = TemplateTree(template)
+        _templates.set(template, template_tree)
+    return template_tree
+
+
+def fill(template, **values):
+    return get_template(template).fill(**values)
+
+
+class InlineTree(object):
+    ''' Rendered fragment with places of a slot string, e.g. the inline
+    suffix with index 0, found once. `fill` copies the fragment and puts a
+    value only in those places, like `utils.InlineTemplate` does for
+    strings, instead of searching every node of the copy.
+    '''
+
+    def __init__(self, fragment, slot):
+        self.fragment = fragment
+        # (path of child indeces, 'text', 'tail' or attribute name, parts)
+        self.places = []
+        self._find(fragment.container, (), slot)
+
+    def _find(self, node, path, slot):
+        if node.text and slot in node.text:
+            self.places.append((path, 'text', node.text.split(slot)))
+        if path and node.tail and slot in node.tail:
+            self.places.append((path, 'tail', node.tail.split(slot)))
+        for name, value in node.attrib.items():
+            if slot in value:
+                self.places.append((path, ('attr', name), value.split(slot)))
+        for i, child in enumerate(node):
+            self._find(child, path + (i,), slot)
+
+    def fill(self, value):
+        container = copy.deepcopy(self.fragment.container)
+        for path, place, parts in self.places:
+            node = container
+            for i in path:
+                node = node[i]
+            if place == 'text':
+                node.text = value.join(parts)
+            elif place == 'tail':
+                node.tail = value.join(parts)
+            else:
+                node.set(place[1], value.join(parts))
+        return Fragment(container)
+
+
+def substitute_placeholders(fragment, data):
+    ''' Puts values from `data` in place of `[[name]]`, `[[name|checkbox]]`
+    and `[[name|select]]` placeholders, same as `render_html` does.
+    '''
+    # values are put in the tree as they are, not as html
+    replacements = placeholder_replacements(data, escape_select=False)
+
+    def sub(s):
+        return re_placeholder.sub(lambda m: replacements.get(m.group(0)) or '', s)
+
+    for node in fragment.container.iter():
+        if node.text and '[[' in node.text:
+            node.text = sub(node.text)
+        if node is not fragment.container and node.tail and '[[' in node.tail:
+            node.tail = sub(node.tail)
+        replace = {}
+        for name, value in node.attrib.items():
+            if name == DEFERRED_ATTRS:
+                replace[name] = parse_attrs(sub(value))
+            elif '[[' in value:
+                replace[name] = [(name, sub(value))]
+        if replace:
+            _set_attrs(node, replace)
+    return fragment
+
+
+class TreeRenderer(object):
+    ''' Renders element tree to `Fragment`, following the same steps as
+    `Element.render_html`, with templates filled as trees.
+    '''
+
+    def __init__(self, edit_mode=False, hidden_fields=None, gridster_settings=None, window=None):
+        self.edit_mode = edit_mode
+        self.window = window
+        self.inline_index = None
+        self.hidden_fields = HiddenFields.compile(hidden_fields)
+        self.gridster_settings = GridsterSettings.index(gridster_settings)
+
+    def render(self, el, empty_items=None):
+        render_empty_items = empty_items is None
+        if render_empty_items:
+            empty_items = OrderedDict()
+            self.inline_index = InlineIndex(el.initial_data)
+
+        if not self.edit_mode and el.prefixed_name() in self.hidden_fields:
+            return None
+
+        content = self._render_element(el, empty_items, render_empty_items)
+        if not el.parent:
+            substitute_placeholders(content, el.initial_data)
+        return content
+
+    def _render_element(self, el, empty_items, render_empty_items):
+        if el.subelements:
+            content = self._render_subelements(el, empty_items)
+        else:
+            content = self._render_input(el)
+
+        if el.inlines_needed() is not None:
+            inlines_count = self.inline_index.count(el.get_inline_path())
+            tree = InlineTree(content, el._get_name_with_inline_suffix())
+            inline_content = self._render_inline_content(el, tree, inlines_count)
+            empty_item = self._render_empty_item(el, tree)
+            template_id = el.get_empty_item_template_id()
+            empty_items[template_id] = empty_item
+            content = el._wrap_with_inline_block_wrapper(inline_content, template_id, inlines_count,
+                                                         fill=fill)
+
+        if render_empty_items:
+            for template_id, empty in empty_items.items():
+                content.extend(fill(el.html_empty_item_template, template_id=template_id, content=empty))
+
+        return el._wrap_with_item_wrapper(content,
+                                          edit_mode=self.edit_mode,
+                                          hidden_fields=self.hidden_fields,
+                                          gridster_settings=self.gridster_settings,
+                                          fill=fill)
+
+    def _render_subelements(self, el, empty_items):
+        content = Fragment()
+        for sub in el.subelements:
+            content.extend(self.render(sub, empty_items))
+        if content:
+            content = fill(el.html_parent_element_wrapper,
+                           parent_label=el.label_text or el.name,
+                           parent_name=el.name,
+                           content=content)
+        return content
+
+    def _render_input(self, el):
+        if not el.html_input:
+            return Fragment()
+        name = el.prefixed_name()
+        html_label = fill(el.html_label,
+                          name=name,
+                          label_text=el.label_text or el.name,
+                          required=el.get_class_required())
+        checkbox_ind = '|checkbox' if el.is_checkbox else ''
+        select_ind = '|select' if el.is_select else ''
+        ind = select_ind or checkbox_ind
+        value = '[[{name}{ind}]]'.format(name=name, ind=ind) if el.initial_data else ''
+        html_input = fill(el.html_input,
+                          edit_checkbox=el.get_edit_checkbox_input(self.edit_mode, self.hidden_fields,
+                                                                   fill=fill),
+                          disabled=self.edit_mode and 'disabled' or '',
+                          name=name,
+                          value=value,
+                          checked=value)
+        return fill(el.html_input_wrapper,
+                    label=html_label,
+                    html_input=html_input,
+                    help_text=el.get_help_text_html(),
+                    name=name)
+
+    def _wrap_with_inline_item_wrapper(self, el, content):
+        return fill(el.html_inline_item_wrapper,
+                    content=content,
+                    remove_button=el.get_remove_button(fill=fill),
+                    gridster_settings=el.get_gridster_settings_attrs(self.gridster_settings,
+                                                                     inline_wrapper=True),
+                    prefixed_name=el.prefixed_name())
+
+    def _render_inline_content(self, el, tree, inlines_count):
+        min_inlines = 0 if inlines_count else 1
+        inlines_count = inlines_count or el.inlines_needed()
+        stop = inlines_count if self.window is None else min(inlines_count, self.window)
+        items = Fragment()
+        if min_inlines:
+            items.extend(self._wrap_with_inline_item_wrapper(el, tree.fragment.copy()))
+        for i in range(min_inlines, stop):
+            item = tree.fill(el._get_name_with_inline_suffix(index=i))
+            items.extend(self._wrap_with_inline_item_wrapper(el, item))
+        if stop < inlines_count:
+            items.extend(fill(el.html_inline_window_placeholder,
+                              prefixed_name=el.prefixed_name(process_inlines=False),
+                              offset=stop,
+                              count=inlines_count - stop,
+                              total_count=inlines_count))
+        return items
+
+    def _render_empty_item(self, el, tree):
+        empty = tree.fill(el._get_name_with_inline_suffix(empty=True))
+        empty = self._wrap_with_inline_item_wrapper(el, empty)
+        parent = el.parent
+        while parent:
+            if parent.inlines_needed() is not None:
+                empty.replace(parent._get_name_with_inline_suffix(),
+                              parent._get_name_with_inline_suffix(empty=True))
+            parent = parent.parent
+        return empty
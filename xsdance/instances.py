@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+''' Instance documents of forms, read to initial data incrementally.
+
+    >>> reader = InstanceReader(compiled.element)
+    >>> el.set_initial_data(reader.read('return.xml'))
+
+Nodes are mapped to elements through `InstancePaths`, and names of
+fields are made from the element's `FieldCatalog`, so the document is
+neither built as a tree nor converted to nested dicts. Processed nodes
+are cleared, memory is bounded by the depth of the document.
+'''
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import io
+
+from lxml import etree
+
+
+class InstancePaths(object):
+    ''' Subelements of every element of a tree, by names of nodes in
+    instance documents. Choices have no nodes, so names of their
+    subelements are resolved to chains of elements, starting with the
+    choices they are in.
+    '''
+
+    def __init__(self, element):
+        self.element = element
+        self.children = {}
+        elements = [element]
+        while elements:
+            el = elements.pop()
+            self.children[el] = self._collect(el, ())
+            elements.extend(el.subelements)
+
+    @classmethod
+    def _collect(cls, el, chain):
+        children = {}
+        for sub in el.subelements:
+            if sub.name.startswith(':choice_'):
+                for name, sub_chain in cls._collect(sub, chain + (sub,)).items():
+                    children.setdefault(name, sub_chain)
+            else:
+                children.setdefault(sub.name, chain + (sub,))
+        return children
+
+    def resolve(self, el, name):
+        ''' Chain of elements from `el` to its subelement named `name` in
+        instances, or None.
+        '''
+        return self.children.get(el, {}).get(name)
+
+
+class _Frame(object):
+    ''' Element of an open node, with indeces of inline rows it is in and
+    counts of rows of its subelements seen so far.
+    '''
+
+    __slots__ = ('element', 'indeces', 'counts')
+
+    def __init__(self, element, indeces):
+        self.element = element
+        self.indeces = indeces
+        self.counts = {}
+
+
+class InstanceReader(object):
+
+    def __init__(self, element):
+        self.element = element
+        self.paths = InstancePaths(element)
+        self.fields = {field.element: field for field in element.get_field_catalog()}
+
+    def read(self, source):
+        ''' Returns initial data of the form from instance document at
+        `source`, a path, file object or serialized XML.
+        '''
+        return dict(self.iter_values(source))
+
+    def iter_values(self, source):
+        ''' Yields (prefixed name, value) of every field in `source`. '''
+        if isinstance(source, type('')) and source.lstrip().startswith('<'):
+            source = source.encode('utf-8')
+        if isinstance(source, bytes) and source.lstrip().startswith(b'<'):
+            source = io.BytesIO(source)
+        stack = []
+        for event, node in etree.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                stack.append(self._open(stack, node))
+                continue
+
+            frame = stack.pop()
+            if frame is not None and not frame.element.subelements:
+                field = self.fields.get(frame.element)
+                if field is not None and node.text is not None:
+                    yield field.format(frame.indeces), node.text
+            # nodes are dropped, as soon as they are processed
+            node.clear()
+            parent = node.getparent()
+            if parent is not None:
+                while node.getprevious() is not None:
+                    del parent[0]
+
+    def _open(self, stack, node):
+        name = etree.QName(node).localname
+        if not stack:
+            if name != self.element.name:
+                raise self.element.PathNotFound(name)
+            return _Frame(self.element, ())
+
+        parent = stack[-1]
+        if parent is None:
+            return None
+        chain = self.paths.resolve(parent.element, name)
+        if chain is None:
+            return None
+
+        indeces = parent.indeces
+        for el in chain:
+            if el.inlines_needed() is not None:
+                # every node starts a new row of each inline it is in,
+                # rows of choices included
+                index = parent.counts.get(el, 0)
+                parent.counts[el] = index + 1
+                indeces += (index,)
+        return _Frame(chain[-1], indeces)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+''' Opt-in profiling of compile, render and validate.
+
+    >>> instrument = Instrument(sink=LoggingSink())
+    >>> Generator(instrument=instrument).run(path)
+    >>> el.render_html(instrument=instrument)
+
+A report is sent to the sink, when the outermost phase ends, e.g. once
+per `Generator.run` or `render_html` call. Without an instrument the
+`NULL_INSTRUMENT` is used, which does nothing.
+'''
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import json
+import logging
+from collections import defaultdict
+from timeit import default_timer
+
+
+class _NullPhase(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_null_phase = _NullPhase()
+
+
+class NullInstrument(object):
+    ''' Instrument, that records nothing. Call sites, which would do extra
+    work only to feed an instrument, check `enabled` first.
+    '''
+
+    enabled = False
+
+    def phase(self, name, element=None):
+        return _null_phase
+
+    def count(self, name, n=1):
+        pass
+
+    def flush(self):
+        pass
+
+
+NULL_INSTRUMENT = NullInstrument()
+
+
+class _Phase(object):
+
+    def __init__(self, instrument, name, element):
+        self.instrument = instrument
+        self.name = name
+        self.element = element
+        self.start = None
+        self.children_time = 0.0
+
+    def __enter__(self):
+        self.instrument._stack.append(self)
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = default_timer() - self.start
+        instrument = self.instrument
+        instrument._stack.pop()
+        instrument.timers[self.name] += elapsed
+        instrument.calls[self.name] += 1
+        if self.element is not None:
+            # own time of an element, without time of nested phases
+            own = elapsed - self.children_time
+            key = self.element.prefixed_name(process_inlines=False)
+            instrument.element_costs[self.name][key] += own
+        if instrument._stack:
+            instrument._stack[-1].children_time += elapsed
+        elif instrument.autoflush:
+            instrument.flush()
+        return False
+
+
+class Instrument(object):
+    ''' Collects time per phase, counters and time per element.
+
+    `sink` is any callable, which accepts a report dict:
+
+        {
+            'phases': {name: {'time': seconds, 'calls': n}},
+            'counters': {name: n},
+            'elements': {phase: {prefixed_name: seconds}},
+        }
+
+    Time of nested phases is included in time of the outer phase, but
+    element times are own times, e.g. time of rendering an element without
+    its subelements.
+    '''
+
+    enabled = True
+
+    def __init__(self, sink=None, autoflush=True):
+        self.sink = sink
+        self.autoflush = autoflush
+        self._stack = []
+        self.reset()
+
+    def reset(self):
+        self.timers = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.element_costs = defaultdict(lambda: defaultdict(float))
+
+    def phase(self, name, element=None):
+        ''' Context manager, which times `name` phase, and adds its time to
+        cost of `element`, if given.
+        '''
+        return _Phase(self, name, element)
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def report(self):
+        return {
+            'phases': {name: {'time': t, 'calls': self.calls[name]}
+                       for name, t in self.timers.items()},
+            'counters': dict(self.counters),
+            'elements': {phase: dict(costs) for phase, costs in self.element_costs.items()},
+        }
+
+    def flush(self):
+        ''' Sends report to the sink and starts a new one. '''
+        report = self.report()
+        self.reset()
+        if self.sink is not None:
+            self.sink(report)
+        return report
+
+    def top_elements(self, phase, count=10):
+        costs = self.element_costs.get(phase, {})
+        return sorted(costs.items(), key=lambda item: item[1], reverse=True)[:count]
+
+
+class MemorySink(object):
+    ''' Keeps reports in `reports` list. '''
+
+    def __init__(self):
+        self.reports = []
+
+    def __call__(self, report):
+        self.reports.append(report)
+
+
+class LoggingSink(object):
+    ''' Logs phases and counters of every report, and `top` most expensive
+    elements of every phase.
+    '''
+
+    def __init__(self, logger=None, level=logging.INFO, top=10):
+        self.logger = logger or logging.getLogger('xsdance')
+        self.level = level
+        self.top = top
+
+    def __call__(self, report):
+        elements = {phase: sorted(costs.items(), key=lambda item: item[1], reverse=True)[:self.top]
+                    for phase, costs in report['elements'].items()}
+        self.logger.log(self.level, 'xsdance profile: %s', json.dumps({
+            'phases': report['phases'],
+            'counters': report['counters'],
+            'elements': elements,
+        }, sort_keys=True))
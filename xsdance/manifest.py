@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+''' Compact JSON manifest of a compiled form, for validation in clients.
+
+    >>> manifest = CompiledSchema.load('IRS1040.pickle').manifest()
+
+Fields, inlines and choices are keyed by templates of prefixed names,
+where inline suffixes have no index, e.g. `Form__Item_#{Item}__Amt`, as
+in templates of empty inline items. Facets are taken from folded
+validators, so the manifest checks the same as `Element.validate_inputs`.
+Patterns are anchored at the start of values only, as the server matches
+them, not to whole values, as XSD does.
+'''
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import json
+import re
+from collections import OrderedDict
+
+from .catalog import Field
+from .utils import get_patterns, NOOP_FACETS
+
+
+MANIFEST_VERSION = 1
+
+INT_FACETS = ('length', 'minLength', 'maxLength', 'totalDigits', 'fractionDigits')
+
+re_first_row = re.compile(r'_#\{([^}]*):0\}')
+
+
+def get_template(name):
+    ''' Template of prefixed name in the first rows of its inlines. '''
+    return re_first_row.sub(r'_#{\1}', name)
+
+
+def get_facets(el):
+    facets = OrderedDict()
+    for v in el.validators:
+        if v.rname in NOOP_FACETS:
+            continue
+        if v.rname == 'pattern':
+            # the server matches patterns at the start of values, with
+            # `re.match`, so they are not anchored at the end
+            patterns = facets.setdefault('patterns', [])
+            patterns += ['^(?:{0})'.format(p) for p in get_patterns(v) if p not in patterns]
+        elif v.rname == 'enumeration':
+            # values should be in every enumeration left after folding
+            values = facets.get('enumeration')
+            facets['enumeration'] = list(v.rvalue) if values is None else [
+                value for value in values if value in v.rvalue]
+        elif v.rname in INT_FACETS:
+            facets[v.rname] = int(v.rvalue)
+        else:
+            facets[v.rname] = '{0}'.format(v.rvalue)
+    return facets
+
+
+def build_manifest(element):
+    ''' Returns manifest of `element` tree, as dict. '''
+    catalog = element.get_field_catalog()
+    # fields are required, as masks of the server check them
+    masks = [re.compile(mask) for mask in element.get_required_masks(None)]
+
+    fields = OrderedDict()
+    for field in catalog:
+        entry = OrderedDict()
+        if field.kind != Field.CHECKBOX and any(mask.match(field.name) for mask in masks):
+            entry['required'] = True
+        if field.kind:
+            entry['kind'] = field.kind
+        if field.inlines:
+            entry['inlines'] = list(field.inlines)
+        facets = get_facets(field.element)
+        if facets:
+            entry['facets'] = facets
+        fields[get_template(field.name)] = entry
+
+    inlines = OrderedDict()
+    choices = OrderedDict()
+    # templates are made as names in `FieldCatalog.build`, so they start
+    # with the name of `element`, even if it has parents
+    elements = [(sub, '{0}__'.format(element.name)) for sub in reversed(element.subelements)]
+    while elements:
+        el, prefix = elements.pop()
+        template = prefix + el.name
+        if el.inlines_needed() is not None:
+            template += '_#{{{0}}}'.format(el.name)
+            inlines[template] = OrderedDict([('min', el.min_occurs), ('max', el.max_occurs)])
+        if el.name.startswith(':choice_'):
+            choices[template] = OrderedDict([
+                ('min', el.min_occurs),
+                ('max', el.max_occurs),
+                ('fields', [name for name in fields if name.startswith(template + '_')]),
+            ])
+        connector = '_' if 'choice' in el.name else '__'
+        elements.extend((sub, template + connector) for sub in reversed(el.subelements))
+
+    return OrderedDict([
+        ('version', MANIFEST_VERSION),
+        ('form', element.name),
+        ('fields', fields),
+        ('inlines', inlines),
+        ('choices', choices),
+    ])
+
+
+def dump_manifest(element):
+    ''' Returns manifest of `element` tree, as compact JSON. '''
+    return json.dumps(build_manifest(element), separators=(',', ':'))
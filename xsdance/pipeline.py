@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+''' Streaming pipeline of submissions, from JSON lines to XML documents.
+
+    >>> pipeline = Pipeline(CompiledSchema.load('IRS1040.pickle').element, jobs=4)
+    >>> with io.open('submissions.jsonl', 'rb') as lines:
+    ...     pipeline.write(lines, io.open('returns.xml', 'wb'), io.open('errors.jsonl', 'wb'))
+
+Every line is an object of inputs of the form, keyed by prefixed names.
+Lines are read, normalized and validated with `Element.validate_inputs`,
+and valid ones are serialized with `serialize_xml`, one at a time, so
+memory does not depend on count of submissions. With `jobs`, submissions
+are processed in a pool of threads, or processes, but no more than
+`buffer_size` of them are read ahead of the consumer, and results come in
+order of lines.
+'''
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import json
+import multiprocessing
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+from .utils import parse_inputs, serialize_xml
+
+
+class Submission(object):
+    ''' Result of one line, `xml` of valid submission, or `errors`, as
+    `Element.validate_inputs` returns them.
+    '''
+
+    def __init__(self, number, errors=None, xml=None):
+        self.number = number
+        self.errors = errors or {}
+        self.xml = xml
+
+    def __repr__(self):
+        return '<Submission {0}>'.format(self.number)
+
+    @property
+    def is_valid(self):
+        return not self.errors
+
+
+# pipeline of pool processes, set once per process, so the element tree is
+# not pickled with every submission
+_worker_pipeline = None
+
+
+def _init_worker(pipeline):
+    global _worker_pipeline
+    _worker_pipeline = pipeline
+
+
+def _process_in_worker(record):
+    return _worker_pipeline.process(*record)
+
+
+class Pipeline(object):
+
+    def __init__(self, element, hidden_fields=None, jobs=1, processes=False, buffer_size=None):
+        ''' `element` is the top element of the form. `jobs` is count of
+        threads, or of processes with `processes`, validating submissions.
+        `buffer_size` is count of submissions read ahead, 4 per job by default.
+        '''
+        self.element = element
+        self.hidden_fields = hidden_fields
+        self.jobs = jobs
+        self.processes = processes
+        self.buffer_size = buffer_size or 4 * jobs
+
+    def read(self, lines):
+        ''' Yields (line number, inputs, error) of every non-empty line. '''
+        for number, line in enumerate(lines, 1):
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.strip():
+                continue
+            try:
+                inputs = json.loads(line)
+            except ValueError as e:
+                yield number, None, 'Invalid JSON: {0}'.format(e)
+                continue
+            if not isinstance(inputs, dict):
+                yield number, None, 'Submission should be an object of inputs'
+                continue
+            yield number, inputs, None
+
+    def process(self, number, inputs, error=None):
+        ''' Validates and serializes one submission. '''
+        if error is not None:
+            return Submission(number, errors={'': [error]})
+        try:
+            cleaned, errors = self.element.validate_inputs(inputs, self.hidden_fields)
+            if errors:
+                return Submission(number, errors=errors)
+            return Submission(number, xml=self.serialize(cleaned))
+        except (Exception, self.element.PathNotFound) as e:
+            return Submission(number, errors={'': ['{0}: {1}'.format(type(e).__name__, e)]})
+
+    def serialize(self, cleaned):
+        ''' XML document of cleaned inputs, empty values are left out. '''
+        data = parse_inputs({k: v for k, v in cleaned.items() if v not in ('', None, [])})
+        return serialize_xml(self.element.get_ordered_dict_with_data(data), root=self.element.name)
+
+    def run(self, lines):
+        ''' Yields `Submission` of every line, in order of lines. '''
+        records = self.read(lines)
+        if self.jobs == 1:
+            for record in records:
+                yield self.process(*record)
+            return
+
+        if self.processes:
+            pool = multiprocessing.Pool(self.jobs, _init_worker, (self,))
+            submit = lambda record: pool.apply_async(_process_in_worker, (record,))  # NOQA
+        else:
+            pool = ThreadPool(self.jobs)
+            submit = lambda record: pool.apply_async(self.process, record)  # NOQA
+        pending = deque()
+        try:
+            for record in records:
+                pending.append(submit(record))
+                # lines are not read, until the consumer takes results
+                if len(pending) >= self.buffer_size:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+        finally:
+            pool.terminate()
+
+    def write(self, lines, output, errors_output):
+        ''' Writes XML documents of valid submissions to `output`, one per
+        line, and errors of invalid ones to `errors_output`, as JSON lines
+        with line numbers. Both are binary files. Returns count of valid
+        and of invalid submissions.
+        '''
+        valid = invalid = 0
+        for submission in self.run(lines):
+            if submission.is_valid:
+                valid += 1
+                # serialized documents have no line breaks but in values,
+                # where they are kept as character references
+                output.write(submission.xml.replace(b'\n', b'&#10;') + b'\n')
+            else:
+                invalid += 1
+                line = json.dumps({'line': submission.number, 'errors': submission.errors})
+                errors_output.write(line.encode('utf-8') + b'\n')
+        return valid, invalid
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+''' Registry of compiled forms, shared by concurrent requests.
+
+    >>> registry = SchemaRegistry(executor, primitive_types_path='IRS/primitive_types.xsd')
+    >>> compiled = registry.get('IRS1040.xsd')                                  # threads
+    >>> compiled = await asyncio.wrap_future(registry.submit('IRS1040.xsd'))   # asyncio
+
+A form is compiled once per version of its files. Requests for a form,
+which is being compiled, wait for that compile instead of starting their
+own, and all of them get the same `CompiledSchema`. Compiles run in the
+executor, so callers, e.g. an event loop, are not blocked by them.
+'''
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import os
+import threading
+
+try:
+    from concurrent.futures import Future
+except ImportError:
+    Future = None
+
+from .cache import make_key
+from .compiled import CompiledSchema
+
+
+def stamp(paths):
+    ''' Modification times and sizes of files at `paths`. '''
+    result = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            result.append((path, st.st_mtime, st.st_size))
+        except OSError:
+            result.append((path, None, None))
+    return result
+
+
+class _Flight(object):
+    ''' Compile in progress, which callers of the same form wait for. It
+    has methods of `concurrent.futures.Future`, which callers use, for
+    Python without `concurrent.futures`.
+    '''
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def finish(self, result, error):
+        with self._lock:
+            self._result = result
+            self._error = error
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def done(self):
+        return self._done.is_set()
+
+    def add_done_callback(self, callback):
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def exception(self, timeout=None):
+        self._done.wait(timeout)
+        return self._error
+
+    def result(self, timeout=None):
+        self._done.wait(timeout)
+        if not self._done.is_set():
+            raise RuntimeError('Compile is not finished in {0} seconds'.format(timeout))
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def future(self):
+        ''' `concurrent.futures.Future` of the compile, or the flight,
+        if there is no `concurrent.futures`.
+        '''
+        if Future is None:
+            return self
+        future = Future()
+
+        def resolve(flight):
+            if flight._error is not None:
+                future.set_exception(flight._error)
+            else:
+                future.set_result(flight._result)
+        self.add_done_callback(resolve)
+        return future
+
+
+class SchemaRegistry(object):
+
+    def __init__(self, executor=None, **generator_kwargs):
+        ''' `generator_kwargs` are passed to `Generator` of every form.
+        `executor` runs compiles, it is any object with `submit(fn, *args)`,
+        e.g. `concurrent.futures.ThreadPoolExecutor`. If it is None, every
+        compile runs in a new thread.
+        '''
+        self.executor = executor
+        self.generator_kwargs = generator_kwargs
+        # path -> (stamp of files of the form, compiled form)
+        self.schemas = {}
+        # fingerprint -> _Flight
+        self.flights = {}
+        self.compiles = 0
+        self._lock = threading.Lock()
+
+    def fingerprint(self, path):
+        ''' Key of the version of the form, compiles of the same key are
+        shared. `generator_kwargs` are the same for all forms of the
+        registry, so they are not in the key.
+        '''
+        return make_key(path, stamp([path]))
+
+    def _get_compiled(self, path):
+        entry = self.schemas.get(path)
+        if entry is not None and entry[0] == stamp(entry[1].files):
+            return entry[1]
+        return None
+
+    def _join(self, path):
+        ''' Returns compiled form, or flight to wait for, its key, and
+        whether the caller should run it.
+        '''
+        compiled = self._get_compiled(path)
+        if compiled is not None:
+            return compiled, None, None, False
+        key = self.fingerprint(path)
+        with self._lock:
+            # the compile may have finished after the check above
+            compiled = self._get_compiled(path)
+            if compiled is not None:
+                return compiled, None, None, False
+            flight = self.flights.get(key)
+            if flight is not None:
+                return None, flight, key, False
+            flight = self.flights[key] = _Flight()
+        return None, flight, key, True
+
+    def _run(self, path, key, flight):
+        compiled = error = None
+        try:
+            compiled = CompiledSchema.compile(path, **self.generator_kwargs)
+            with self._lock:
+                self.schemas[path] = (stamp(compiled.files), compiled)
+                self.compiles += 1
+        except BaseException as e:
+            # errors of `Generator` are not `Exception` subclasses, all
+            # of them are passed to waiters
+            error = e
+        finally:
+            with self._lock:
+                del self.flights[key]
+            flight.finish(compiled, error)
+
+    def _start(self, path, key, flight):
+        if self.executor is not None:
+            self.executor.submit(self._run, path, key, flight)
+            return
+        thread = threading.Thread(target=self._run, args=(path, key, flight))
+        thread.daemon = True
+        thread.start()
+
+    def submit(self, path):
+        ''' Returns future of compiled form at `path`, without waiting for
+        the compile. Concurrent callers of the same form share the compile.
+        '''
+        path = os.path.abspath(path)
+        compiled, flight, key, leader = self._join(path)
+        if compiled is not None:
+            flight = _Flight()
+            flight.finish(compiled, None)
+            return flight.future()
+        future = flight.future()
+        if leader:
+            self._start(path, key, flight)
+        return future
+
+    def get(self, path):
+        ''' Returns compiled form at `path`, blocking the calling thread,
+        till it is compiled.
+        '''
+        return self.submit(path).result()
+
+    def clear(self):
+        with self._lock:
+            self.schemas.clear()
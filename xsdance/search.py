@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+''' Inverted index of elements of a form, for search of fields by words.
+
+    >>> compiled.search('dependent care')
+    ['IRS1040__DependentCareExpenseAmt', ...]
+
+Terms are words of labels, help texts, names, split on camel case, and of
+`documentation` annotations, keys included, so `line 21` finds elements
+documented with `LineNumber` 21. Every word of a query matches terms it
+is a prefix of, elements should match all words of the query. Elements
+are found by their prefixed names, with index 0 of inlines, as names of
+fields in `Element.get_flat_fields`.
+'''
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import heapq
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+
+re_camel_case = re.compile(r'([a-z0-9])([A-Z])|([A-Z]+)([A-Z][a-z])')
+re_word = re.compile(r'[a-z]+|[0-9]+')
+
+
+def tokenize(text):
+    ''' Lower case words of `text`, camel case names are split. '''
+    text = re_camel_case.sub(lambda m: ' '.join(g for g in m.groups() if g), text)
+    return re_word.findall(text.lower())
+
+
+def _get_texts(value):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            yield k
+            for text in _get_texts(v):
+                yield text
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            for text in _get_texts(v):
+                yield text
+    elif value:
+        yield '{0}'.format(value)
+
+
+class SearchIndex(object):
+
+    def __init__(self, names, postings):
+        ''' `names` are prefixed names of elements, `postings` maps terms to
+        sorted positions of elements in `names`.
+        '''
+        self.names = names
+        self.postings = postings
+        self.terms = sorted(postings)
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def build(cls, elements):
+        ''' Indexes `elements` and their subelements, choices are not
+        indexed, their subelements are.
+        '''
+        names = []
+        postings = defaultdict(set)
+        stack = [(el, '') for el in reversed(elements)]
+        while stack:
+            el, prefix = stack.pop()
+            name = prefix + el.name
+            if el.inlines_needed() is not None:
+                name += '_#{{{0}:0}}'.format(el.name)
+            if not el.name.startswith(':choice_'):
+                terms = set(tokenize(el.name))
+                terms.add(el.name.lower())
+                texts = [el.label_text, el.help_text] + list(_get_texts(el.kwargs.get('documentation')))
+                for text in texts:
+                    terms.update(tokenize(text or ''))
+                for term in terms:
+                    postings[term].add(len(names))
+                names.append(name)
+            connector = '_' if 'choice' in el.name else '__'
+            stack.extend((sub, name + connector) for sub in reversed(el.subelements))
+        return cls(names, {term: sorted(ids) for term, ids in postings.items()})
+
+    def _match(self, word):
+        ''' Positions of elements with terms, which start with `word`. '''
+        result = set()
+        i = bisect_left(self.terms, word)
+        while i < len(self.terms) and self.terms[i].startswith(word):
+            result.update(self.postings[self.terms[i]])
+            i += 1
+        return result
+
+    def search(self, query, limit=None):
+        ''' Prefixed names of elements, which match all words of `query`,
+        the ones with more whole words first, then in order of the tree.
+        '''
+        words = tokenize(query)
+        if not words:
+            return []
+        found = None
+        for word in sorted(set(words), key=len, reverse=True):
+            matched = self._match(word)
+            found = matched if found is None else found & matched
+            if not found:
+                return []
+        exact = [set(self.postings.get(word, ())) for word in words]
+        key = lambda i: (-sum(i in ids for ids in exact), i)  # NOQA
+        ranked = sorted(found, key=key) if limit is None else heapq.nsmallest(limit, found, key=key)
+        return [self.names[i] for i in ranked]
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+from unittest import TestCase, skipIf
+
+from xsdance import batch
+from xsdance.batch import Column, ColumnarValidator
+from xsdance.test_compiled import compile_form
+
+
+FORM = '''
+  <xsd:simpleType name="CodeType">
+    <xsd:restriction base="xsd:string"><xsd:pattern value="[A-Z]{2,3}"/></xsd:restriction>
+  </xsd:simpleType>
+  <xsd:simpleType name="AmountType">
+    <xsd:restriction base="xsd:integer"><xsd:maxInclusive value="100"/><xsd:totalDigits value="4"/></xsd:restriction>
+  </xsd:simpleType>
+  <xsd:element name="Form">
+    <xsd:complexType><xsd:sequence>
+      <xsd:element name="Item" minOccurs="0" maxOccurs="3">
+        <xsd:complexType><xsd:sequence>
+          <xsd:element name="Code" type="CodeType"/>
+          <xsd:element name="Amt" type="AmountType" minOccurs="0"/>
+          <xsd:choice>
+            <xsd:element name="Name">
+              <xsd:simpleType><xsd:restriction base="xsd:string"><xsd:maxLength value="5"/></xsd:restriction></xsd:simpleType>
+            </xsd:element>
+            <xsd:element name="Kind">
+              <xsd:simpleType><xsd:restriction base="xsd:string">
+                <xsd:enumeration value="A"/><xsd:enumeration value="B"/>
+              </xsd:restriction></xsd:simpleType>
+            </xsd:element>
+          </xsd:choice>
+        </xsd:sequence></xsd:complexType>
+      </xsd:element>
+    </xsd:sequence></xsd:complexType>
+  </xsd:element>
+'''  # NOQA
+
+ROWS = [
+    {'Code': 'AB', 'Amt': '5', ':choice_0:_Name': 'Ann', ':choice_0:_Kind': ''},
+    {'Code': 'abc', 'Amt': '500', ':choice_0:_Name': 'Annabel', ':choice_0:_Kind': 'A'},
+    {'Code': '', 'Amt': 'x', ':choice_0:_Name': '', ':choice_0:_Kind': 'C'},
+    {'Code': 'XYZ', 'Amt': '', ':choice_0:_Name': '', ':choice_0:_Kind': ''},
+]
+
+
+class TestColumnarValidator(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.el = compile_form(FORM).element
+
+    def setUp(self):
+        self.validator = ColumnarValidator(self.el.get_element_by_path('Form__Item_#{Item:0}'))
+
+    def validate_inputs(self, rows):
+        source = {}
+        for i, row in enumerate(rows):
+            for name, value in row.items():
+                source[self.validator.get_field_name(name, i)] = value
+        return self.el.validate_inputs(source)[1]
+
+    def test_errors_are_as_validate_inputs(self):
+        errors = self.validator.validate_rows(ROWS)
+        self.assertEqual(errors, self.validate_inputs(ROWS))
+        self.assertEqual(errors['Form__Item_#{Item:2}__Code'], ['This field is required'])
+        self.assertEqual(errors['Form__Item_#{Item:2}__Amt'], ['Value should be integer', 'Incorrect value'])
+        self.assertIn('Form__Item_#{Item:1}__:choice_0:', errors)
+        self.assertIn('Form__Item_#{Item:3}__:choice_0:', errors)
+        self.assertEqual(errors['Form__Item_#{Item:0}'], ['Up to 3 values allowed'])
+        self.assertNotIn('Form__Item_#{Item:0}__Code', errors)
+
+    def test_columns_without_numpy(self):
+        numpy = batch.numpy
+        batch.numpy = None
+        try:
+            self.assertEqual(self.validator.validate_rows(ROWS), self.validate_inputs(ROWS))
+        finally:
+            batch.numpy = numpy
+
+    @skipIf(batch.numpy is None, 'NumPy is not installed')
+    def test_same_with_and_without_numpy(self):
+        values = ['5', '-12', '+3', ' 7 ', '--1', '+-1', '-', '1.5', 'x', '', '0012', '7-',
+                  '123456789012345678', '-12345678901234567890', '9' * 30 + 'x']
+
+        def check():
+            integers, invalid = Column(None, list(range(len(values))), values).integers()
+            return [int(i) for i in integers], invalid
+
+        with_numpy = check()
+        numpy = batch.numpy
+        batch.numpy = None
+        try:
+            self.assertEqual(with_numpy, check())
+        finally:
+            batch.numpy = numpy
+        self.assertEqual(with_numpy[1], [4, 5, 6, 7, 8, 9, 11, 14])
+
+    def test_columns(self):
+        errors = self.validator.validate_columns({'Amt': ['1', '101', None]})
+        self.assertEqual(list(errors), ['Form__Item_#{Item:1}__Amt'])
+        self.assertRaises(self.el.PathNotFound, self.validator.validate_columns, {'Item__Amt': []})
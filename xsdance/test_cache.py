@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from xsdance.cache import LRUCache, RenderCache
+from xsdance.generator import Generator
+from xsdance.test_element import create_tree
+
+
+def create_siblings(names):
+    ''' r with subelements `names`. '''
+    generator = Generator()
+    r = generator.create_element('r')
+    for name in names:
+        el = generator.create_element(name, parent_name='r')
+        el.html_input = generator.element_kwargs['html_input']
+        r.add_subelement(el)
+    return r
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PRIMITIVE_TYPES_PATH = os.path.join(HERE, 'IRS', 'primitive_types.xsd')
+SCHEMA_PATH = os.path.join(
+    HERE, 'IRS', 'Federal', '2015v3.0', 'IndividualIncomeTax', 'Common',
+    'Dependencies', 'NameChangeStatement.xsd')
+
+
+class TestLRUCache(TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+
+class TestRenderCache(TestCase):
+
+    def setUp(self):
+        schema = Generator(primitive_types_path=PRIMITIVE_TYPES_PATH).run(SCHEMA_PATH)
+        self.el = schema[0]
+        self.el.parent = None
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def render(self, **kwargs):
+        kwargs.setdefault('hidden_fields', [])
+        kwargs.setdefault('gridster_settings', [])
+        return self.el.render_html(**kwargs)
+
+    def test_same_output_as_uncached(self):
+        cache = RenderCache()
+        hidden = ['NameChangeStatement__NameChangeStmt_#{NameChangeStmt:0}__SSN']
+        for edit_mode in (False, True):
+            expected = self.render(edit_mode=edit_mode, hidden_fields=hidden)
+            self.assertEqual(self.render(edit_mode=edit_mode, hidden_fields=hidden, render_cache=cache),
+                             expected)
+            self.assertEqual(self.render(edit_mode=edit_mode, hidden_fields=hidden, render_cache=cache),
+                             expected)
+        self.assertTrue(cache.memory.hits)
+
+    def test_hidden_fields_change_is_not_served_from_cache(self):
+        cache = RenderCache()
+        self.render(render_cache=cache)
+        hidden = ['NameChangeStatement__NameChangeStmt_#{NameChangeStmt:0}__SSN']
+        self.assertEqual(self.render(hidden_fields=hidden, render_cache=cache),
+                         self.render(hidden_fields=hidden))
+
+    def test_inline_rows_from_data_are_not_served_from_cache(self):
+        cache = RenderCache()
+        self.render(render_cache=cache)
+        self.el.set_initial_data({
+            'NameChangeStatement__NameChangeStmt_#{NameChangeStmt:0}__SSN': '111111111',
+            'NameChangeStatement__NameChangeStmt_#{NameChangeStmt:1}__SSN': '222222222',
+        })
+        self.assertEqual(self.render(render_cache=cache), self.render())
+
+    def test_position_among_siblings_is_not_served_from_cache(self):
+        cache = RenderCache()
+        create_siblings(['a', 'd']).render_html(gridster_settings=[], render_cache=cache)
+        el = create_siblings(['x', 'y', 'd'])
+        self.assertEqual(el.render_html(gridster_settings=[], render_cache=cache),
+                         el.render_html(gridster_settings=[]))
+
+    def test_disk_tier_is_shared(self):
+        expected = self.render(render_cache=RenderCache(directory=self.directory))
+        cache = RenderCache(directory=self.directory)
+        self.assertEqual(self.render(render_cache=cache), expected)
+        self.assertEqual(cache.memory.misses, 1)
+
+
+class TestRenderFingerprint(TestCase):
+
+    def setUp(self):
+        self.el = create_tree()
+        self.el.set_initial_data({'r__a_#{a:0}__c': 'c 0', 'r__d': 'd'})
+        self.gridster = [{'prefixed_name': 'r__d', 'data-gs-x': 1}]
+        self.fingerprint = self.el.render_fingerprint(hidden_fields=['r__d'], gridster_settings=self.gridster)
+
+    def test_same_arguments(self):
+        self.assertEqual(self.fingerprint, self.el.render_fingerprint(
+            hidden_fields=['r__d', 'r__d'],
+            gridster_settings=self.gridster + [{'prefixed_name': 'r__d', 'data-gs-x': 2}],
+            initial_data={'r__d': 'd', 'r__a_#{a:0}__c': 'c 0'}))
+
+    def test_changed_arguments(self):
+        fingerprints = set([
+            self.fingerprint,
+            self.el.render_fingerprint(edit_mode=True, hidden_fields=['r__d'], gridster_settings=self.gridster),
+            self.el.render_fingerprint(gridster_settings=self.gridster),
+            self.el.render_fingerprint(hidden_fields=['r__d']),
+            self.el.render_fingerprint(hidden_fields=['r__d'], gridster_settings=self.gridster, window=1),
+            self.el.render_fingerprint(hidden_fields=['r__d'], gridster_settings=self.gridster,
+                                       initial_data={'r__d': 'e'}),
+        ])
+        self.assertEqual(len(fingerprints), 6)
+
+    def test_position_among_siblings(self):
+        d = create_siblings(['a', 'd']).subelements[-1]
+        other_d = create_siblings(['x', 'y', 'd']).subelements[-1]
+        self.assertNotEqual(d.render_html(gridster_settings=[]), other_d.render_html(gridster_settings=[]))
+        self.assertNotEqual(d.render_fingerprint(), other_d.render_fingerprint())
+
+    def test_changed_structure(self):
+        self.el.subelements[0].add_subelement(create_tree())
+        self.assertNotEqual(self.el.render_fingerprint(hidden_fields=['r__d'], gridster_settings=self.gridster),
+                            self.fingerprint)
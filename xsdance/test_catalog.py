@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+from unittest import TestCase
+
+from xsdance.test_element import create_tree
+from xsdance.utils import InlineIndex
+
+
+class TestFieldCatalog(TestCase):
+
+    def setUp(self):
+        self.el = create_tree()
+        self.catalog = self.el.get_field_catalog()
+
+    def test_fields(self):
+        self.assertEqual([f.name for f in self.catalog],
+                         ['r__a_#{a:0}__b_#{b:0}', 'r__a_#{a:0}__c', 'r__d'])
+        b = self.catalog.fields[0]
+        self.assertEqual(b.inlines, ('a', 'b'))
+        self.assertEqual(b.hidden_by, ('r__a_#{a:0}', 'r__a_#{a:0}__b_#{b:0}'))
+        self.assertTrue(b.required)
+        self.assertIsNone(b.kind)
+        self.assertEqual(self.catalog.names(['r__a_#{a:0}']), ['r__d'])
+        self.assertEqual(self.el.get_flat_fields(), self.catalog.names())
+
+    def test_expand(self):
+        index = InlineIndex([
+            'r__a_#{a:0}__b_#{b:0}',
+            'r__a_#{a:0}__b_#{b:1}',
+            'r__a_#{a:2}__c',
+        ])
+        b, c, d = self.catalog.fields
+        self.assertEqual(b.expand(index), ['r__a_#{a:0}__b_#{b:0}', 'r__a_#{a:0}__b_#{b:1}'])
+        self.assertEqual(c.expand(index), ['r__a_#{a:0}__c', 'r__a_#{a:2}__c'])
+        self.assertEqual(d.expand(index), ['r__d'])
+
+    def test_catalog_is_reset_with_structure(self):
+        self.el.add_subelement(create_tree())
+        self.assertIsNot(self.el.get_field_catalog(), self.catalog)
+        self.assertEqual(len(self.el.get_field_catalog()), 6)
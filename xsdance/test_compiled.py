@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import json
+import os
+import shutil
+import tempfile
+from multiprocessing.pool import ThreadPool
+from unittest import TestCase
+
+import lxml.html
+
+from xsdance import cli
+from xsdance.cli import compile_schemas
+from xsdance.compiled import CompiledSchema
+from xsdance.generator import Generator
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PRIMITIVE_TYPES_PATH = os.path.join(HERE, 'IRS', 'primitive_types.xsd')
+SCHEMA_DIR = os.path.join(
+    HERE, 'IRS', 'Federal', '2015v3.0', 'IndividualIncomeTax', 'Common', 'Dependencies')
+SCHEMA_PATH = os.path.join(SCHEMA_DIR, 'NameChangeStatement.xsd')
+# inline group with choices of addresses
+CHOICES_SCHEMA_PATH = os.path.join(
+    HERE, 'IRS', 'Federal', '2015v3.0', 'CorporateIncomeTax', 'Common', 'IRS5471',
+    'PersonMeetingFilingRequirementsStatement.xsd')
+
+
+class TestCompiledSchema(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_save_and_load(self):
+        compiled = CompiledSchema.compile(SCHEMA_PATH, primitive_types_path=PRIMITIVE_TYPES_PATH)
+        self.assertEqual(compiled.element.name, 'NameChangeStatement')
+        self.assertIsNone(compiled.element.parent)
+
+        path = os.path.join(self.directory, 'form.pickle')
+        compiled.save(path)
+        loaded = CompiledSchema.load(path)
+
+        self.assertEqual(loaded.digest(), compiled.digest())
+        self.assertEqual(loaded.element.render_html(gridster_settings=[]),
+                         compiled.element.render_html(gridster_settings=[]))
+        fields = loaded.element.get_flat_fields()
+        self.assertEqual(loaded.element.validate_inputs({fields[0]: 'x' * 1000}),
+                         compiled.element.validate_inputs({fields[0]: 'x' * 1000}))
+        self.assertTrue(loaded.search('name'))
+        self.assertEqual(loaded.search('name'), compiled.search('name'))
+
+    def test_compact_templates(self):
+        kwargs = {'primitive_types_path': PRIMITIVE_TYPES_PATH}
+        el = CompiledSchema.compile(SCHEMA_PATH, **kwargs).element
+        compact = CompiledSchema.compile(SCHEMA_PATH, compact=True, **kwargs).element
+        html = el.render_html(edit_mode=True, gridster_settings=[])
+        compact_html = compact.render_html(edit_mode=True, gridster_settings=[])
+        self.assertLess(len(compact_html), len(html) * 0.8)
+        self.assertNotIn('\n', compact_html)
+        self.assertEqual(lxml.html.fromstring(compact_html).text_content().split(),
+                         lxml.html.fromstring(html).text_content().split())
+
+    def test_compile_directory(self):
+        results = list(compile_schemas([SCHEMA_DIR], self.directory, jobs=1,
+                                       primitive_types_path=PRIMITIVE_TYPES_PATH))
+        self.assertTrue(results)
+        self.assertFalse([r for r in results if r['error']])
+        path = os.path.join(self.directory, 'NameChangeStatement.pickle')
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(CompiledSchema.load(path).element.name, 'NameChangeStatement')
+
+
+SCHEMA_T = '''<?xml version="1.0" encoding="UTF-8"?>
+<xsd:schema xmlns="http://www.example.com" xmlns:xsd="http://www.w3.org/2001/XMLSchema"
+    targetNamespace="http://www.example.com" elementFormDefault="qualified">
+{0}
+</xsd:schema>
+'''
+COMMON = '''
+  <xsd:simpleType name="AType"><xsd:restriction base="xsd:string"><xsd:maxLength value="10"/></xsd:restriction></xsd:simpleType>
+  <xsd:simpleType name="BType"><xsd:restriction base="xsd:string"><xsd:maxLength value="{0}"/></xsd:restriction></xsd:simpleType>
+'''  # NOQA
+FORM = '''
+  <xsd:include schemaLocation="common.xsd"/>
+  <xsd:element name="{0}">
+    <xsd:complexType><xsd:sequence><xsd:element name="Fld" type="{1}"/></xsd:sequence></xsd:complexType>
+  </xsd:element>
+'''
+
+
+def compile_form(text):
+    ''' Compiles form of `text`, the content of a schema. '''
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'Form.xsd')
+        with open(path, 'wb') as f:
+            f.write(SCHEMA_T.format(text).encode('utf-8'))
+        return CompiledSchema.compile(path, primitive_types_path=PRIMITIVE_TYPES_PATH)
+    finally:
+        shutil.rmtree(directory)
+
+
+class TestIncrementalCompile(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.sources = os.path.join(self.directory, 'sources')
+        self.output = os.path.join(self.directory, 'output')
+        os.makedirs(self.sources)
+        self.write('common.xsd', COMMON.format(20))
+        self.write('FormA.xsd', FORM.format('FormA', 'AType'))
+        self.write('FormB.xsd', FORM.format('FormB', 'BType'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content):
+        with open(os.path.join(self.sources, name), 'wb') as f:
+            f.write(SCHEMA_T.format(content).encode('utf-8'))
+
+    def compile(self, **kwargs):
+        results = compile_schemas([self.sources], self.output, jobs=1, incremental=True,
+                                  primitive_types_path=PRIMITIVE_TYPES_PATH, **kwargs)
+        return {os.path.basename(r['source']): r for r in results}
+
+    def test_only_forms_using_changed_types_are_compiled(self):
+        results = self.compile()
+        self.assertFalse(results['FormA.xsd']['reused'])
+        self.assertFalse(results['FormB.xsd']['reused'])
+
+        results = self.compile()
+        self.assertTrue(results['FormA.xsd']['reused'])
+        self.assertTrue(results['FormB.xsd']['reused'])
+
+        self.write('common.xsd', COMMON.format(30))
+        results = self.compile()
+        self.assertTrue(results['FormA.xsd']['reused'])
+        self.assertFalse(results['FormB.xsd']['reused'])
+
+        validator = CompiledSchema.load(results['FormB.xsd']['output']).element[0].validators[-1]
+        self.assertEqual(validator.rvalue, '30')
+
+        results = self.compile()
+        self.assertTrue(results['FormA.xsd']['reused'])
+        self.assertTrue(results['FormB.xsd']['reused'])
+
+    def test_only_affected_forms_are_sent_to_workers(self):
+        self.write('FormC.xsd', FORM.format('FormC', 'xsd:string').replace(
+            '<xsd:include schemaLocation="common.xsd"/>', ''))
+        self.compile()
+
+        sent = []
+
+        def compile_schema(task):
+            # files without elements are not recorded, so they are always sent
+            if not task[0].endswith('common.xsd'):
+                sent.append(os.path.basename(task[0]))
+            return original(task)
+        original, cli.compile_schema = cli.compile_schema, compile_schema
+        try:
+            results = self.compile()
+            self.assertEqual(sent, [])
+            self.assertTrue(all(results[name]['reused'] for name in ('FormA.xsd', 'FormB.xsd', 'FormC.xsd')))
+
+            self.write('common.xsd', COMMON.format(30))
+            results = self.compile()
+        finally:
+            cli.compile_schema = original
+        self.assertEqual(sorted(sent), ['FormA.xsd', 'FormB.xsd'])
+        self.assertTrue(results['FormA.xsd']['reused'])
+        self.assertFalse(results['FormB.xsd']['reused'])
+        self.assertTrue(results['FormC.xsd']['reused'])
+
+    def test_manifests_are_written_for_compiled_forms(self):
+        self.compile()
+        manifest_path = os.path.join(self.output, 'FormA.manifest.json')
+        self.assertFalse(os.path.exists(manifest_path))
+
+        results = self.compile(manifest=True)
+        self.assertFalse(results['FormA.xsd']['reused'])
+        with open(manifest_path, 'rb') as f:
+            self.assertIn('FormA__Fld', json.loads(f.read().decode('utf-8'))['fields'])
+
+        results = self.compile(manifest=True)
+        self.assertTrue(results['FormA.xsd']['reused'])
+
+
+class TestLazyCompile(TestCase):
+
+    def run_generator(self, **kwargs):
+        generator = Generator(primitive_types_path=PRIMITIVE_TYPES_PATH, **kwargs)
+        el = generator.run(CHOICES_SCHEMA_PATH).subelements[0]
+        el.parent = None
+        return generator, el
+
+    def get_pending(self, generator):
+        return [d.el.name for d in generator.deferred if d.el._pending is not None]
+
+    def test_content_is_parsed_on_demand(self):
+        generator, el = self.run_generator(lazy=True)
+        self.assertEqual(self.get_pending(generator), ['PersonMeetingFilingRqrStmt'])
+
+        group = el.subelements[0]
+        self.assertEqual(self.get_pending(generator), ['PersonMeetingFilingRqrGrp'])
+        # numbers of choices are reserved, before they are parsed
+        self.assertEqual([sub.name for sub in group.subelements if 'choice' in sub.name],
+                         [':choice_0:', ':choice_1:'])
+        self.assertEqual(self.get_pending(generator), ['USAddress', 'ForeignAddress'])
+
+    def test_same_as_eager(self):
+        _, eager = self.run_generator()
+        _, lazy = self.run_generator(lazy=True)
+        self.assertEqual(lazy.render_html(edit_mode=True, gridster_settings=[]),
+                         eager.render_html(edit_mode=True, gridster_settings=[]))
+
+        _, lazy = self.run_generator(lazy=True)
+        fields = eager.get_flat_fields()
+        self.assertEqual(lazy.get_flat_fields(), fields)
+        inputs = {fields[2]: 'x' * 100, fields[7]: 'y'}
+        self.assertEqual(lazy.validate_inputs(inputs), eager.validate_inputs(inputs))
+        self.assertEqual(lazy.structure_digest(), eager.structure_digest())
+
+    def test_fragment_parses_its_path(self):
+        _, eager = self.run_generator()
+        generator, lazy = self.run_generator(lazy=True)
+        path = 'PersonMeetingFilingRqrStmt__PersonMeetingFilingRqrGrp_#{PersonMeetingFilingRqrGrp:0}__:choice_1:'
+        self.assertEqual(lazy.render_fragment(path, gridster_settings=[]),
+                         eager.render_fragment(path, gridster_settings=[]))
+        self.assertEqual(self.get_pending(generator), ['USAddress', 'ForeignAddress'])
+
+    def test_concurrent_renders(self):
+        _, eager = self.run_generator()
+        _, lazy = self.run_generator(lazy=True)
+        html = eager.render_html(gridster_settings=[])
+        pool = ThreadPool(4)
+        try:
+            results = pool.map(lambda i: lazy.render_html(gridster_settings=[]), range(8))
+        finally:
+            pool.terminate()
+        self.assertEqual(results, [html] * 8)
+
+    def test_compiled_schema_is_expanded_on_save(self):
+        kwargs = {'primitive_types_path': PRIMITIVE_TYPES_PATH}
+        generator = Generator(lazy=True, **kwargs)
+        compiled = CompiledSchema.compile(CHOICES_SCHEMA_PATH, generator)
+        self.assertEqual(self.get_pending(generator), ['PersonMeetingFilingRqrStmt'])
+        self.assertIsNone(compiled.search_index)
+
+        path = os.path.join(tempfile.mkdtemp(), 'form.pickle')
+        try:
+            compiled.save(path)
+            self.assertEqual(self.get_pending(generator), [])
+            loaded = CompiledSchema.load(path)
+            self.assertIsNotNone(loaded.search_index)
+            self.assertEqual(loaded.digest(), CompiledSchema.compile(CHOICES_SCHEMA_PATH, **kwargs).digest())
+        finally:
+            shutil.rmtree(os.path.dirname(path))
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+from unittest import TestCase
+
+from lxml import html
+
+from xsdance.generator import Generator
+
+
+def create_tree():
+    ''' r
+          a (inline)
+            b (inline)
+            c
+          d
+    '''
+    generator = Generator()
+
+    def create(name, parent=None, max_occurs=1, html_input=''):
+        el = generator.create_element(name, parent_name=parent.name if parent else None)
+        el.max_occurs = max_occurs
+        el.html_input = html_input
+        if parent:
+            parent.add_subelement(el)
+        return el
+
+    html_input = generator.element_kwargs['html_input']
+    r = create('r')
+    a = create('a', r, max_occurs=5)
+    create('b', a, max_occurs=3, html_input=html_input)
+    create('c', a, html_input=html_input)
+    create('d', r, html_input=html_input)
+    return r
+
+
+class TestRenderHtml(TestCase):
+
+    def setUp(self):
+        self.el = create_tree()
+        self.el.set_initial_data({
+            'r__a_#{a:0}__b_#{b:0}': 'b 0 0',
+            'r__a_#{a:0}__b_#{b:1}': 'b 0 1',
+            'r__a_#{a:1}__c': 'c 1',
+        })
+
+    def render(self, **kwargs):
+        return self.el.render_html(hidden_fields=[], gridster_settings=[], **kwargs)
+
+    def test_rows_are_rendered_from_data(self):
+        html = self.render()
+        self.assertIn('value="b 0 0"', html)
+        self.assertIn('value="b 0 1"', html)
+        self.assertIn('value="c 1"', html)
+        self.assertIn('name="r__a_#{a:1}__b_#{b:1}"', html)
+
+    def test_nested_rows_are_counted_once(self):
+        self.el.initial_data['r__a_#{a:1}__b_#{b:0}'] = 'b 1 0'
+        html = self.render()
+        self.assertIn('name="r__a_#{a:0}__b_#{b:1}"', html)
+        self.assertNotIn('b_#{b:2}', html)
+
+    def test_checkboxes_of_present_rows(self):
+        self.el.subelements[0].subelements[1].html_input = '<input type="checkbox" name="{name}">'
+        self.assertEqual(sorted(self.el.get_all_checkboxes(self.el.initial_data)),
+                         ['r__a_#{a:0}__c', 'r__a_#{a:1}__c'])
+
+    def test_empty_items_are_rendered_once(self):
+        html = self.render()
+        self.assertEqual(html.count('<template'), 2)
+        self.assertEqual(html.count('id="empty-item-r__a"'), 1)
+        self.assertEqual(html.count('id="empty-item-r__a__b"'), 1)
+        self.assertNotIn('&lt;', html)
+
+    def test_empty_items_leave_all_indeces_to_client(self):
+        html = self.render()
+        template = html[html.index('id="empty-item-r__a__b"'):]
+        self.assertIn('name="r__a_#{a}__b_#{b}"', template)
+
+    def test_add_buttons_reference_empty_items(self):
+        html = self.render()
+        self.assertEqual(html.count('data-empty-item-template="empty-item-r__a__b"'), 3)
+        self.assertIn('data-element-prefixed-name="r__a_#{a:1}__b_#{b:0}"', html)
+
+
+class TestRenderEtree(TestCase):
+
+    def setUp(self):
+        self.el = create_tree()
+        self.el.set_initial_data({
+            'r__a_#{a:0}__b_#{b:0}': 'b 0 0',
+            'r__a_#{a:1}__c': 'c & 1',
+            'r__d': 'd',
+        })
+
+    @staticmethod
+    def serialize(nodes):
+        return ''.join(n if isinstance(n, type('')) else html.tostring(n, encoding='unicode')
+                       for n in nodes)
+
+    def assert_same_as_parsed_html(self, **kwargs):
+        parsed = html.fragments_fromstring(self.el.render_html(gridster_settings=[], **kwargs))
+        tree = self.el.render_etree(gridster_settings=[], **kwargs)
+        self.assertEqual(self.serialize(tree), self.serialize(parsed))
+
+    def test_same_as_parsed_html(self):
+        self.assert_same_as_parsed_html()
+        self.assert_same_as_parsed_html(edit_mode=True, hidden_fields=['r__d'])
+        self.assert_same_as_parsed_html(hidden_fields=['r__a_#{a:*}__c'])
+
+    def test_values(self):
+        root = self.el.render_etree(gridster_settings=[], create_parent='div')
+        self.assertEqual(root.tag, 'div')
+        self.assertEqual(root.xpath('.//input[@name="r__a_#{a:1}__c"]/@value'), ['c & 1'])
+        self.assertEqual(len(root.xpath('.//template')), 2)
+
+
+class TestRenderFragment(TestCase):
+
+    def setUp(self):
+        self.el = create_tree()
+        self.el.set_initial_data({
+            'r__a_#{a:0}__b_#{b:0}': 'b 0 0',
+            'r__a_#{a:0}__b_#{b:1}': 'b 0 1',
+            'r__a_#{a:1}__b_#{b:0}': 'b 1 0',
+            'r__a_#{a:1}__c': 'c 1',
+            'r__d': 'd',
+        })
+
+    def render(self, path, **kwargs):
+        return self.el.render_fragment(path, gridster_settings=[], **kwargs)
+
+    def test_subtree_is_rendered_as_in_form(self):
+        html = self.el.render_html(hidden_fields=[], gridster_settings=[])
+        fragment = self.render('r__a')
+        self.assertIn(fragment, html)
+        self.assertNotIn('<template', fragment)
+
+    def test_inline_row(self):
+        fragment = self.render('r__a_#{a:1}__b', index=0)
+        self.assertIn('name="r__a_#{a:1}__b_#{b:0}"', fragment)
+        self.assertIn('value="b 1 0"', fragment)
+        self.assertNotIn('b 0 0', fragment)
+        self.assertEqual(fragment, self.render('r__a_#{a:1}__b_#{b:0}'))
+
+        fragment = self.render('r__a_#{a:0}__b', index=1)
+        self.assertIn('value="b 0 1"', fragment)
+        self.assertNotIn('b 1 0', fragment)
+
+    def test_new_row_is_empty(self):
+        fragment = self.render('r__a', index=2)
+        self.assertIn('name="r__a_#{a:2}__c"', fragment)
+        self.assertNotIn('value="b', fragment)
+
+    def test_hidden_fields(self):
+        self.assertIsNone(self.render('r__a_#{a:1}__c', hidden_fields=['r__a_#{a:1}']))
+        self.assertIsNotNone(self.render('r__a_#{a:1}__c', hidden_fields=['r__a_#{a:0}']))
+        fragment = self.render('r__a', index=1, hidden_fields=['r__a_#{a:0}__c'])
+        self.assertIn('name="r__a_#{a:1}__c"', fragment)
+        fragment = self.render('r__a', index=1, hidden_fields=['r__a_#{a:*}__c'])
+        self.assertNotIn('__c"', fragment)
+
+    def test_tree_is_not_changed_while_rendered(self):
+        data = self.el.initial_data
+        c = self.el.subelements[0].subelements[1]
+        seen = []
+        render = c._render_html_input_with_value
+
+        def render_input(**kwargs):
+            # a concurrent render of the form would see the same data
+            seen.append(c.initial_data is data and self.el.initial_data is data)
+            return render(**kwargs)
+        c._render_html_input_with_value = render_input
+        fragment = self.render('r__a', index=1)
+        self.assertIn('value="c 1"', fragment)
+        self.assertEqual(seen, [True])
+
+    def test_unknown_path(self):
+        with self.assertRaises(self.el.PathNotFound):
+            self.render('r__x')
+        with self.assertRaises(self.el.PathNotFound):
+            self.render('r__d', index=1)
+
+
+class TestRenderWindow(TestCase):
+
+    def setUp(self):
+        self.el = create_tree()
+        self.el.set_initial_data({'r__a_#{{a:{0}}}__c'.format(i): 'c {0}'.format(i) for i in range(5)})
+
+    def test_first_rows_and_placeholder(self):
+        html = self.el.render_html(gridster_settings=[], window=2)
+        self.assertIn('value="c 1"', html)
+        self.assertNotIn('value="c 2"', html)
+        self.assertEqual(html.count('class="inline-window-placeholder"'), 1)
+        self.assertIn('data-offset="2"', html)
+        self.assertIn('data-count="3"', html)
+        self.assertIn('data-total-count="5"', html)
+        # add button counts all rows, not rendered ones only
+        self.assertIn('data-elements-count="5"', html)
+
+    def test_pages_make_all_rows(self):
+        rows = self.el.render_inline_rows('r__a', gridster_settings=[])
+        self.assertIn(rows, self.el.render_html(gridster_settings=[]))
+        self.assertNotIn('inline-window-placeholder', rows)
+
+        first = self.el.render_inline_rows('r__a', 0, 2, gridster_settings=[])
+        self.assertIn('data-offset="2"', first)
+        second = self.el.render_inline_rows('r__a', 2, gridster_settings=[])
+        self.assertIn('value="c 4"', second)
+        page = first[:first.index('<div class="inline-window-placeholder"')].rstrip()
+        self.assertTrue(rows.startswith(page))
+        self.assertTrue(rows.endswith(second))
+
+    def test_same_as_parsed_html(self):
+        parsed = html.fragments_fromstring(self.el.render_html(gridster_settings=[], window=2))
+        tree = self.el.render_etree(gridster_settings=[], window=2)
+        self.assertEqual(TestRenderEtree.serialize(tree), TestRenderEtree.serialize(parsed))
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+from unittest import TestCase
+
+from xsdance.hidden_fields import HiddenFields
+
+
+class TestHiddenFields(TestCase):
+
+    def setUp(self):
+        self.hidden = HiddenFields([
+            'a__b',
+            'a__c_#{c:0}__d',
+            'a__e_#{e:*}__f',
+            'a__:choice_0:_g',
+        ])
+
+    def test_exact_names(self):
+        self.assertIn('a__b', self.hidden)
+        self.assertIn('a__c_#{c:0}__d', self.hidden)
+        self.assertIn('a__:choice_0:_g', self.hidden)
+        self.assertNotIn('a', self.hidden)
+        self.assertNotIn('a__b__x', self.hidden)
+        self.assertNotIn('a__c_#{c:1}__d', self.hidden)
+        self.assertNotIn('a__:choice_0:', self.hidden)
+
+    def test_index_wildcards(self):
+        self.assertIn('a__e_#{e:0}__f', self.hidden)
+        self.assertIn('a__e_#{e:7}__f', self.hidden)
+        self.assertIn(r'a__c_#{c:\d+}__d', self.hidden)
+        self.assertTrue(self.hidden.contains('a__c_#{c:1}__d', any_index=True))
+
+    def test_covers_subtrees(self):
+        self.assertTrue(self.hidden.covers('a__b__x__y'))
+        self.assertTrue(self.hidden.covers('a__:choice_0:_g__h'))
+        self.assertFalse(self.hidden.covers('a__c_#{c:0}'))
+
+    def test_compile(self):
+        self.assertIs(HiddenFields.compile(self.hidden), self.hidden)
+        self.assertFalse(HiddenFields.compile(None))
+        self.assertEqual(list(self.hidden)[0], 'a__b')
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from xsdance.compiled import CompiledSchema
+from xsdance.instances import InstanceReader
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PRIMITIVE_TYPES_PATH = os.path.join(HERE, 'IRS', 'primitive_types.xsd')
+SCHEMA_PATH = os.path.join(
+    HERE, 'IRS', 'Federal', '2015v3.0', 'IndividualIncomeTax', 'Common',
+    'Dependencies', 'NameChangeStatement.xsd')
+
+CHOICE_SCHEMA = '''<?xml version="1.0" encoding="UTF-8"?>
+<xsd:schema xmlns="http://www.example.com" xmlns:xsd="http://www.w3.org/2001/XMLSchema"
+    targetNamespace="http://www.example.com" elementFormDefault="qualified">
+  <xsd:element name="Form">
+    <xsd:complexType><xsd:sequence>
+      <xsd:element name="Item" maxOccurs="10"><xsd:complexType><xsd:sequence>
+        <xsd:choice>
+          <xsd:element name="Amt" type="xsd:string"/>
+          <xsd:element name="Txt" type="xsd:string"/>
+        </xsd:choice>
+      </xsd:sequence></xsd:complexType></xsd:element>
+    </xsd:sequence></xsd:complexType>
+  </xsd:element>
+</xsd:schema>
+'''
+
+
+class TestInstanceReader(TestCase):
+
+    def test_read(self):
+        compiled = CompiledSchema.compile(SCHEMA_PATH, primitive_types_path=PRIMITIVE_TYPES_PATH)
+        data = InstanceReader(compiled.element).read('''
+            <NameChangeStatement xmlns="http://www.irs.gov/efile" documentId="A1">
+              <NameChangeStmt><FormerNm>Smith</FormerNm><SSN>123456789</SSN></NameChangeStmt>
+              <NameChangeStmt><FormerNm>Jones</FormerNm><Unknown><Desc>x</Desc></Unknown></NameChangeStmt>
+            </NameChangeStatement>''')
+        self.assertEqual(data, {
+            'NameChangeStatement__NameChangeStmt_#{NameChangeStmt:0}__FormerNm': 'Smith',
+            'NameChangeStatement__NameChangeStmt_#{NameChangeStmt:0}__SSN': '123456789',
+            'NameChangeStatement__NameChangeStmt_#{NameChangeStmt:1}__FormerNm': 'Jones',
+        })
+        html = compiled.element.set_initial_data(data).render_html(gridster_settings=[])
+        self.assertIn('value="Jones"', html)
+
+    def test_choices_and_files(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'form.xsd')
+            with open(path, 'wb') as f:
+                f.write(CHOICE_SCHEMA.encode('utf-8'))
+            compiled = CompiledSchema.compile(path, primitive_types_path=PRIMITIVE_TYPES_PATH)
+            document = os.path.join(directory, 'form.xml')
+            with open(document, 'wb') as f:
+                f.write(b'<Form xmlns="http://www.example.com">'
+                        b'<Item><Amt>1</Amt></Item><Item><Txt>a</Txt></Item></Form>')
+            data = InstanceReader(compiled.element).read(document)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(sorted(data.values()), ['1', 'a'])
+        fields = set(compiled.element.get_flat_fields())
+        for name in data:
+            self.assertIn(name.replace('Item:1', 'Item:0'), fields)
+
+    def test_unknown_root(self):
+        compiled = CompiledSchema.compile(SCHEMA_PATH, primitive_types_path=PRIMITIVE_TYPES_PATH)
+        with self.assertRaises(compiled.element.PathNotFound):
+            InstanceReader(compiled.element).read(b'<Other/>')
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import os
+from unittest import TestCase
+
+from xsdance.generator import Generator
+from xsdance.instrumentation import Instrument, MemorySink
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PRIMITIVE_TYPES_PATH = os.path.join(HERE, 'IRS', 'primitive_types.xsd')
+SCHEMA_PATH = os.path.join(
+    HERE, 'IRS', 'Federal', '2015v3.0', 'IndividualIncomeTax', 'Common',
+    'Dependencies', 'NameChangeStatement.xsd')
+
+
+class TestInstrument(TestCase):
+
+    def setUp(self):
+        self.sink = MemorySink()
+        self.instrument = Instrument(sink=self.sink)
+        schema = Generator(primitive_types_path=PRIMITIVE_TYPES_PATH,
+                           instrument=self.instrument).run(SCHEMA_PATH)
+        self.el = schema[0]
+        self.el.parent = None
+
+    def test_compile_report(self):
+        self.assertEqual(len(self.sink.reports), 1)
+        report = self.sink.reports[0]
+        self.assertEqual(report['phases']['compile']['calls'], 1)
+        self.assertIn('type_resolution', report['phases'])
+        self.assertGreater(report['counters']['type_lookups'], 0)
+        self.assertIn('schema__NameChangeStatement', report['elements']['parse_element'])
+
+    def test_render_report(self):
+        self.el.render_html(gridster_settings=[], instrument=self.instrument)
+        report = self.sink.reports[-1]
+        self.assertEqual(report['phases']['render']['calls'], 1)
+        self.assertIn('NameChangeStatement', report['elements']['render_element'])
+        self.assertNotIn('compile', report['phases'])
+
+    def test_validate_report(self):
+        fields = self.el.get_flat_fields()
+        self.el.validate_inputs({fields[0]: 'value'}, instrument=self.instrument)
+        report = self.sink.reports[-1]
+        self.assertEqual(report['phases']['validate']['calls'], 1)
+        self.assertTrue(any(name.startswith('validator_calls.') for name in report['counters']))
+
+    def test_nested_phases(self):
+        instrument = Instrument(autoflush=False)
+        with instrument.phase('outer'):
+            with instrument.phase('inner'):
+                pass
+        report = instrument.flush()
+        self.assertEqual(report['phases']['outer']['calls'], 1)
+        self.assertLessEqual(report['phases']['inner']['time'], report['phases']['outer']['time'])
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import json
+import re
+from collections import OrderedDict
+from unittest import TestCase
+
+from xsdance.test_compiled import compile_form
+
+
+FORM = '''
+  <xsd:simpleType name="CodeType">
+    <xsd:restriction base="xsd:string"><xsd:pattern value="[A-Z]*"/><xsd:maxLength value="5"/></xsd:restriction>
+  </xsd:simpleType>
+  <xsd:simpleType name="ShortCodeType">
+    <xsd:restriction base="CodeType"><xsd:pattern value="[A-Z]{2,3}"/><xsd:maxLength value="3"/></xsd:restriction>
+  </xsd:simpleType>
+  <xsd:element name="Form">
+    <xsd:complexType><xsd:sequence>
+      <xsd:element name="Code" type="ShortCodeType"/>
+      <xsd:element name="Item" minOccurs="0" maxOccurs="4">
+        <xsd:complexType><xsd:sequence>
+          <xsd:element name="Amt" type="xsd:integer"/>
+        </xsd:sequence></xsd:complexType>
+      </xsd:element>
+      <xsd:choice minOccurs="0">
+        <xsd:element name="Name" type="xsd:string"/>
+        <xsd:element name="Kind">
+          <xsd:simpleType><xsd:restriction base="xsd:string">
+            <xsd:enumeration value="A"/><xsd:enumeration value="B"/>
+          </xsd:restriction></xsd:simpleType>
+        </xsd:element>
+      </xsd:choice>
+    </xsd:sequence></xsd:complexType>
+  </xsd:element>
+'''  # NOQA
+
+
+class TestManifest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.compiled = compile_form(FORM)
+        cls.manifest = json.loads(cls.compiled.manifest(), object_pairs_hook=OrderedDict)
+
+    def test_fields(self):
+        fields = self.manifest['fields']
+        self.assertEqual(list(fields), [
+            'Form__Code', 'Form__Item_#{Item}__Amt', 'Form__:choice_0:_Name', 'Form__:choice_0:_Kind'])
+        code = fields['Form__Code']
+        self.assertTrue(code['required'])
+        self.assertEqual(code['facets']['maxLength'], 3)
+        self.assertEqual(code['facets']['patterns'], ['^(?:[A-Z]*)', '^(?:[A-Z]{2,3})'])
+        self.assertEqual(fields['Form__Item_#{Item}__Amt']['inlines'], ['Item'])
+        # as on the server, fields of choices are checked by choice bounds only
+        self.assertNotIn('required', fields['Form__:choice_0:_Name'])
+        self.assertEqual(fields['Form__:choice_0:_Kind']['facets']['enumeration'], ['A', 'B'])
+
+    def test_patterns_match_as_validators(self):
+        el = self.compiled.element
+        patterns = self.manifest['fields']['Form__Code']['facets']['patterns']
+        for value in ['AB', 'ABC', 'A', 'ab', 'AB1']:
+            expected = not el.validate_inputs({'Form__Code': value})[1].get('Form__Code')
+            self.assertEqual(all(re.match(p, value) for p in patterns), expected, value)
+        # only the start of values is matched on the server
+        self.assertFalse(el.validate_inputs({'Form__Code': 'AB1'})[1].get('Form__Code'))
+
+    def test_inlines_and_choices(self):
+        self.assertEqual(self.manifest['inlines'], {'Form__Item_#{Item}': {'min': 0, 'max': 4}})
+        self.assertEqual(self.manifest['choices'], {'Form__:choice_0:': {
+            'min': 0, 'max': 1, 'fields': ['Form__:choice_0:_Name', 'Form__:choice_0:_Kind']}})
+
+    def test_compact(self):
+        manifest = self.compiled.manifest()
+        self.assertNotIn(', ', manifest)
+        self.assertNotIn(': ', manifest)
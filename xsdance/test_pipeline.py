@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import io
+import json
+from unittest import TestCase
+
+from xsdance.pipeline import Pipeline
+from xsdance.test_batch import FORM
+from xsdance.test_compiled import compile_form
+
+
+def submission(code, amt=''):
+    return json.dumps({
+        'Form__Item_#{Item:0}__Code': code,
+        'Form__Item_#{Item:0}__Amt': amt,
+        'Form__Item_#{Item:0}__:choice_0:_Kind': 'A',
+    }).encode('utf-8')
+
+
+LINES = [
+    submission('AB', '5'),
+    b'',
+    submission('ab'),
+    b'{"Form__Item_#{Item:0}__Code": ',
+    submission('XYZ'),
+]
+
+
+class TestPipeline(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.el = compile_form(FORM).element
+
+    def test_run(self):
+        results = list(Pipeline(self.el).run(LINES))
+        self.assertEqual([r.number for r in results], [1, 3, 4, 5])
+        self.assertEqual([r.is_valid for r in results], [True, False, False, True])
+        self.assertEqual(results[0].xml, b'<Form><Item><Code>AB</Code><Amt>5</Amt><Kind>A</Kind></Item></Form>')
+        self.assertIn('Form__Item_#{Item:0}__Code', results[1].errors)
+        self.assertTrue(results[2].errors[''][0].startswith('Invalid JSON'))
+
+    def test_write(self):
+        output, errors = io.BytesIO(), io.BytesIO()
+        self.assertEqual(Pipeline(self.el, jobs=2).write(LINES, output, errors), (2, 2))
+        self.assertEqual(output.getvalue().count(b'<Form>'), 2)
+        self.assertEqual([json.loads(line.decode('utf-8'))['line'] for line in errors.getvalue().splitlines()],
+                         [3, 4])
+
+    def test_lines_are_read_as_results_are_taken(self):
+        read = []
+
+        def lines():
+            for i in range(100):
+                read.append(i)
+                yield submission('AB')
+
+        results = Pipeline(self.el, jobs=2, buffer_size=3).run(lines())
+        next(results)
+        self.assertEqual(len(read), 3)
+        self.assertEqual(len(list(results)), 99)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import os
+import shutil
+import tempfile
+import threading
+from multiprocessing.pool import ThreadPool
+from unittest import TestCase
+
+from xsdance.element import Element
+from xsdance.generator import Generator
+from xsdance.registry import SchemaRegistry
+from xsdance.test_compiled import CHOICES_SCHEMA_PATH, FORM, PRIMITIVE_TYPES_PATH, SCHEMA_T
+
+
+class PoolExecutor(object):
+    ''' Executor of a thread pool, which counts submitted calls. '''
+
+    def __init__(self):
+        self.pool = ThreadPool(2)
+        self.submitted = 0
+
+    def submit(self, fn, *args):
+        self.submitted += 1
+        return self.pool.apply_async(fn, args)
+
+
+class TestSchemaRegistry(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'Form.xsd')
+        self.write('Form', 'xsd:string')
+        self.registry = SchemaRegistry(primitive_types_path=PRIMITIVE_TYPES_PATH)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, type_name):
+        with open(self.path, 'wb') as f:
+            f.write(SCHEMA_T.format(FORM.format(name, type_name).replace(
+                '<xsd:include schemaLocation="common.xsd"/>', '')).encode('utf-8'))
+
+    def test_concurrent_gets_compile_once(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.registry.get(self.path)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 8)
+        self.assertEqual(len(set(id(compiled) for compiled in results)), 1)
+        self.assertEqual(self.registry.compiles, 1)
+        self.assertFalse(self.registry.flights)
+
+    def test_concurrent_submits_compile_once(self):
+        executor = PoolExecutor()
+        registry = SchemaRegistry(executor, primitive_types_path=PRIMITIVE_TYPES_PATH)
+        try:
+            futures = [registry.submit(self.path) for _ in range(8)]
+            results = [future.result(10) for future in futures]
+        finally:
+            executor.pool.terminate()
+        self.assertEqual(len(set(id(compiled) for compiled in results)), 1)
+        self.assertEqual(executor.submitted, 1)
+        self.assertEqual(registry.compiles, 1)
+        self.assertTrue(registry.submit(self.path).done())
+
+    def test_changed_form_is_compiled_again(self):
+        compiled = self.registry.get(self.path)
+        self.assertIs(self.registry.get(self.path), compiled)
+        self.write('Other', 'xsd:string')
+        os.utime(self.path, (0, 0))
+        self.assertEqual(self.registry.get(self.path).element.name, 'Other')
+        self.assertEqual(self.registry.compiles, 2)
+
+    def test_errors_are_raised_to_every_caller(self):
+        self.write('Form', 'MissingType')
+        self.assertRaises(Generator.TypeNotFound, self.registry.get, self.path)
+        self.assertFalse(self.registry.flights)
+        self.assertFalse(self.registry.schemas)
+
+    def test_generator_kwargs_are_not_serialized(self):
+        registry = SchemaRegistry(primitive_types_path=PRIMITIVE_TYPES_PATH, element_class=Element)
+        self.assertEqual(registry.get(self.path).element.name, 'Form')
+
+    def test_lazy_form_is_served_unparsed(self):
+        def get_pending(elements):
+            # walks parsed elements only, so nothing is parsed on the way
+            pending = []
+            stack = list(elements)
+            while stack:
+                el = stack.pop()
+                if el._pending is not None:
+                    pending.append(el.name)
+                else:
+                    stack.extend(el._subelements)
+            return sorted(pending)
+
+        registry = SchemaRegistry(primitive_types_path=PRIMITIVE_TYPES_PATH, lazy=True)
+        compiled = registry.get(CHOICES_SCHEMA_PATH)
+        self.assertEqual(get_pending(compiled.elements), ['PersonMeetingFilingRqrStmt'])
+
+        path = 'PersonMeetingFilingRqrStmt__PersonMeetingFilingRqrGrp_#{PersonMeetingFilingRqrGrp:0}__:choice_1:'
+        compiled.element.render_fragment(path, gridster_settings=[])
+        self.assertEqual(get_pending(compiled.elements), ['ForeignAddress', 'USAddress'])
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+from unittest import TestCase
+
+from xsdance.search import SearchIndex, tokenize
+from xsdance.test_element import create_tree
+
+
+class TestSearchIndex(TestCase):
+
+    def setUp(self):
+        self.el = create_tree()
+        a, d = self.el.subelements
+        b, c = a.subelements
+        a.label_text = 'Dependent care expenses'
+        b.label_text = 'Provider name'
+        c.kwargs['documentation'] = {'Description': 'Care provider SSN', 'LineNumber': '21'}
+        d.name = 'SpouseHOHNm'
+        self.index = SearchIndex.build([self.el])
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('QualifyingHOHNm'), ['qualifying', 'hoh', 'nm'])
+        self.assertEqual(tokenize('IRS1040, line 21a'), ['irs', '1040', 'line', '21', 'a'])
+
+    def test_search(self):
+        self.assertEqual(self.index.search('care'), ['r__a_#{a:0}', 'r__a_#{a:0}__c'])
+        self.assertEqual(self.index.search('prov'), ['r__a_#{a:0}__b_#{b:0}', 'r__a_#{a:0}__c'])
+        self.assertEqual(self.index.search('Line 21'), ['r__a_#{a:0}__c'])
+        self.assertEqual(self.index.search('spouse hoh'), ['r__SpouseHOHNm'])
+        self.assertEqual(self.index.search('care missing'), [])
+        self.assertEqual(self.index.search(''), [])
+
+    def test_whole_words_first(self):
+        self.el.subelements[0].label_text = 'Dependent care expenses, names of providers'
+        index = SearchIndex.build([self.el])
+        self.assertEqual(index.search('name'), ['r__a_#{a:0}__b_#{b:0}', 'r__a_#{a:0}'])
+        self.assertEqual(index.search('name', limit=1), ['r__a_#{a:0}__b_#{b:0}'])
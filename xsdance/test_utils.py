@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
 
+from collections import OrderedDict
 from unittest import TestCase
-from xsdance.utils import parse_inputs
+from xsdance.utils import parse_inputs, GridsterSettings, InlineTemplate, InlineIndex, Validator, \
+    fold_validators, compact_html, serialize_xml
 
 
 class TestParseInputs(TestCase):
@@ -95,3 +97,113 @@ class TestParseInputs(TestCase):
     def test_run(self):
         for case in self.test_cases:
             self.check_one_case(case['INPUTS'], case['SHOULD_BE'])
+
+
+class TestGridsterSettings(TestCase):
+
+    def test_first_entry_wins(self):
+        settings = GridsterSettings([
+            {'prefixed_name': 'a__b', 'data-gs-x': 1},
+            {'prefixed_name': 'a__c', 'data-gs-x': 2},
+            {'prefixed_name': 'a__b', 'data-gs-x': 3},
+        ])
+        self.assertEqual(settings.get('a__b')['data-gs-x'], 1)
+        self.assertEqual(settings.get('a__c')['data-gs-x'], 2)
+        self.assertIsNone(settings.get('a__d'))
+
+    def test_index_is_idempotent(self):
+        settings = GridsterSettings.index([])
+        self.assertIs(GridsterSettings.index(settings), settings)
+        self.assertRaises(AssertionError, GridsterSettings.index, None)
+
+
+class TestInlineTemplate(TestCase):
+
+    def test_fill(self):
+        template = InlineTemplate('<b name="a_#{a:0}__c">a_#{a:0}</b>', 'a_#{a:0}')
+        self.assertEqual(template.fill('a_#{a:3}'), '<b name="a_#{a:3}__c">a_#{a:3}</b>')
+        self.assertEqual(template.fill('a_#{a}'), '<b name="a_#{a}__c">a_#{a}</b>')
+
+    def test_fill_without_slot(self):
+        template = InlineTemplate('<b></b>', 'a_#{a:0}')
+        self.assertEqual(template.fill('a_#{a:3}'), '<b></b>')
+
+
+class TestInlineIndex(TestCase):
+
+    def setUp(self):
+        self.index = InlineIndex([
+            'r__a_#{a:0}__b_#{b:0}',
+            'r__a_#{a:0}__b_#{b:1}',
+            'r__a_#{a:1}__b_#{b:0}',
+            'r__a_#{a:1}__c',
+            'r__a_#{a:10}__c',
+            'r__d',
+        ])
+
+    def test_rows(self):
+        self.assertEqual(self.index.indeces('r__a'), [0, 1, 10])
+        self.assertEqual(self.index.indeces('r__a_#{a:0}__b'), [0, 1])
+        self.assertEqual(self.index.indeces('r__a_#{a:1}__b'), [0])
+        self.assertEqual(self.index.indeces('r__a_#{a:10}__b'), [])
+
+    def test_counts(self):
+        # rows of the same index in different parent rows are counted once
+        self.assertEqual(self.index.count('r__a__b'), 2)
+        self.assertEqual(self.index.count('r__d'), 0)
+        self.assertEqual(self.index.subtree_counts('r__a'), [('r__a', 3), ('r__a__b', 2)])
+
+
+class TestFoldValidators(TestCase):
+
+    def fold(self, *facets):
+        return [(v.rname, v.rvalue) for v in fold_validators([Validator(*f) for f in facets])]
+
+    def test_tightest_bounds(self):
+        self.assertEqual(self.fold(('whiteSpace', 'collapse'), ('maxLength', '35'), ('maxLength', '20'),
+                                   ('minInclusive', '0'), ('minInclusive', '5')),
+                         [('maxLength', '20'), ('minInclusive', '5')])
+        self.assertEqual(self.fold(('maxInclusive', '10'), ('maxExclusive', '100')), [('maxInclusive', '10')])
+        self.assertEqual(self.fold(('length', '9'), ('maxLength', '17')), [('length', '9')])
+
+    def test_patterns(self):
+        validators = fold_validators([Validator('pattern', '[0-9]*'), Validator('pattern', '[0-9]{9}')])
+        self.assertEqual(len(validators), 1)
+        self.assertIsNone(validators[0]('123456789'))
+        self.assertEqual(validators[0]('12345678x'), 'Value should contain 9 digits of SSN or EIN')
+        self.assertEqual(self.fold(('pattern', '[0-9]*'), ('pattern', '[0-9]*')), [('pattern', '[0-9]*')])
+
+    def test_enumerations(self):
+        self.assertEqual(self.fold(('enumeration', ['A', 'B', 'C']), ('enumeration', ['C', 'A'])),
+                         [('enumeration', ['C', 'A'])])
+        # enumerations, which are not of one derivation chain, are kept
+        self.assertEqual(len(self.fold(('enumeration', ['X']), ('enumeration', ['962']))), 2)
+
+
+class TestCompactHtml(TestCase):
+
+    def test_whitespace(self):
+        self.assertEqual(compact_html('''
+            <div class="a"
+                data-name="{name}">
+              <label>{label}</label>
+              {label}
+              {content}
+            </div>
+        '''), '<div class="a" data-name="{name}"><label>{label}</label> {label} {content} </div>')
+
+
+class TestSerializeXml(TestCase):
+
+    def test_nested_dicts(self):
+        self.assertEqual(serialize_xml(OrderedDict([
+            ('Name', 'Ann'),
+            ('Address', OrderedDict([('City', 'Kyiv'), ('ZIP', '01001')])),
+        ]), root='Form'), b'<Form><Name>Ann</Name><Address><City>Kyiv</City><ZIP>01001</ZIP></Address></Form>')
+
+    def test_list_values_are_repeated_elements(self):
+        self.assertEqual(serialize_xml(OrderedDict([
+            ('Code', ['A', 'B']),
+            ('Item', [OrderedDict([('Amt', '1')]), OrderedDict([('Amt', '2'), ('Kind', ['X'])])]),
+        ]), root='Form'), b'<Form><Code>A</Code><Code>B</Code>'
+                           b'<Item><Amt>1</Amt></Item><Item><Amt>2</Amt><Kind>X</Kind></Item></Form>')
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+import os
+import pickle
+from unittest import TestCase
+
+from lxml import etree
+
+from xsdance.compiled import CompiledSchema
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PRIMITIVE_TYPES_PATH = os.path.join(HERE, 'IRS', 'primitive_types.xsd')
+SCHEMA_PATH = os.path.join(
+    HERE, 'IRS', 'Federal', '2015v3.0', 'IndividualIncomeTax', 'Common',
+    'Dependencies', 'NameChangeStatement.xsd')
+
+DOCUMENT_T = '''<NameChangeStatement xmlns="http://www.irs.gov/efile" documentId="A1">
+  <NameChangeStmt><FormerNm>Smith</FormerNm><SSN>123456789</SSN></NameChangeStmt>
+  <NameChangeStmt><FormerNm>{0}</FormerNm>{1}</NameChangeStmt>
+</NameChangeStatement>'''
+
+
+class TestInstanceValidator(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.compiled = CompiledSchema.compile(SCHEMA_PATH, primitive_types_path=PRIMITIVE_TYPES_PATH)
+
+    def setUp(self):
+        self.validator = self.compiled.instance_validator()
+
+    def test_valid(self):
+        document = DOCUMENT_T.format('Jones', '<Desc>Marriage</Desc>')
+        self.assertTrue(self.validator.is_valid(document))
+        self.assertEqual(self.validator.validate(document), {})
+        self.assertEqual(self.validator.validate(etree.fromstring(document)), {})
+
+    def test_errors_are_keyed_by_prefixed_names(self):
+        errors = self.validator.validate(DOCUMENT_T.format('Jones!', '<Bogus/>'))
+        self.assertEqual(sorted(errors), [
+            'NameChangeStatement__NameChangeStmt_#{NameChangeStmt:1}',
+            'NameChangeStatement__NameChangeStmt_#{NameChangeStmt:1}__FormerNm',
+        ])
+        self.assertIn('pattern', errors['NameChangeStatement__NameChangeStmt_#{NameChangeStmt:1}__FormerNm'][0])
+
+    def test_validator_is_kept_with_compiled_form(self):
+        self.assertIs(self.compiled.instance_validator(), self.validator)
+        loaded = pickle.loads(pickle.dumps(self.compiled, pickle.HIGHEST_PROTOCOL))
+        self.assertIsNot(loaded.instance_validator(), self.validator)
+        self.assertEqual(list(loaded.instance_validator().validate_many([DOCUMENT_T.format('A', '')])), [{}])
@@ -2,7 +2,10 @@
 from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
 from pprint import pprint  # NOQA
 
-from collections import defaultdict
+from bisect import bisect_left
+from cgi import escape
+from collections import defaultdict, OrderedDict
+from decimal import Decimal, InvalidOperation
 import re
 import json
 
@@ -15,17 +18,20 @@ tree = lambda: defaultdict(tree)
 tree_to_dict = lambda t: json.loads(json.dumps(t))
 
 re_inline_parent_name = re.compile(r'([a-zA-Z0-9]+)_#\{\1:([0-9]+)\}')
+re_inline_suffix = re.compile(r'_#\{[^}]*\}')
+re_inline_index = re.compile(r'_#\{[a-zA-Z0-9]+:([0-9]+)\}')
 
 
 def _serialize_xml(d, root=None):
     root = root if isinstance(root, etree._Element) else etree.Element(root)
     for name, value in d.items():
-        elem = etree.Element(name)
-        if isinstance(value, dict):
-            serialize_xml(value, elem)
-        else:
-            elem.text = value
-        root.append(elem)
+        for item in (value if isinstance(value, list) else [value]):
+            elem = etree.Element(name)
+            if isinstance(item, dict):
+                _serialize_xml(item, elem)
+            else:
+                elem.text = item
+            root.append(elem)
     return root
 
 
@@ -37,6 +43,54 @@ def serialize_json(d):
     return json.dumps(d)
 
 
+re_space_between_tags = re.compile(r'>\s+<')
+re_spaces = re.compile(r'\s+')
+
+
+def compact_html(template):
+    ''' Template without indentation and line breaks. Whitespace between
+    tags is dropped, other runs of whitespace are replaced by one space,
+    as browsers show them anyway.
+    '''
+    return re_spaces.sub(' ', re_space_between_tags.sub('><', template.strip()))
+
+
+re_placeholder = re.compile(r'\[\[.*?\]\]')
+
+
+def format_template(template, **values):
+    ''' Default `fill` of element methods, which format html templates.
+    Renderers, which build other output, e.g. trees, pass their own.
+    '''
+    return template.format(**values)
+
+
+def placeholder_replacements(data, escape_select=True):
+    ''' Maps `[[name]]`, `[[name|checkbox]]` and `[[name|select]]`
+    placeholders to values from `data`. Select values are escaped for html
+    attributes, unless `escape_select` is False.
+    '''
+    replacements = {}
+    for k, v in data.items():
+        not_list_v = json.dumps(v) if isinstance(v, list) else v
+        select_v = json.dumps(v if isinstance(v, list) else [v])
+        replacements['[[{0}|checkbox]]'.format(k)] = 'checked' if not_list_v else ''
+        replacements['[[{0}|select]]'.format(k)] = escape(select_v, quote=True) if escape_select else select_v
+        replacements['[[{0}]]'.format(k)] = not_list_v
+    return replacements
+
+
+def substitute_placeholders(content, data):
+    ''' Puts values from `data` in place of `[[name]]`, `[[name|checkbox]]`
+    and `[[name|select]]` placeholders of rendered `content`, in one pass.
+    Placeholders of names, which are not in `data`, are removed.
+    '''
+    if '[[' not in content:
+        return content
+    replacements = placeholder_replacements(data)
+    return re_placeholder.sub(lambda m: replacements.get(m.group(0)) or '', content)
+
+
 funcs = {
     'minLength': (lambda r, v: len(unicode(v)) >= int(r),
                   'Length should be greater than {rvalue}'),
@@ -77,6 +131,10 @@ funcs = {
 }
 
 
+def _no_test(r, v):
+    return None
+
+
 regex_messages = {
     '[\-+]?[0-9]+':
         'Value should be integer',
@@ -165,12 +223,24 @@ class Validator:
     }
 
     def __init__(self, rname, rvalue):
+        self.rname = rname
         self.rvalue = rvalue
-        self.test_func, self.error_message = funcs.get(rname, (lambda r, x: None, ''))
+        self.test_func, self.error_message = funcs.get(rname, (_no_test, ''))
 
         if rname == 'pattern':
             self.error_message = regex_messages.get(rvalue, 'Invalid value')
 
+    def __getstate__(self):
+        # test functions are lambdas, which can't be pickled,
+        # so they are looked up by restriction name on load
+        state = self.__dict__.copy()
+        del state['test_func']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.test_func = funcs.get(self.rname, (_no_test, ''))[0]
+
     def __call__(self, value):
         result = False
         try:
@@ -180,3 +250,190 @@ class Validator:
 
         if not result:
             return self.error_message.format(rvalue=unicode(self.rvalue), value=unicode(value))
+
+
+# facets, which are checked by other means or not at all
+NOOP_FACETS = ('whiteSpace', 'Assertions', 'explicitTimezone')
+UPPER_BOUNDS = ('maxLength', 'maxInclusive', 'maxExclusive', 'totalDigits', 'fractionDigits')
+LOWER_BOUNDS = ('minLength', 'minInclusive', 'minExclusive')
+
+
+def _tightest(validators, pick):
+    try:
+        return pick(validators, key=lambda v: Decimal(v.rvalue))
+    except (InvalidOperation, ValueError, TypeError):
+        return validators[-1]
+
+
+def get_patterns(validator):
+    ''' Patterns, which `validator` of `pattern` facet checks. '''
+    return getattr(validator, 'patterns', None) or [validator.rvalue]
+
+
+def _combine_patterns(validators):
+    patterns = []
+    for v in validators:
+        for pattern in get_patterns(v):
+            if pattern not in patterns:
+                patterns.append(pattern)
+    if len(patterns) == 1:
+        return validators[-1]
+    # patterns of derived types restrict patterns of base types, so all
+    # of them should match, as lookaheads they are checked in one match
+    combined = Validator('pattern', ''.join('(?=(?:{0}))'.format(p) for p in patterns))
+    combined.patterns = patterns
+    messages = [regex_messages[p] for p in reversed(patterns) if p in regex_messages]
+    combined.error_message = messages[0] if messages else combined.error_message
+    return combined
+
+
+def _intersect_enumerations(validators):
+    items = validators[0].rvalue
+    for v in validators[1:]:
+        items = [item for item in v.rvalue if item in items]
+    if not items:
+        # not a derivation chain, e.g. enumerations of attributes, which
+        # are applied to the element too, so they are left as they are
+        return validators
+    if items == validators[-1].rvalue:
+        return [validators[-1]]
+    return [Validator('enumeration', items)]
+
+
+def _drop_redundant_bounds(facets):
+    def value(rname):
+        return Decimal(facets[rname][0].rvalue)
+
+    try:
+        if 'maxInclusive' in facets and 'maxExclusive' in facets:
+            del facets['maxExclusive' if value('maxInclusive') < value('maxExclusive') else 'maxInclusive']
+        if 'minInclusive' in facets and 'minExclusive' in facets:
+            del facets['minExclusive' if value('minInclusive') > value('minExclusive') else 'minInclusive']
+        if 'length' in facets:
+            if 'minLength' in facets and value('minLength') <= value('length'):
+                del facets['minLength']
+            if 'maxLength' in facets and value('maxLength') >= value('length'):
+                del facets['maxLength']
+    except (InvalidOperation, ValueError, TypeError):
+        pass
+
+
+def fold_validators(validators):
+    ''' Merges validators of facets from all levels of a restriction chain
+    into one effective set: the tightest bounds, all patterns in one, the
+    intersection of enumerations. No-op facets are dropped.
+    '''
+    groups = OrderedDict()
+    for v in validators:
+        if v.rname in NOOP_FACETS or v.test_func is _no_test:
+            continue
+        groups.setdefault(v.rname, []).append(v)
+
+    facets = OrderedDict()
+    for rname, group in groups.items():
+        if rname in UPPER_BOUNDS:
+            facets[rname] = [_tightest(group, min)]
+        elif rname in LOWER_BOUNDS:
+            facets[rname] = [_tightest(group, max)]
+        elif rname == 'pattern':
+            facets[rname] = [_combine_patterns(group)]
+        elif rname == 'enumeration':
+            facets[rname] = _intersect_enumerations(group)
+        else:
+            # `length` of the most derived type
+            facets[rname] = [group[-1]]
+    _drop_redundant_bounds(facets)
+    return [v for group in facets.values() for v in group]
+
+
+class GridsterSettings(object):
+    ''' `gridster_settings` list indexed by `prefixed_name`.
+
+    The first entry wins if a name is listed several times, as it does
+    with a linear scan of the list.
+    '''
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.by_name = {}
+        for s in settings:
+            self.by_name.setdefault(s.get('prefixed_name', None), s)
+
+    def __iter__(self):
+        return iter(self.settings)
+
+    def __len__(self):
+        return len(self.settings)
+
+    def get(self, prefixed_name, default=None):
+        return self.by_name.get(prefixed_name, default)
+
+    @classmethod
+    def index(cls, settings):
+        if isinstance(settings, cls):
+            return settings
+        assert isinstance(settings, list), 'gridster_settings should be instance of list'
+        return cls(settings)
+
+
+class InlineTemplate(object):
+    ''' Rendered content split on a slot string, e.g. the inline suffix
+    with index 0. `fill` puts a value in every place of the slot, so it is
+    linear in size of the result, unlike `str.replace` over whole content.
+    '''
+
+    slot = '\x00slot\x00'
+
+    def __init__(self, content, slot):
+        self.content = content
+        self.parts = content.split(slot)
+
+    def fill(self, value):
+        return value.join(self.parts)
+
+
+class InlineIndex(object):
+    ''' Indeces of inline rows present in data keys, collected in one pass
+    over the keys.
+
+    `rows` maps prefixed name of an inline element, with indeces of its
+    parent rows, e.g. `r__a_#{a:1}__b`, to indeces of its rows. `paths`
+    maps the name without indeces, e.g. `r__a__b`, to indeces present in
+    any of the parent rows, as nested rows are rendered the same in every
+    parent row.
+    '''
+
+    def __init__(self, keys=()):
+        self.rows = defaultdict(set)
+        self.paths = defaultdict(set)
+        self._sorted_paths = None
+        for key in keys:
+            self.add(key)
+
+    def add(self, key):
+        path = ''
+        start = 0
+        for m in re_inline_index.finditer(key):
+            index = int(m.group(1))
+            path += key[start:m.start()]
+            start = m.end()
+            self.rows[key[:m.start()]].add(index)
+            self.paths[path].add(index)
+        self._sorted_paths = None
+
+    def indeces(self, name):
+        ''' Sorted indeces of rows of inline at prefixed `name`. '''
+        return sorted(self.rows.get(name, ()))
+
+    def count(self, path):
+        ''' Count of rows of inline at `path`, without indeces. '''
+        return len(self.paths.get(path, ()))
+
+    def subtree_counts(self, path):
+        ''' (path, count) of inlines, which paths start with `path`. '''
+        if self._sorted_paths is None:
+            self._sorted_paths = sorted(self.paths)
+        paths = self._sorted_paths
+        start = bisect_left(paths, path)
+        end = bisect_left(paths, path + '\uffff', start)
+        return [(p, len(self.paths[p])) for p in paths[start:end]]
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+''' Validation of instance documents with libxml2.
+
+`Element.validate_inputs` checks inputs of one form with validators from
+`utils.funcs`, which only approximate XSD facets. For bulk checks of
+generated XML the form is compiled to `lxml.etree.XMLSchema` once, and
+documents are validated in C, with errors mapped back to prefixed names
+of the element tree, where the failed node is known to it.
+
+    >>> validator = CompiledSchema.load('IRS1040.pickle').instance_validator()
+    >>> errors = validator.validate(open('return.xml', 'rb').read())
+'''
+from __future__ import unicode_literals, print_function, division, absolute_import  # NOQA
+
+from collections import defaultdict
+
+from lxml import etree
+
+from .instances import InstancePaths
+
+
+class InstanceValidator(object):
+
+    def __init__(self, xsd_filepath, element=None):
+        ''' `element` is the top element of the form compiled from
+        `xsd_filepath`, errors are keyed by its prefixed names. Without it,
+        errors are keyed by paths of failed nodes.
+        '''
+        self.xsd_filepath = xsd_filepath
+        self.element = element
+        self.paths = InstancePaths(element) if element is not None else None
+        # includes are resolved relative to the file, so it is parsed from the path
+        self.schema = etree.XMLSchema(etree.parse(xsd_filepath))
+
+    def is_valid(self, document):
+        return self.schema.validate(self._parse(document))
+
+    def validate(self, document):
+        ''' Returns dict of prefixed name -> list of messages, empty if
+        `document` is valid. `document` is serialized XML, or a parsed tree.
+        '''
+        tree = self._parse(document)
+        if self.schema.validate(tree):
+            return {}
+        errors = defaultdict(list)
+        for entry in self.schema.error_log:
+            errors[self._get_error_key(tree, entry)].append(entry.message)
+        return dict(errors)
+
+    def validate_many(self, documents):
+        ''' Yields errors of each of `documents`, as `validate` returns them. '''
+        for document in documents:
+            yield self.validate(document)
+
+    @staticmethod
+    def _parse(document):
+        if isinstance(document, etree._ElementTree):
+            return document
+        if isinstance(document, etree._Element):
+            return document.getroottree()
+        if not isinstance(document, bytes):
+            document = document.encode('utf-8')
+        return etree.ElementTree(etree.fromstring(document))
+
+    def _get_error_key(self, tree, entry):
+        nodes = tree.xpath(entry.path) if entry.path else []
+        if not nodes:
+            return self.element.prefixed_name() if self.element is not None else ''
+        if self.element is None:
+            return entry.path
+        return self.get_prefixed_name(nodes[0])
+
+    def get_prefixed_name(self, node):
+        ''' Prefixed name of the element, which `node` is an instance of,
+        e.g. `Form__Item_#{Item:2}__Amt` for `Amt` of the third `Item`.
+        Nodes, which are not in the element tree, are named as their
+        nearest known parent.
+        '''
+        chain = [node] + list(node.iterancestors())
+        chain.reverse()
+        el = self.element
+        if etree.QName(chain[0]).localname != el.name:
+            return el.prefixed_name()
+
+        indeces = {}
+        for child in chain[1:]:
+            sub_chain = self.paths.resolve(el, etree.QName(child).localname)
+            if sub_chain is None:
+                break
+            el = sub_chain[-1]
+            if el.inlines_needed() is not None:
+                indeces[el.name] = len(list(child.itersiblings(child.tag, preceding=True)))
+        if el.parent is None:
+            return el.prefixed_name()
+        return el.prefixed_name(prefix=el._get_full_prefix(indeces), index=indeces.get(el.name, 0))